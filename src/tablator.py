@@ -6,16 +6,21 @@ Treasure Table -- Generate
 import argparse
 import os
 import sys
-import traceback
 
 import tablator
+import tablator.diskcache
 import tablator.logger
+import tablator.metrics
+import tablator.output
+import tablator.plan
+import tablator.rng
+import tablator.sampler
 
 
 def apply_environ(args):
     """
     Fill in missing argument values from the environement.
-    Options: data_dir
+    Options: data_dir, cache_dir
     """
     if args.trace: print('=== apply_environ')
 
@@ -24,6 +29,11 @@ def apply_environ(args):
         if args.verbose:
             print(f'--- Found TABLATOR_DATA_DIR = {args.data_dir}')
 
+    if args.cache_dir is None and 'TABLATOR_CACHE_DIR' in os.environ:
+        args.cache_dir = os.environ['TABLATOR_CACHE_DIR']
+        if args.verbose:
+            print(f'--- Found TABLATOR_CACHE_DIR = {args.cache_dir}')
+
 
 def check_data_dir(args):
     """
@@ -42,6 +52,108 @@ def check_data_dir(args):
         raise ValueError(f'DATA DIR ({args.data_dir}) does not exist')
 
 
+def check_modes(args):
+    """
+    Check that the options of the table lookups can be used together:
+    at most one of --print, --analyze, --counts, --batch and --processes,
+    --metrics only when rolling with the plan, and --format only with
+    items.
+    Raise ValueError otherwise.
+    """
+    tablator.logger.trace('check_modes')
+
+    modes = [option for option, value in (
+        ('--print', args.print), ('--analyze', args.analyze),
+        ('--counts', args.counts), ('--batch', args.batch),
+        ('--processes', args.processes is not None)) if value]
+    if len(modes) > 1:
+        raise ValueError(f'{" and ".join(modes)} cannot be used together')
+    if args.metrics is not None and modes:
+        raise ValueError(f'--metrics cannot be used with {modes[0]}')
+    if args.format != 'plain' and modes and modes[0] != '--processes':
+        raise ValueError(f'{modes[0]} writes plain text only, not '
+                         f'{args.format}')
+
+
+def profile(function, args, path, top=20, repeat=1):
+    """
+    Call function(args) repeat times under cProfile and tracemalloc.
+    Write the profile to a pstats file at path, and the top functions (by
+    cumulative time) and allocation sites (by size) to the standard error.
+    """
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        for i in range(repeat):
+            profiler.runcall(function, args)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(path)
+
+        print(f'=== profile of {repeat} run(s), written to {path}',
+              file=sys.stderr)
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats('cumulative').print_stats(top)
+        print(f'=== top {top} allocation sites (peak {peak} bytes, '
+              f'{current} bytes still allocated)', file=sys.stderr)
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)])
+        for statistic in snapshot.statistics('lineno')[:top]:
+            print(statistic, file=sys.stderr)
+
+
+def roll_tables(args):
+    """
+    Roll on (or print, analyze or count) each of the tables named in args
+    and write the results to the standard output.
+    """
+    records = args.format != 'plain'
+    for table_name in args.tables:
+        if args.print:
+            tablator.print_plain(table_name)
+        elif args.analyze:
+            from tablator import analysis
+            analysis.print_report(table_name)
+        elif args.counts:
+            from tablator import counts
+            counts.print_counts(counts.generate_counts(table_name,
+                                                       args.number))
+        elif args.batch:
+            from tablator import batch
+            items = batch.generate(table_name, args.number, args.seed)
+            tablator.output.write([items])
+        elif args.processes is not None:
+            from tablator import parallel
+            tablator.output.write(parallel.generate_chunks(
+                table_name, args.number, args.seed, args.processes,
+                args.rng or 'random', records=records), args.format)
+        else:
+            tablator.output.write(tablator.plan.iter_generate(
+                table_name, args.number, records=records), args.format)
+
+
+def write_metrics(path, format='json'):
+    """
+    Write the metrics collected (see tablator.metrics) to a file, or to
+    the standard error if path is '-'.
+    """
+    if format == 'prometheus':
+        text = tablator.metrics.to_prometheus()
+    else:
+        text = tablator.metrics.to_json() + '\n'
+    if path == '-':
+        sys.stderr.write(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text)
+
+
 def get_args():
     """
     Get command line arguments.
@@ -49,18 +161,67 @@ def get_args():
     parser = argparse.ArgumentParser(
         description='Roll on a table',
         epilog='\n')
+    parser.add_argument('-A', '--analyze', action='store_true', default=False,
+                        help='print the expected items of a roll (no rolling)')
+    parser.add_argument('-b', '--batch', action='store_true', default=False,
+                        help='draw all rolls at once (needs NumPy)')
+    parser.add_argument('-c', '--cache-dir', action='store', default=None,
+                        help='cache parsed tables in this directory')
+    parser.add_argument('-C', '--counts', action='store_true', default=False,
+                        help='print how many of each item the rolls give')
+    parser.add_argument('--clear-cache', action='store_true', default=False,
+                        help='remove all tables from the cache directory')
     parser.add_argument('-d', '--data-dir', action='store', default=None,
                         help='let the table data directory')
+    parser.add_argument('-f', '--format', action='store', default='plain',
+                        choices=tablator.output.FORMATS,
+                        help='output format of the items (default plain)')
+    parser.add_argument('-j', '--processes', action='store', default=None,
+                        type=int, metavar='N',
+                        help='roll in N worker processes (the same items for any N with --seed)')
     parser.add_argument('-l', '--list', action='store_true', default=False,
                         help='list available tables')
+    parser.add_argument('-m', '--metrics', action='store', default=None,
+                        metavar='FILE',
+                        help="write per-table metrics to FILE at exit ('-' for stderr)")
+    parser.add_argument('--metrics-format', action='store', default='json',
+                        choices=('json', 'prometheus'),
+                        help='format of the metrics (default json)')
     parser.add_argument('-n', '--number', action='store', default=1, type=int,
                         help='number of rolls on each table')
     parser.add_argument('-p', '--print', action='store_true', default=False,
                         help='print the table (plain text)')
+    parser.add_argument('-P', '--preload', action='store_true', default=False,
+                        help='load the tables (or all of DATA_DIR) in parallel first')
+    parser.add_argument('--profile', action='store', default=None,
+                        metavar='FILE',
+                        help='profile the rolls (cProfile and tracemalloc), write the pstats file FILE')
+    parser.add_argument('--profile-top', action='store', default=20,
+                        type=int, metavar='N',
+                        help='functions and allocation sites in the profile summary (default 20)')
+    parser.add_argument('--repeat', action='store', default=1, type=int,
+                        metavar='K',
+                        help='do the lookups K times, writing the output of each (default 1)')
+    parser.add_argument('-R', '--recursive', action='store_true',
+                        default=False,
+                        help='find tables in subdirectories too (named dir/table)')
+    parser.add_argument('-r', '--rng', action='store', default=None,
+                        choices=tablator.rng.BACKENDS,
+                        help='random number generator (default random)')
+    parser.add_argument('--seed', action='store', default=None, type=int,
+                        help='seed the rolls')
+    parser.add_argument('-s', '--sampler', action='store', default=None,
+                        choices=tablator.sampler.ENGINES,
+                        help='row sampler engine (default bisect)')
     parser.add_argument('-t', '--trace', action='store_true', default=False,
                         help='enable trace messages')
+    parser.add_argument('-V', '--validate', action='store', default=None,
+                        type=int, metavar='SAMPLES',
+                        help='test the rows, chances and dice of the tables (or all of DATA_DIR) against their weights with SAMPLES rolls each')
     parser.add_argument('-v', '--verbose', action='store_true', default=False,
                         help='enable debug messages')
+    parser.add_argument('-w', '--workers', action='store', default=None,
+                        type=int, help='number of worker threads for --preload')
     parser.add_argument('tables', nargs='*',
                         help='table names')
     return parser.parse_args()
@@ -68,43 +229,90 @@ def get_args():
 
 if __name__ == '__main__':
     exit_code = None
+    args = None
     try:
         args = get_args()
         apply_environ(args)
         tablator.logger.set(args.verbose, args.trace)
 
         check_data_dir(args)
-        tablator.set_data_dir(args.data_dir)
+        tablator.set_data_dir(args.data_dir, args.recursive)
+        if args.sampler is not None:
+            tablator.sampler.set_sampler(args.sampler)
+        if args.rng is not None or args.seed is not None:
+            tablator.rng.set_rng(tablator.rng.make(args.rng or 'random',
+                                                   args.seed))
+        if args.cache_dir is not None:
+            tablator.diskcache.set_cache_dir(args.cache_dir)
+        if args.metrics is not None:
+            tablator.metrics.set(True)
+
+        if args.preload:
+            tablator.table.preload(args.tables or None, args.workers)
+
+        if args.clear_cache:
+            if not tablator.diskcache.is_enabled():
+                raise ValueError('No cache directory set (--cache-dir or '
+                                 'TABLATOR_CACHE_DIR)')
+            count = tablator.diskcache.clear()
+            print(f'Removed {count} cached tables')
+            exit_code = 0
 
-        if args.list:
+        elif args.list:
             table_list = tablator.data.list_tables()
             print('', 'Available tables', '', sep='\n')
             for table_name in sorted(table_list):
                 print('   ', table_name)
             print()
+            collisions = tablator.data.get_index().collisions
+            for table_name, paths in sorted(collisions.items()):
+                print(f'Warning: {table_name} is in more than one file, '
+                      f'using {tablator.data.find(table_name)}:',
+                      *paths, file=sys.stderr)
             exit_code = 0
 
+        elif args.validate is not None:
+            import tablator.conformance
+            if args.tables:
+                results = {table_name: tablator.conformance.check_table(
+                    table_name, args.validate) for table_name in args.tables}
+            else:
+                results = tablator.conformance.check_dir(args.validate)
+            passed = tablator.conformance.print_results(results)
+            exit_code = 0 if passed else 1
+
         else:  # do table lookups
             exit_code = 1
-            for table_name in args.tables:
-                if args.print:
-                    tablator.print_plain(table_name)
-                else:
-                    items = tablator.generate(table_name, args.number)
-                    for item in items:
-                        print(item)
-                exit_code = 0
+            check_modes(args)
+            if args.profile is not None:
+                profile(roll_tables, args, args.profile, args.profile_top,
+                        args.repeat)
+            else:
+                for i in range(args.repeat):
+                    roll_tables(args)
+            exit_code = 0
+
+    except BrokenPipeError:
+        # The reader (such as head) is gone: stop quietly.  Point stdout
+        # at /dev/null so flushing it at exit does not fail again.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        exit_code = 0
 
     except ValueError as e:
+        import traceback
         traceback.print_exc()
         print(repr(e), file=sys.stderr)
         exit_code = 1
 
     except Exception:
+        import traceback
         traceback.print_exc()
         exit_code = 1
 
     finally:
+        if args is not None and args.metrics is not None:
+            write_metrics(args.metrics, args.metrics_format)
         if exit_code is None:
             print('Warning: exit_code is None', file=sys.stderr)
             exit_code = 99
@@ -1,3 +1,12 @@
 from tablator.data import set_data_dir
 from tablator.table import print_plain
 from tablator.table import generate
+
+
+def __getattr__(name):
+    # Tablator (tablator.session) is imported on first use, keeping
+    # 'import tablator' light
+    if name == 'Tablator':
+        from tablator.session import Tablator
+        return Tablator
+    raise AttributeError(f"module 'tablator' has no attribute {name!r}")
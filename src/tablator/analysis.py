@@ -0,0 +1,273 @@
+"""
+Exact probabilities and expectations of tables
+
+Instead of rolling a table many times and counting, the expectations of
+one roll are worked out from the row weights, column chances and dice
+expressions, as exact fractions:
+
+    count       the expected number of the item in one roll
+    quantity    the expected sum of the item's quantities in one roll (an
+                item without a quantity counts 1)
+    subitems    the expected count of each item rolled on the item's
+                subtable, in one roll
+    probability the probability that the item appears at least once in
+                one roll (the count, when it appears at most once: always
+                so for a row table without column tables)
+
+Expectations add up, so a table rolled from many places (a shared
+subtable) is worked out once and scaled, and the tables are evaluated
+children first, without recursion.  Probabilities add up over the rows of
+a row table; over the columns of a column table, the chances of missing
+the item multiply.
+
+The number of rolls of a column referring to a table is a dice quantity,
+negative quantities counting as zero.  Its exact distribution is used
+only for the pools tablator.dice.pool_method() sums by 'loop' or 'exact';
+building it for larger pools would take too long.  For those, the chance
+of missing an item over the rolls comes from the generating function of
+NdS, and, if the quantity may be negative, the normal approximation of
+NdS is used; these expectations and probabilities are floats, not
+fractions.
+"""
+
+import math
+from collections import namedtuple
+from fractions import Fraction
+
+import tablator.dice
+import tablator.plan
+from tablator.logger import trace
+
+# The expectations of an item in one roll (see above)
+Expectation = namedtuple('Expectation', ['count', 'quantity', 'subitems',
+                                         'probability'])
+
+
+def analyze(table_name):
+    """
+    Work out the expectations of one roll on the given table.
+    Assumes DATA_DIR has been set.
+    Returns a dict of item name: Expectation.
+    Raises ValueError if the table cannot be compiled.
+    """
+    trace('analysis.analyze')
+    return expect(tablator.plan.get_plan(table_name))
+
+
+def dice_stats(table_name):
+    """
+    Return the exact mean and variance of every dice expression used by
+    the given table and the tables it refers to, as a dict of
+    expression: (mean, variance).
+    Raises ValueError if the table cannot be compiled.
+    """
+    trace('analysis.dice_stats')
+    stats = dict()
+    for node in tablator.plan.nodes_of(tablator.plan.get_plan(table_name)):
+        entries = node.source.get('rows') or node.source.get('columns')
+        for entry in entries:
+            expression = entry.get('quantity')
+            if expression is not None and expression not in stats:
+                dice = tablator.dice.compile(expression)
+                stats[expression] = (tablator.dice.mean(dice),
+                                     tablator.dice.variance(dice))
+    return stats
+
+
+def expect(node, memo=None):
+    """
+    Work out the expectations of one roll on a compiled table.
+    memo is a dict of the expectations of tables already worked out (by
+    node id), kept across calls if given.
+    Returns a dict of item name: Expectation.
+    """
+    if memo is None:
+        memo = dict()
+    for table in tablator.plan.nodes_of(node, memo):
+        items = dict()
+        if type(table) is tablator.plan.RowTable:
+            total = table.total
+            for row, weight in zip(table.rows, table.weights()):
+                p = Fraction(weight, total)
+                if p == 0:
+                    continue
+                if row.table is not None:
+                    _add(items, memo[id(row.table)], p)
+                    continue
+                quantity = 1 if row.dice is None \
+                    else tablator.dice.mean(row.dice)
+                subitems = dict()
+                if row.subtable is not None:
+                    _add_subitems(subitems, memo[id(row.subtable)])
+                _add(items,
+                     {row.name: Expectation(1, quantity, subitems, 1)}, p)
+        else:
+            missing = dict()    # item name: probability of no such item
+            for column in table.columns:
+                p = Fraction(column.chance, 100)
+                if p == 0:
+                    continue
+                if column.table is not None:
+                    rolls = 1 if column.dice is None \
+                        else _rolls_mean(column.dice)
+                    other = memo[id(column.table)]
+                    _add(items, other, p * rolls)
+                    for name, expectation in other.items():
+                        found = 1 - _none_chance(
+                            column.dice, 1 - expectation.probability)
+                        missing[name] = missing.get(name, 1) * (1 - p * found)
+                    continue
+                quantity = 1 if column.dice is None \
+                    else tablator.dice.mean(column.dice)
+                _add(items, {column.name: Expectation(1, quantity, {}, 1)}, p)
+                missing[column.name] = missing.get(column.name, 1) * (1 - p)
+            for name, chance in missing.items():
+                items[name] = items[name]._replace(probability=1 - chance)
+        memo[id(table)] = items
+    return memo[id(node)]
+
+
+def print_report(table_name, file=None):
+    """
+    Print the expectations of one roll on the given table, most likely
+    items first, and the mean and variance of its dice expressions.
+    Raises ValueError if the table cannot be compiled.
+    """
+    trace('analysis.print_report')
+    items = analyze(table_name)
+    print(f'{table_name}: expectations of one roll', file=file)
+    print('{:>10} {:>10} {:>12}  {}'.format('count', 'P(>=1)', 'quantity',
+                                             'item'), file=file)
+    for name, (count, quantity, subitems, probability) in sorted(
+            items.items(), key=lambda item: (-item[1].count, item[0])):
+        print('{:10.6f} {:10.6f} {:12.4f}  {}'.format(
+            float(count), float(probability), float(quantity), name),
+            file=file)
+        for subname, subcount in sorted(subitems.items(),
+                                        key=lambda item: (-item[1], item[0])):
+            print('{:10.6f} {:>10} {:>12}    {}'.format(
+                float(subcount), '', '', subname), file=file)
+    stats = dice_stats(table_name)
+    if stats:
+        print('{:>10} {:>12}  {}'.format('mean', 'variance', 'dice'),
+              file=file)
+        for expression, (mean, variance) in stats.items():
+            print('{:10.4f} {:12.4f}  {}'.format(
+                float(mean), float(variance), expression), file=file)
+
+
+def _add(items, other, factor):
+    """
+    Add the expectations of other, times factor, to items.  Probabilities
+    are added the same way, which holds for the rows of a row table only.
+    """
+    for name, (count, quantity, subitems, probability) in other.items():
+        old = items.get(name)
+        if old is None:
+            old = Expectation(0, 0, dict(), 0)
+            items[name] = old
+        new_subitems = old.subitems
+        for subname, subcount in subitems.items():
+            new_subitems[subname] = \
+                new_subitems.get(subname, 0) + subcount * factor
+        items[name] = Expectation(old.count + count * factor,
+                                  old.quantity + quantity * factor,
+                                  new_subitems,
+                                  old.probability + probability * factor)
+
+
+def _add_subitems(subitems, other):
+    """
+    Add the counts of the items of other, and of their own subitems, to
+    subitems.
+    """
+    for name, (count, quantity, nested, probability) in other.items():
+        subitems[name] = subitems.get(name, 0) + count
+        for subname, subcount in nested.items():
+            subitems[subname] = subitems.get(subname, 0) + subcount
+
+
+def _is_exact(number, sides):
+    """
+    Return True if the exact distribution of NdS is used (see above).
+    """
+    return tablator.dice.pool_method(number, sides) in ('loop', 'exact')
+
+
+def _none_chance(dice, q):
+    """
+    Return the probability that none of the rolls of a quantity on a table
+    gives an item, q being the probability that one roll does not: the
+    mean of q to the power of the quantity (one roll if dice is None),
+    counting negative quantities as zero.
+    """
+    if dice is None:
+        return q
+    number, sides, adjustment, multiplier = dice
+    if number == 0:
+        return q ** max(0, adjustment * multiplier)
+    if not _is_exact(number, sides):
+        return _none_chance_large(dice, float(q))
+    cumulative = tablator.dice.distribution(number, sides)
+    total = 0
+    previous = 0
+    for i, count in enumerate(cumulative):
+        value = (number + i + adjustment) * multiplier
+        total += (count - previous) * q ** max(0, value)
+        previous = count
+    return total / cumulative[-1]
+
+
+def _none_chance_large(dice, q):
+    """
+    Return _none_chance() of a pool too large for the exact distribution,
+    as a float.
+    """
+    number, sides, adjustment, multiplier = dice
+    if number + adjustment >= 0:
+        # No negative quantity: q ** ((NdS + adjustment) * multiplier) is
+        # q ** ((N + adjustment) * multiplier) times, for each die, the
+        # mean of q ** ((face - 1) * multiplier)
+        face = sum(q ** (multiplier * i) for i in range(sides)) / sides
+        return q ** ((number + adjustment) * multiplier) * face ** number
+    # Sum over the normal approximation of NdS, within 10 deviations
+    mean = number * (sides + 1) / 2
+    deviation = math.sqrt(number * (sides * sides - 1) / 12)
+    low = max(number, math.ceil(mean - 10 * deviation))
+    high = min(number * sides, math.floor(mean + 10 * deviation))
+    total = weights = 0.0
+    for k in range(low, high + 1):
+        weight = math.exp(-((k - mean) / deviation) ** 2 / 2)
+        total += weight * q ** max(0, (k + adjustment) * multiplier)
+        weights += weight
+    return total / weights
+
+
+def _rolls_mean(dice):
+    """
+    Return the expected number of rolls of a quantity on a table: the mean
+    of the quantity, counting negative quantities as zero.
+    """
+    number, sides, adjustment, multiplier = dice
+    if (number + adjustment) * multiplier >= 0:
+        return tablator.dice.mean(dice)
+    if number == 0:
+        return Fraction(0)
+    if not _is_exact(number, sides):
+        # The mean of max(0, X) for X normal, with the mean and deviation
+        # of the quantity
+        mean = float(tablator.dice.mean(dice))
+        deviation = math.sqrt(tablator.dice.variance(dice))
+        z = mean / deviation
+        return mean * (1 + math.erf(z / math.sqrt(2))) / 2 \
+            + deviation * math.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+    cumulative = tablator.dice.distribution(number, sides)
+    total = 0
+    previous = 0
+    for i, count in enumerate(cumulative):
+        value = (number + i + adjustment) * multiplier
+        if value > 0:
+            total += (count - previous) * value
+        previous = count
+    return Fraction(total, cumulative[-1])
+
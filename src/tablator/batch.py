@@ -0,0 +1,231 @@
+"""
+Batch generation with NumPy.
+
+Draws every row index, column chance roll and dice roll for N rolls as
+arrays, then formats the results.  Rows and columns that refer to another
+table are rolled on it in bulk too, with the same generator, so the items
+of a seed are the same for nested tables as for flat ones.
+
+NumPy is optional.  Without it, generate() uses tablator.table.generate.
+"""
+
+import tablator.dice
+import tablator.sampler
+import tablator.table
+from tablator.logger import debug, trace
+
+
+def generate(table_name, num_rolls=1, seed=None):
+    """
+    Generate N items from the given table, drawing in bulk.
+    Assumes DATA_DIR has been set.
+    Returns a list of item names (str) in the same form and order as
+    tablator.table.generate.
+    Raises ValueError if the table cannot be loaded.
+    """
+    trace('batch.generate')
+    try:
+        import numpy
+    except ImportError:
+        debug('NumPy not found, rolling one at a time')
+        return tablator.table.generate(table_name, num_rolls)
+
+    rng = numpy.random.default_rng(seed)
+    table = tablator.table.load_table(table_name)
+    if 'rows' in table:
+        values = lookup_rows(rng, table, num_rolls)
+    elif 'columns' in table:
+        values = lookup_columns(rng, table, num_rolls)
+    else:
+        raise ValueError('Invalid table: missing rows or columns key')
+    return flatten(values)
+
+
+def flatten(values):
+    """
+    Flatten an array of per-roll results (a str or a list of str each)
+    into a list of str.
+    """
+    items = values.tolist()
+    if all(type(item) is str for item in items):
+        return items
+    flat = list()
+    for item in items:
+        if type(item) is str:
+            flat.append(item)
+        else:
+            flat.extend(item)
+    return flat
+
+
+def lookup_columns(rng, table, num_rolls):
+    """
+    Roll N times on a column table.
+    Returns an object array of the items of every successful column, in
+    roll then column order.  Each is an item name, or a list of item names
+    for 'table' columns.
+    """
+    trace('batch.lookup_columns')
+    cells, success = _column_cells(rng, table, num_rolls)
+    # Keep the successful cells, in roll then column order
+    return cells[success]
+
+
+def _column_cells(rng, table, num_rolls):
+    """
+    Roll N times on a column table.
+    Returns an object array of the items of each roll and column (an item
+    name, or a list of item names for 'table' columns), and a bool array
+    of the columns that succeeded.
+    """
+    import numpy
+
+    columns = table['columns']
+    chances = numpy.array([tablator.table.get_chance(c) for c in columns])
+    rolls = rng.integers(1, 101, size=(num_rolls, len(columns)))
+    success = rolls <= chances
+    cells = numpy.empty((num_rolls, len(columns)), dtype=object)
+    for c, column in enumerate(columns):
+        hits = numpy.flatnonzero(success[:, c])
+        debug('column', c, 'hits', len(hits))
+        if len(hits) == 0:
+            continue
+        quantity = column['quantity'] if 'quantity' in column else '1'
+        quantities = roll_many(rng, column.get('_dice') or quantity,
+                               len(hits))
+        if 'table' in column:
+            subtable = tablator.table.load_table(column['table'])
+            times = [max(0, int(q)) for q in quantities]
+            rolls = lookup_each(rng, subtable, sum(times))
+            values = list()
+            start = 0
+            for n in times:
+                values.append([item for roll in rolls[start:start + n]
+                               for item in roll])
+                start += n
+            cells[hits, c] = objects(values)
+        else:
+            name = column['name']
+            cells[hits, c] = objects([name if q == '1' else f'{q} {name}'
+                                      for q in quantities])
+    return cells, success
+
+
+def lookup_each(rng, table, num_rolls):
+    """
+    Roll N times on a table that is referenced by another table.
+    Returns a list of the item names of each roll (a list of str each).
+    """
+    if 'rows' in table:
+        return [[value] if type(value) is str else value
+                for value in lookup_rows(rng, table, num_rolls).tolist()]
+    elif 'columns' in table:
+        cells, success = _column_cells(rng, table, num_rolls)
+        rolls = list()
+        for roll_cells, roll_success in zip(cells, success):
+            items = list()
+            for cell in roll_cells[roll_success]:
+                if type(cell) is str:
+                    items.append(cell)
+                else:
+                    items.extend(cell)
+            rolls.append(items)
+        return rolls
+    else:
+        raise ValueError(f"Invalid Table: {table['name']}")
+
+
+def lookup_rows(rng, table, num_rolls):
+    """
+    Roll N times on a row table.
+    Returns an object array with one item name, or a list of item names
+    for 'table' rows, per roll.
+    """
+    import numpy
+
+    trace('batch.lookup_rows')
+    rows = table['rows']
+    cumulative = table.get('_cumulative')
+    if cumulative is None:
+        cumulative = tablator.sampler.build_cumulative(table)
+    draws = rng.integers(1, table['total-weight'] + 1, size=num_rolls)
+    indexes = numpy.searchsorted(cumulative, draws, side='left')
+    if num_rolls > 0 and indexes.max() >= len(rows):
+        raise RuntimeError('row index out of bounds: total_weight {}'
+                           .format(table['total-weight']))
+
+    values = numpy.empty(num_rolls, dtype=object)
+    order = numpy.argsort(indexes, kind='stable')
+    starts = numpy.searchsorted(indexes[order], numpy.arange(len(rows) + 1))
+    for i, row in enumerate(rows):
+        hits = order[starts[i]:starts[i + 1]]
+        if len(hits) == 0:
+            continue
+        debug('row', i, 'hits', len(hits))
+        if 'table' in row:
+            subtable = tablator.table.load_table(row['table'])
+            values[hits] = objects(lookup_each(rng, subtable, len(hits)))
+            continue
+        if 'subtable' in row:
+            subtable = tablator.table.load_table(row['subtable'])
+            subitems = list()
+            for subitem in lookup_each(rng, subtable, len(hits)):
+                if len(subitem) > 1:
+                    subitems.append(', '.join(sorted(subitem)))
+                else:
+                    subitems.append(subitem[0])
+        else:
+            subitems = [None] * len(hits)
+        if 'quantity' in row:
+            quantities = roll_many(rng, row.get('_dice') or row['quantity'],
+                                   len(hits))
+            if 'units' in row:
+                quantities = [f'{q} {row["units"]}' for q in quantities]
+            quantities = [None if q == '1' else q for q in quantities]
+        else:
+            quantities = [None] * len(hits)
+        values[hits] = objects([name_item(row['name'], s, q)
+                                for s, q in zip(subitems, quantities)])
+    return values
+
+
+def name_item(name, subitem, quantity):
+    """
+    Format an item name with its optional subitem and quantity,
+    as tablator.table.lookup_rows does.
+    """
+    if subitem is not None and quantity is not None:
+        return '{} ({}, {})'.format(name, subitem, quantity)
+    elif subitem is not None:
+        return '{} ({})'.format(name, subitem)
+    elif quantity is not None:
+        return '{} ({})'.format(name, quantity)
+    return name
+
+
+def objects(items):
+    """
+    Make a 1-D object array from a list of str or lists, without NumPy
+    turning nested lists into extra dimensions.
+    """
+    import numpy
+
+    if len(items) == 0 or type(items[0]) is str:
+        return numpy.array(items, dtype=object)
+    array = numpy.empty(len(items), dtype=object)
+    for i, item in enumerate(items):
+        array[i] = item
+    return array
+
+
+def roll_many(rng, quantity, count):
+    """
+    Roll a quantity (dice expression or Dice tuple) N times.
+    Returns a list of N str, like tablator.table.roll_quantity.
+    """
+    if type(quantity) is str:
+        quantity = tablator.dice.compile(quantity)
+    values = tablator.dice.roll_many(quantity, count, rng)
+    if rng is None:
+        return [str(value) for value in values]
+    return values.astype(str).tolist()
@@ -0,0 +1,188 @@
+"""
+Bounded table cache for long-running processes.
+
+TableCache keeps loaded tables in least-recently-used order and evicts
+the oldest when it holds more than max_tables tables or max_bytes
+(estimated) bytes.  Each entry remembers its file's modification time;
+an entry is checked against its file at most every 'interval' seconds
+and dropped if the file changed, so the next load reads it again.
+
+get() takes no lock, so many threads can read a shared cache; changes
+(put, invalidate, clear) are serialized by the cache's lock.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from tablator.logger import debug, trace
+
+
+def estimate_size(value):
+    """
+    Estimate the memory used by a table (dicts, lists, str, numbers),
+    in bytes.
+    """
+    size = 0
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        size += sys.getsizeof(value)
+        if type(value) is dict:
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif type(value) in (list, tuple):
+            stack.extend(value)
+    return size
+
+
+class TableCache:
+    """
+    LRU cache of tables by name, bounded by count and estimated memory,
+    revalidated by file modification time.
+
+    mtime is a function of a table name returning its file's modification
+    time, or None if unknown (the entry is then never revalidated).
+    """
+
+    def __init__(self, max_tables=None, max_bytes=None, interval=1.0,
+                 mtime=None):
+        self.max_tables = max_tables
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.mtime = mtime
+        self._entries = OrderedDict()   # name: [table, size, mtime, checked]
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __getitem__(self, name):
+        return self._entries[name][0]
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __setitem__(self, name, table):
+        self.put(name, table)
+
+    def clear(self):
+        """
+        Remove every table.  Statistics are kept.
+        """
+        trace('TableCache.clear')
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get(self, name):
+        """
+        Return a cached table, or None if it is not cached or its file
+        changed.  A hit makes the table the most recently used.
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.mtime is not None and entry[2] is not None:
+            now = time.monotonic()
+            if now - entry[3] >= self.interval:
+                entry[3] = now
+                if self.mtime(name) != entry[2]:
+                    debug('stale', name)
+                    self.invalidate(name, entry)
+                    self.misses += 1
+                    return None
+        try:
+            self._entries.move_to_end(name)
+        except KeyError:
+            pass    # evicted by another thread meanwhile
+        self.hits += 1
+        return entry[0]
+
+    def invalidate(self, name, entry=None):
+        """
+        Remove a table, if cached (and, given an entry, only if that entry
+        is still current).  Returns True if it was removed.
+        """
+        with self._lock:
+            current = self._entries.get(name)
+            if current is None or (entry is not None and current is not entry):
+                return False
+            del self._entries[name]
+            self._bytes -= current[1]
+            self.invalidations += 1
+            return True
+
+    def peek(self, name):
+        """
+        Return a cached table, or None, without revalidating it or
+        changing its order or the statistics.
+        """
+        entry = self._entries.get(name)
+        return None if entry is None else entry[0]
+
+    def put(self, name, table):
+        """
+        Add or replace a table, then evict the least recently used tables
+        while over the limits.  The newest table is never evicted.
+        """
+        size = estimate_size(table) if self.max_bytes is not None else 0
+        mtime = self.mtime(name) if self.mtime is not None else None
+        with self._lock:
+            if name in self._entries:
+                self._bytes -= self._entries.pop(name)[1]
+            self._entries[name] = [table, size, mtime, time.monotonic()]
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        """
+        Evict the least recently used tables while over the limits.
+        The caller holds the lock.
+        """
+        while len(self._entries) > 1 and (
+                (self.max_tables is not None
+                 and len(self._entries) > self.max_tables)
+                or (self.max_bytes is not None
+                    and self._bytes > self.max_bytes)):
+            old_name, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[1]
+            self.evictions += 1
+            debug('evicted', old_name)
+
+    def set_limits(self, max_tables=None, max_bytes=None):
+        """
+        Change the limits, evicting tables if now over them.
+        """
+        with self._lock:
+            self.max_tables = max_tables
+            self.max_bytes = max_bytes
+            self._bytes = 0
+            for entry in self._entries.values():
+                entry[1] = estimate_size(entry[0]) \
+                    if max_bytes is not None else 0
+                self._bytes += entry[1]
+            self._evict()
+
+    def stats(self):
+        """
+        Return the cache statistics as a dict.
+        """
+        return {
+            'tables': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
@@ -0,0 +1,299 @@
+"""
+Statistical conformance of the samplers
+
+Rolls the random parts of a table many times through the functions the
+tables are rolled with, and tests the observed frequencies against the
+table's own numbers:
+
+    rows        random_row() (the sampler engine), against the row weights
+    chance      lookup_columns(), a column's hits against its chance
+    dice        roll_quantity(), the sums of a dice expression against
+                their exact distribution
+
+The rolls use the engine and RNG currently set (see tablator.sampler and
+tablator.rng), so a new engine or RNG can be checked against the tables
+before it is used.  Each test is a chi-square or a G-test (likelihood
+ratio); cells expected fewer than MIN_EXPECTED times are pooled.  A test
+fails when its p-value is under alpha.  The counts are kept in arrays of
+int, so many millions of rolls take little memory.
+
+Pools too large for the exact distribution (see tablator.dice) are not
+tested: it would take too long to build.
+"""
+
+import math
+from array import array
+from collections import namedtuple
+
+import tablator.data
+import tablator.dice
+import tablator.table
+from tablator.logger import debug, trace
+
+TESTS = ('chi-square', 'g')
+
+# Default significance level of each test
+ALPHA = 0.001
+
+# Cells expected fewer times than this are pooled into one
+MIN_EXPECTED = 5
+
+# A test of a table: its name, what was tested (see above), the test
+# statistic, its degrees of freedom, the p-value, whether it passed and,
+# for a table that could not be loaded, the error message
+Result = namedtuple('Result', ['table', 'test', 'statistic', 'df',
+                               'p_value', 'passed', 'error'],
+                    defaults=(None,))
+
+
+def check_columns(table, samples, test='chi-square', alpha=ALPHA):
+    """
+    Test the chance rolls of a column table's columns.
+    Returns a list of Result, one per column.
+    """
+    trace('conformance.check_columns')
+    # A copy of the columns without items or tables: every hit is the
+    # name of the column, which is its number (from 1)
+    probe = {'name': table['name'], 'columns': [
+        {'name': i, 'chance': column['chance']}
+        for i, column in enumerate(table['columns'], 1)
+        if 'chance' in column]}
+    hits = array('q', bytes(8 * (len(table['columns']) + 1)))
+    lookup_columns = tablator.table.lookup_columns
+    for i in range(samples):
+        for number in lookup_columns(probe):
+            hits[number] += 1
+    results = list()
+    for i, column in enumerate(table['columns'], 1):
+        if 'chance' not in column:
+            continue
+        p = tablator.table.get_chance(column) / 100
+        results.append(_result(
+            table['name'], 'chance of column {} ({})'.format(
+                i, column.get('name') or column['table']),
+            [hits[i], samples - hits[i]], [samples * p, samples * (1 - p)],
+            test, alpha))
+    return results
+
+
+def check_dice(expression, samples, test='chi-square', alpha=ALPHA,
+               table_name=None):
+    """
+    Test the sums of a dice expression against their exact distribution.
+    Returns a Result, or None if the expression is a constant or a pool
+    too large for the exact distribution.
+    """
+    trace('conformance.check_dice')
+    dice = tablator.dice.compile(expression)
+    number, sides, adjustment, multiplier = dice
+    if number == 0 or tablator.dice.pool_method(number, sides) \
+            not in ('loop', 'exact'):
+        debug('not testing', expression)
+        return None
+    cumulative = tablator.dice.distribution(number, sides)
+    total = cumulative[-1]
+    counts = array('q', bytes(8 * len(cumulative)))
+    roll_quantity = tablator.table.roll_quantity
+    for i in range(samples):
+        value = int(roll_quantity(dice)) // multiplier - adjustment
+        counts[value - number] += 1
+    expected = [samples * (count - previous) / total
+                for previous, count in zip((0,) + cumulative, cumulative)]
+    return _result(table_name, expression, counts, expected, test, alpha)
+
+
+def check_dir(samples, test='chi-square', alpha=ALPHA):
+    """
+    Test every table in DATA_DIR.
+    Returns a dict of table name: list of Result.  A table that cannot be
+    loaded has one failed Result, of test 'load'.
+    """
+    trace('conformance.check_dir')
+    results = dict()
+    for table_name in sorted(tablator.data.list_tables()):
+        try:
+            results[table_name] = check_table(table_name, samples, test,
+                                              alpha)
+        except ValueError as e:
+            debug(table_name, e)
+            results[table_name] = [Result(table_name, 'load', None, None,
+                                          None, False, str(e))]
+    return results
+
+
+def check_rows(table, samples, test='chi-square', alpha=ALPHA):
+    """
+    Test the rows picked from a row table against the row weights.
+    Returns a Result.
+    """
+    trace('conformance.check_rows')
+    rows = table['rows']
+    index = {id(row): i for i, row in enumerate(rows)}
+    counts = array('q', bytes(8 * len(rows)))
+    random_row = tablator.table.random_row
+    for i in range(samples):
+        counts[index[id(random_row(table))]] += 1
+    total = table['total-weight']
+    expected = [samples * (row['weight'] if 'weight' in row else 1) / total
+                for row in rows]
+    return _result(table['name'], 'rows', counts, expected, test, alpha)
+
+
+def check_table(table_name, samples, test='chi-square', alpha=ALPHA):
+    """
+    Test the rows or column chances of a table, and its dice expressions,
+    with samples rolls each.
+    Returns a list of Result.
+    Raises ValueError if the table cannot be loaded.
+    """
+    trace('conformance.check_table')
+    if test not in TESTS:
+        raise ValueError(f'Unknown test: {test}')
+    table = tablator.table.load_table(table_name)
+    if 'rows' in table:
+        results = [check_rows(table, samples, test, alpha)]
+        entries = table['rows']
+    else:
+        results = check_columns(table, samples, test, alpha)
+        entries = table['columns']
+    expressions = {entry['quantity'] for entry in entries
+                   if 'quantity' in entry}
+    for expression in sorted(expressions):
+        result = check_dice(expression, samples, test, alpha, table_name)
+        if result is not None:
+            results.append(result)
+    return [result._replace(table=table_name) for result in results]
+
+
+def chi_square(observed, expected):
+    """
+    Return Pearson's chi-square statistic of observed against expected
+    counts (infinite if a cell expected never is observed).
+    """
+    statistic = 0.0
+    for o, e in zip(observed, expected):
+        if e > 0:
+            statistic += (o - e) ** 2 / e
+        elif o > 0:
+            return math.inf
+    return statistic
+
+
+def g_statistic(observed, expected):
+    """
+    Return the G statistic (likelihood ratio) of observed against expected
+    counts (infinite if a cell expected never is observed).
+    """
+    statistic = 0.0
+    for o, e in zip(observed, expected):
+        if o > 0:
+            if e <= 0:
+                return math.inf
+            statistic += o * math.log(o / e)
+    return 2 * statistic
+
+
+def p_value(statistic, df):
+    """
+    Return the probability of a chi-square deviate of df degrees of
+    freedom being at least statistic.
+    """
+    if df <= 0:
+        return 1.0
+    return _gamma_q(df / 2, statistic / 2)
+
+
+def print_results(results, file=None):
+    """
+    Print the results of check_dir() (a dict of table name: results), a
+    line for each test and for each table.
+    Returns True if every test passed.
+    """
+    passed = True
+    for table_name, table_results in results.items():
+        for result in table_results:
+            if result.statistic is None:
+                print(f'{table_name}: {result.test} failed: {result.error}',
+                      file=file)
+                continue
+            print('{}: {} statistic {:.2f} df {} p {:.4f} {}'.format(
+                table_name, result.test, result.statistic, result.df,
+                result.p_value, 'pass' if result.passed else 'FAIL'),
+                file=file)
+        table_passed = all(result.passed for result in table_results)
+        print(f'{table_name}: {"PASS" if table_passed else "FAIL"}',
+              file=file)
+        passed = passed and table_passed
+    return passed
+
+
+def _gamma_q(a, x):
+    """
+    Return the regularized upper incomplete gamma function Q(a, x): by its
+    series for x < a + 1, by its continued fraction otherwise (Lentz).
+    """
+    if x <= 0:
+        return 1.0
+    if x == math.inf:
+        return 0.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefix))
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = b + an / c
+        if abs(c) < tiny:
+            c = tiny
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+def _pool(observed, expected):
+    """
+    Pool the cells expected fewer than MIN_EXPECTED times into one.
+    Returns the observed and expected counts.
+    """
+    pooled_observed, pooled_expected = list(), list()
+    small_observed = small_expected = 0
+    for o, e in zip(observed, expected):
+        if e < MIN_EXPECTED:
+            small_observed += o
+            small_expected += e
+        else:
+            pooled_observed.append(o)
+            pooled_expected.append(e)
+    if small_expected > 0 or small_observed > 0:
+        pooled_observed.append(small_observed)
+        pooled_expected.append(small_expected)
+    return pooled_observed, pooled_expected
+
+
+def _result(table_name, name, observed, expected, test, alpha):
+    """
+    Test observed counts against expected counts.
+    Returns a Result.
+    """
+    observed, expected = _pool(observed, expected)
+    if test == 'g':
+        statistic = g_statistic(observed, expected)
+    else:
+        statistic = chi_square(observed, expected)
+    df = len(observed) - 1
+    p = p_value(statistic, df)
+    return Result(table_name, name, statistic, df, p, p >= alpha)
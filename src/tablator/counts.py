@@ -0,0 +1,128 @@
+"""
+Item counts of many rolls, without rolling them one by one.
+
+When only the number of each item matters, N rolls on a row table are one
+multinomial draw over the row weights, and the hits of a column over N
+rolls are one binomial draw on its chance.  The counts of rows and columns
+that refer to another table are rolls on that table; they are added up
+for each table, and every table is drawn once, parents before children.
+So the work grows with the number of tables and rows, not with N.
+
+Items are counted by name.  The hits of a row with a subtable are rolls
+on the subtable, drawn the same way, whose items are counted as
+subitems: under the key (item name, subitem name), and (item name,
+subitem name, name) one level deeper.  Quantities are not rolled, except
+the quantity of a column referring to a table, which is its number of
+rolls.  The sum of those quantities is drawn as one dice pool (see
+tablator.dice).
+The binomial and multinomial draws are those of tablator.dice.
+"""
+
+from collections import Counter
+
+import tablator.dice
+import tablator.plan
+from tablator.dice import binomial, multinomial
+from tablator.logger import trace
+
+
+def count(node, num_rolls=1, rng=None):
+    """
+    Count the items of N rolls on a compiled table (see tablator.plan).
+    rng is an RNG (see tablator.rng), default the random module.
+    Returns a Counter of item name (or subitem key, see above): number of
+    items.
+    """
+    trace('counts.count')
+    counts = Counter()
+    # Rolls to draw on each table: dict of node id: dict of the item path
+    # they are subitems of (() for items): number of rolls
+    rolls = {id(node): {(): num_rolls}}
+    # Parents before children, so a table has all its rolls when drawn
+    for node in reversed(tablator.plan.nodes_of(node)):
+        for path, n in rolls.pop(id(node), {}).items():
+            if n == 0:
+                continue
+            if type(node) is tablator.plan.RowTable:
+                hits = multinomial(n, node.weights(), rng)
+                for row, k in zip(node.rows, hits):
+                    if k == 0:
+                        continue
+                    if row.table is not None:
+                        _add_rolls(rolls, row.table, path, k)
+                        continue
+                    counts[path + (row.name,) if path else row.name] += k
+                    if row.subtable is not None:
+                        _add_rolls(rolls, row.subtable, path + (row.name,),
+                                   k)
+            else:
+                for column in node.columns:
+                    k = binomial(n, column.chance / 100, rng)
+                    if k == 0:
+                        continue
+                    if column.table is None:
+                        counts[path + (column.name,) if path
+                               else column.name] += k
+                        continue
+                    if column.dice is not None:
+                        k = _quantity_sum(column.dice, k, rng)
+                    if k > 0:
+                        _add_rolls(rolls, column.table, path, k)
+    return counts
+
+
+def _add_rolls(rolls, node, path, k):
+    """
+    Add k rolls on a compiled table, for the items under path.
+    """
+    paths = rolls.setdefault(id(node), dict())
+    paths[path] = paths.get(path, 0) + k
+
+
+def generate_counts(table_name, num_rolls=1):
+    """
+    Count the items of N rolls on the given table, drawing the counts
+    instead of rolling (see count()).
+    Assumes DATA_DIR has been set.
+    Returns a Counter of item name: number of items.
+    Raises ValueError if the table cannot be compiled.
+    """
+    trace('counts.generate_counts')
+    import tablator.session
+    return tablator.session.default().generate_counts(table_name, num_rolls)
+
+
+def print_counts(counts, file=None):
+    """
+    Print item counts (see count()) to the standard output, or file, most
+    common first, each item followed by its subitems, indented.
+    """
+    children = dict()
+    for key, n in counts.items():
+        path = key if type(key) is tuple else (key,)
+        children.setdefault(path[:-1], list()).append((path, n))
+
+    def ordered(path):
+        return sorted(children.get(path, ()),
+                      key=lambda entry: (-entry[1], entry[0][-1]))
+
+    stack = list(reversed(ordered(())))
+    while stack:
+        path, n = stack.pop()
+        print(n, '  ' * (len(path) - 1) + path[-1], sep='\t', file=file)
+        stack.extend(reversed(ordered(path)))
+
+
+def _quantity_sum(dice, count, rng=None):
+    """
+    Return the sum of count rolls of a compiled Dice tuple, as one pool.
+    Rolls below zero count as zero, as in range(quantity).
+    """
+    number, sides, adjustment, multiplier = dice
+    if adjustment < 0 and number + adjustment < 0:
+        # Some rolls may be negative: roll them one by one
+        return sum(max(0, tablator.dice.roll(dice, rng))
+                   for i in range(count))
+    return (tablator.dice.roll_sum(number * count, sides, rng)
+            + adjustment * count) * multiplier
+
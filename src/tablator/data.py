@@ -1,16 +1,45 @@
 """
 Table data handling functions
+
+The table files of a data directory are found through its index, built
+with one os.scandir() pass and kept until the directory is modified:
+
+    tables      dict of table name: TableFile (path, format, size, mtime)
+    collisions  dict of table name: paths of the files giving that name
+                (x.json and x.yaml), of which the JSON one is indexed
+    mtimes      dict of directory: modification time (ns) when indexed
+
+With recursive indexing (see set_data_dir) the tables in subdirectories
+are indexed too, named by their path in the data directory with '/':
+'dungeon/level-1' for dungeon/level-1.json.  Hidden directories and
+links to directories are skipped.  The size and mtime of a TableFile are
+those at indexing time.
 """
 
 import os
+from collections import namedtuple
 
 from tablator.logger import debug, trace
 
+# Table file extensions (and formats), in order of preference
+FORMATS = ('json', 'yaml')
+
+# A table file: its path, format (json or yaml), size (bytes) and
+# modification time (ns)
+TableFile = namedtuple('TableFile', ['path', 'format', 'size', 'mtime'])
+
+# The index of a data directory (see above)
+Index = namedtuple('Index', ['tables', 'collisions', 'mtimes'])
+
 # Data directory (aka DATA_DIR)
 _data_dir = None
 
-# Table Name list cache
-_table_list = None
+# True if subdirectories of data directories are indexed
+_recursive = False
+
+# Indexes of data directories (dict of (directory, recursive): Index)
+_indexes = dict()
+
 
 def is_table(table_name=None):
     """
@@ -20,11 +49,8 @@ def is_table(table_name=None):
     trace('is_table')
     if table_name is None:
         raise ValueError('table_name is None')
-    global _table_list
-
-    load_table_list()
 
-    return table_name in _table_list
+    return table_name in get_index().tables
 
 
 def list_tables(*args):
@@ -34,70 +60,150 @@ def list_tables(*args):
     a table.
     """
     trace('list_tables')
-    load_table_list()
-    return list(_table_list)
+    return sorted(get_index().tables)
 
 
-def load(table_name=None):
+def find(table_name=None, data_dir=None, recursive=None):
     """
-    Load a table from DATA_DIR, return Python.
+    Return the path of a table's file in DATA_DIR (or data_dir),
+    'table_name.json' or 'table_name.yaml'.
+    recursive is as get_index().
+    Raises ValueError if not found.
     """
-    trace('load')
+    trace('find')
     if table_name is None:
         raise ValueError('table_name is None')
 
-    table_file = os.path.join(_data_dir, table_name + '.json')
-    if os.path.exists(table_file):
-        import json
-        with open(table_file, 'r') as f:
-            return json.load(f)
+    table_file = get_index(data_dir, recursive).tables.get(table_name)
+    if table_file is None:
+        raise ValueError("Table not found: " + table_name)
+    return table_file.path
 
-    table_file = os.path.join(_data_dir, table_name + '.yaml')
-    if os.path.exists(table_file):
-        import yaml
-        with open(table_file, 'r') as f:
-            return yaml.load(f, Loader=yaml.SafeLoader)
 
-    raise ValueError("Table not found: " + table_name)
+def get_index(data_dir=None, recursive=None):
+    """
+    Return the Index of DATA_DIR (or data_dir), recursive or not (default:
+    as set by set_data_dir).
+    The index is built again if a directory in it was modified (a file
+    added, removed or renamed) since it was built.
+    """
+    trace('get_index')
+    if data_dir is None:
+        data_dir = _data_dir
+    if recursive is None:
+        recursive = _recursive
+    key = (data_dir, recursive)
+    entry = _indexes.get(key)
+    if entry is None or not _is_current(entry):
+        entry = index(data_dir, recursive)
+        _indexes[key] = entry
+    return entry
+
+
+def index(data_dir, recursive=False):
+    """
+    Index the table files (json or yaml) in a directory, and in its
+    subdirectories if recursive, with one os.scandir() pass.
+    Returns an Index.
+    """
+    trace('index')
+    tables = dict()
+    collisions = dict()
+    mtimes = dict()
+    pending = [(data_dir, '')]
+    while pending:
+        directory, prefix = pending.pop()
+        try:
+            mtimes[directory] = os.stat(directory).st_mtime_ns
+        except (OSError, TypeError):
+            mtimes[directory] = None
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                debug('file_name', entry.name)
+                if recursive and not entry.name.startswith('.') \
+                        and entry.is_dir(follow_symlinks=False):
+                    pending.append((entry.path, prefix + entry.name + '/'))
+                    continue
+                table_name, dot, extension = entry.name.rpartition('.')
+                if not dot or extension not in FORMATS \
+                        or not entry.is_file():
+                    continue
+                table_name = prefix + table_name
+                stat = entry.stat()
+                table_file = TableFile(entry.path, extension, stat.st_size,
+                                       stat.st_mtime_ns)
+                other = tables.get(table_name)
+                if other is not None:
+                    debug('table name collision', other.path, entry.path)
+                    collisions.setdefault(table_name, [other.path])
+                    collisions[table_name].append(entry.path)
+                    collisions[table_name].sort()
+                    if FORMATS.index(other.format) < FORMATS.index(extension):
+                        continue
+                tables[table_name] = table_file
+    return Index(tables, collisions, mtimes)
+
+
+def _is_current(entry):
+    """
+    Return True if no directory of an Index was modified since it was built.
+    """
+    for directory, mtime in entry.mtimes.items():
+        try:
+            if os.stat(directory).st_mtime_ns != mtime:
+                return False
+        except (OSError, TypeError):
+            if mtime is not None:
+                return False
+    return True
 
 
-def load_table_list():
+def load(table_name=None):
     """
-    Build of list of table names from files in DATA_DIR with json or yaml
-    extensions.
+    Load a table from DATA_DIR, return Python.
     """
-    trace('load_table_list')
-    global _data_dir, _table_list
+    trace('load')
+    return load_file(find(table_name))
 
-    # List of Tables already exists, nothing to do
-    if _table_list is not None:
-        return
 
-    # Build the list of tables
-    table_list = list()
+def load_file(table_file):
+    """
+    Load a table file (JSON or YAML), return Python.
+    """
+    trace('load_file')
+    if table_file.endswith('.json'):
+        import json
+        with open(table_file, 'r') as f:
+            return json.load(f)
+    else:
+        import yaml
+        # libyaml's loader is much faster, if PyYAML was built with it
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        with open(table_file, 'r') as f:
+            return yaml.load(f, Loader=loader)
 
-    for file_name in os.listdir(_data_dir):
-        debug('file_name', file_name)
-        if file_name.endswith('.json'):
-            table_name = file_name.removesuffix('.json')
-            table_list.append(table_name)
-        elif file_name.endswith('.yaml'):
-            table_name = file_name.removesuffix('.yaml')
-            table_list.append(table_name)
 
-    _table_list = sorted(table_list)
+def scan(data_dir, recursive=False):
+    """
+    Return the sorted names of the tables (json or yaml files) in a
+    directory, and in its subdirectories if recursive.
+    """
+    trace('scan')
+    return sorted(index(data_dir, recursive).tables)
 
 
-def set_data_dir(data_dir):
+def set_data_dir(data_dir, recursive=False):
     """
-    Set the data directory (DATA_DIR)
+    Set the data directory (DATA_DIR), and whether the tables in its
+    subdirectories are indexed too.
     Raises FileNotFoundError
     """
     trace('set_data_dir')
     data_dir = os.path.realpath(data_dir)
     if os.path.isdir(data_dir):
         debug('Setting DATA_DIR to', data_dir)
-        global _data_dir
+        global _data_dir, _recursive
         _data_dir = data_dir
+        _recursive = recursive
     else:
         raise FileNotFoundError(data_dir)
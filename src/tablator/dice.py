@@ -0,0 +1,360 @@
+"""
+Dice expressions
+
+A dice expression is compiled once into a Dice tuple, which is then rolled.
+
+    1       10
+    1d6     1d6x10
+    2d6-1
+    2d10+3x100
+            IdJ+KxM = (number)d(sides)(+/-adjustment)x(multiplier)
+
+A constant such as "10" compiles to Dice(0, 0, 10, 1).
+
+The sum of NdS is drawn by one of four methods:
+
+    loop        roll each die (small pools, up to LOOP_MAX dice)
+    exact       inverse-CDF lookup in the exact distribution of the sum,
+                built once per (N, S) by convolution
+    multinomial draw how many of the N dice show each face, as S binomial
+                draws (see multinomial()): exact, at a cost that does
+                not grow with N
+    normal      normal approximation, rounded and clipped to [N, N*S]
+
+Pools too large for the exact table (see EXACT_MAX) use the large pool
+method, set with set_large_pool() ('multinomial' by default).  Only the
+'normal' method changes the distribution of the sums; it is opt-in.
+
+Binomial deviates are drawn from the RNG's random() (see tablator.rng):
+by waiting times for small means, and by Hormann's BTRS transformed
+rejection otherwise, so a draw costs the same for any n.
+"""
+
+import math
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from random import gauss, randint, random, randrange
+
+from tablator.logger import trace
+
+PATTERN = '([1-9][0-9]*)d([1-9][0-9]*)([+-][1-9][0-9]*)?(?:x([1-9][0-9]*))?'
+CONSTANT_PATTERN = '-?[0-9]+'
+
+# Compiled patterns, built on first use so 're' is not imported at start-up
+MATCHER = None
+CONSTANT = None
+
+# Largest pool rolled die by die
+LOOP_MAX = 4
+
+# Most convolution work (N times the number of possible sums) for the
+# exact distribution
+EXACT_MAX = 1000000
+
+POOL_METHODS = ('multinomial', 'normal', 'exact', 'loop')
+
+# Method for pools too large for the exact distribution
+_large_pool = 'multinomial'
+
+Dice = namedtuple('Dice', ['number', 'sides', 'adjustment', 'multiplier'])
+
+
+def binomial(n, p, rng=None):
+    """
+    Return the number of successes in n trials of probability p.
+    rng is an RNG (see tablator.rng), default the random module.
+    Raises ValueError if n < 0 or p is not in [0, 1].
+    """
+    if n < 0:
+        raise ValueError(f'Number of trials must be >= 0: {n}')
+    if not 0.0 <= p <= 1.0:
+        raise ValueError(f'Probability must be in [0, 1]: {p}')
+    if n == 0 or p == 0.0:
+        return 0
+    if p == 1.0:
+        return n
+    if p > 0.5:
+        return n - binomial(n, 1.0 - p, rng)
+    draw = random if rng is None else rng.random
+
+    if n * p < 10.0:
+        # Count the successes, skipping the failures between them: the
+        # gaps are geometric
+        c = math.log(1.0 - p)
+        successes = trials = 0
+        while True:
+            trials += math.floor(math.log(1.0 - draw()) / c) + 1
+            if trials > n:
+                return successes
+            successes += 1
+
+    # BTRS (Hormann, 1993), with the squeeze test
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    vr = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(p / (1.0 - p))
+    m = math.floor((n + 1) * p)     # the mode
+    h = math.lgamma(m + 1) + math.lgamma(n - m + 1)
+    while True:
+        u = draw() - 0.5
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        v = draw()
+        if us >= 0.07 and v <= vr:
+            return k
+        v *= alpha / (a / (us * us) + b)
+        if v > 0.0 and math.log(v) <= h - math.lgamma(k + 1) \
+                - math.lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
+
+@lru_cache(maxsize=1024)
+def compile(expression):
+    """
+    Compile a dice expression (str) into a Dice tuple.
+    Raises ValueError if the expression is malformed.
+    """
+    trace('compile')
+    global MATCHER, CONSTANT
+    if MATCHER is None:
+        import re
+        MATCHER = re.compile(PATTERN)
+        CONSTANT = re.compile(CONSTANT_PATTERN)
+    result = MATCHER.fullmatch(expression)
+    if result is not None:
+        number, sides, adjustment, multiplier = result.groups()
+        return Dice(int(number), int(sides),
+                    int(adjustment) if adjustment is not None else 0,
+                    int(multiplier) if multiplier is not None else 1)
+    if CONSTANT.fullmatch(expression) is not None:
+        return Dice(0, 0, int(expression), 1)
+    raise ValueError(f'Invalid dice expression: {expression}')
+
+
+def compile_table(table):
+    """
+    Compile the quantity of every row or column of a table.
+    The Dice tuple is stored in the row or column as '_dice'.
+    Raises ValueError naming the table if a quantity is malformed.
+    """
+    trace('compile_table')
+    entries = table['rows'] if 'rows' in table else table.get('columns', [])
+    for entry in entries:
+        if 'quantity' in entry:
+            try:
+                entry['_dice'] = compile(entry['quantity'])
+            except ValueError as e:
+                raise ValueError(f"{table.get('name')}: {e}") from None
+
+
+@lru_cache(maxsize=256)
+def distribution(number, sides):
+    """
+    The exact distribution of the sum of NdS.
+    Returns the cumulative counts of the sums N, N+1, ..., N*S, out of
+    S**N outcomes, as a tuple of int.
+    """
+    trace('distribution')
+    counts = [1] * sides
+    for n in range(1, number):
+        # counts(n+1)[k] = counts(n)[k-S+1] + ... + counts(n)[k]
+        window = 0
+        new_counts = list()
+        for k in range(len(counts) + sides - 1):
+            if k < len(counts):
+                window += counts[k]
+            if k >= sides:
+                window -= counts[k - sides]
+            new_counts.append(window)
+        counts = new_counts
+    cumulative = list()
+    total = 0
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return tuple(cumulative)
+
+
+def mean(dice):
+    """
+    Return the exact mean of a compiled Dice tuple (a Fraction).
+    """
+    from fractions import Fraction
+    number, sides, adjustment, multiplier = dice
+    return (Fraction(number * (sides + 1), 2) + adjustment) * multiplier
+
+
+def multinomial(n, weights, rng=None):
+    """
+    Share n trials among outcomes of the given weights.
+    rng is an RNG (see tablator.rng), default the random module.
+    Returns a list of int (the count of each outcome) adding up to n.
+    """
+    total = sum(weights)
+    counts = list()
+    for weight in weights:
+        if n == 0 or weight >= total:
+            k = n
+        else:
+            k = binomial(n, weight / total, rng)
+        counts.append(k)
+        n -= k
+        total -= weight
+    return counts
+
+
+def pool_method(number, sides):
+    """
+    Return the method ('loop', 'exact', 'multinomial' or 'normal') used to
+    sum NdS.
+    """
+    if number <= LOOP_MAX:
+        return 'loop'
+    if number * (number * (sides - 1) + 1) <= EXACT_MAX:
+        return 'exact'
+    return _large_pool
+
+
+def roll(dice, rng=None):
+    """
+    Roll a compiled Dice tuple.
+    rng is an RNG (see tablator.rng), default the random module.
+    Returns an int.
+    """
+    return (roll_sum(dice.number, dice.sides, rng) + dice.adjustment) \
+        * dice.multiplier
+
+
+def roll_many(dice, count, rng=None):
+    """
+    Roll a compiled Dice tuple N times.
+    rng is an RNG (see tablator.rng), default the random module, or a
+    NumPy Generator, which draws the N sums in bulk.
+    Returns a list of int, or a NumPy array if rng is a NumPy Generator.
+    """
+    trace('roll_many')
+    number, sides, adjustment, multiplier = dice
+    numpy_rng = hasattr(rng, 'integers')
+    if numpy_rng:
+        sums = _numpy_sums(rng, number, sides, count)
+    elif number == 0:
+        sums = [0] * count
+    elif pool_method(number, sides) == 'exact':
+        cumulative = distribution(number, sides)
+        total = cumulative[-1]
+        draw = randrange if rng is None else rng.randrange
+        sums = [number + bisect_right(cumulative, draw(total))
+                for i in range(count)]
+    else:
+        sums = [roll_sum(number, sides, rng) for i in range(count)]
+    if numpy_rng:
+        return (sums + adjustment) * multiplier
+    return [(n + adjustment) * multiplier for n in sums]
+
+
+def roll_sum(number, sides, rng=None):
+    """
+    Return the sum of NdS.
+    rng is an RNG (see tablator.rng), default the random module.
+    """
+    if number == 0:
+        return 0
+    method = pool_method(number, sides)
+    if method == 'loop':
+        draw = randint if rng is None else rng.randint
+        n = 0
+        for i in range(number):
+            n += draw(1, sides)
+        return n
+    if method == 'exact':
+        cumulative = distribution(number, sides)
+        draw = randrange if rng is None else rng.randrange
+        return number + bisect_right(cumulative, draw(cumulative[-1]))
+    if method == 'multinomial':
+        faces = multinomial(number, [1] * sides, rng)
+        return sum(face * k for face, k in enumerate(faces, 1))
+    mean = number * (sides + 1) / 2
+    deviation = math.sqrt(number * (sides * sides - 1) / 12)
+    draw = gauss if rng is None else rng.gauss
+    return min(max(round(draw(mean, deviation)), number), number * sides)
+
+
+def set_large_pool(method):
+    """
+    Set the method for pools too large for the exact distribution.
+    Raises ValueError for an unknown method.
+    """
+    trace('set_large_pool')
+    if method not in POOL_METHODS:
+        raise ValueError(f'Unknown pool method: {method}')
+    global _large_pool
+    _large_pool = method
+
+
+def variance(dice):
+    """
+    Return the exact variance of a compiled Dice tuple (a Fraction).
+    """
+    from fractions import Fraction
+    number, sides, adjustment, multiplier = dice
+    return Fraction(number * (sides * sides - 1), 12) * multiplier * multiplier
+
+
+@lru_cache(maxsize=256)
+def _numpy_cdf(number, sides):
+    """
+    The exact distribution of the sum of NdS as a NumPy array of
+    cumulative probabilities (read-only).
+    """
+    import numpy
+
+    cumulative = distribution(number, sides)
+    total = cumulative[-1]
+    cdf = numpy.array([c / total for c in cumulative])
+    cdf.flags.writeable = False
+    return cdf
+
+
+def _numpy_sums(rng, number, sides, count):
+    """
+    Draw N sums of NdS with a NumPy Generator.
+    Returns an int64 array.
+    """
+    import numpy
+
+    if number == 0:
+        return numpy.zeros(count, dtype=numpy.int64)
+    method = pool_method(number, sides)
+    if method == 'exact':
+        cdf = _numpy_cdf(number, sides)
+        sums = numpy.searchsorted(cdf, rng.random(count), side='right')
+        return number + numpy.minimum(sums, len(cdf) - 1)
+    if method == 'normal':
+        mean = number * (sides + 1) / 2
+        deviation = math.sqrt(number * (sides * sides - 1) / 12)
+        sums = numpy.rint(rng.normal(mean, deviation, count))
+        return numpy.clip(sums, number, number * sides).astype(numpy.int64)
+    if method == 'multinomial':
+        # Face counts, in chunks of about a million
+        sums = numpy.empty(count, dtype=numpy.int64)
+        faces = numpy.arange(1, sides + 1)
+        step = max(1, (1 << 20) // sides)
+        for start in range(0, count, step):
+            size = min(step, count - start)
+            counts = rng.multinomial(number, [1 / sides] * sides, size=size)
+            sums[start:start + size] = counts @ faces
+        return sums
+    # Loop, in chunks of about a million dice
+    sums = numpy.empty(count, dtype=numpy.int64)
+    step = max(1, (1 << 20) // number)
+    for start in range(0, count, step):
+        size = min(step, count - start)
+        dice = rng.integers(1, sides + 1, size=(size, number))
+        sums[start:start + size] = dice.sum(axis=1)
+    return sums
@@ -0,0 +1,184 @@
+"""
+Persistent cache of parsed and validated tables.
+
+Each table file gets one entry in the cache directory, holding the table
+and the source file's path, modification time, size and SHA-256.
+An entry is used when the file's mtime and size match, or, if they
+changed, when its content hash still matches.  Otherwise the entry is
+stale and removed.
+
+Entries are written to a temporary file and renamed, so readers never
+see a partial entry.  The cache is off until set_cache_dir() is called.
+"""
+
+import os
+
+from tablator.logger import debug, trace
+
+# Entry format version, stored in every entry
+FORMAT = 1
+
+SUFFIX = '.cache'
+
+# Suffix of the temporary files entries are written to
+TEMP_SUFFIX = '.tmp'
+
+# Cache directory, None if the cache is off
+_cache_dir = None
+
+
+def clear():
+    """
+    Remove every entry from the cache directory, and the temporary files
+    left by interrupted writes.
+    Returns the number of entries removed.
+    """
+    trace('diskcache.clear')
+    if _cache_dir is None:
+        return 0
+    count = 0
+    for file_name in os.listdir(_cache_dir):
+        if file_name.endswith(SUFFIX):
+            try:
+                os.remove(os.path.join(_cache_dir, file_name))
+                count += 1
+            except FileNotFoundError:
+                pass
+        elif file_name.endswith(TEMP_SUFFIX):
+            _remove(os.path.join(_cache_dir, file_name))
+    debug('removed', count, 'cache entries')
+    return count
+
+
+def entry_path(path):
+    """
+    Return the cache entry file for a table file.
+    """
+    import hashlib
+    key = hashlib.sha256(os.path.realpath(path).encode()).hexdigest()
+    return os.path.join(_cache_dir, key[:32] + SUFFIX)
+
+
+def fetch(path):
+    """
+    Look up a table file in the cache.
+    Returns (table, None) on a hit.  On a miss returns (None, stamp),
+    where stamp describes the file and is passed on to store().
+    The file is hashed before the caller parses it, so a file changed
+    while it is parsed is not cached under its new content.
+    """
+    trace('diskcache.fetch')
+    import marshal
+    stat = os.stat(path)
+    stamp = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+    entry_file = entry_path(path)
+    try:
+        with open(entry_file, 'rb') as f:
+            entry = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        entry = None
+    if type(entry) is not dict or entry.get('format') != FORMAT \
+            or entry.get('path') != os.path.realpath(path):
+        debug('cache miss', path)
+        stamp['sha256'] = hash_file(path)
+        return None, stamp
+
+    if entry['mtime'] == stamp['mtime'] and entry['size'] == stamp['size']:
+        debug('cache hit', path)
+        return entry['table'], None
+
+    # Touched, perhaps not changed
+    stamp['sha256'] = hash_file(path)
+    if entry['sha256'] == stamp['sha256']:
+        debug('cache hit (same content)', path)
+        store(path, stamp, entry['table'])
+        return entry['table'], None
+
+    debug('cache stale', path)
+    try:
+        os.remove(entry_file)
+    except FileNotFoundError:
+        pass
+    return None, stamp
+
+
+def hash_file(path):
+    """
+    Return the SHA-256 (hex) of a file's content.
+    """
+    import hashlib
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def is_enabled():
+    """
+    Return True if the cache is on.
+    """
+    return _cache_dir is not None
+
+
+def set_cache_dir(cache_dir):
+    """
+    Set the cache directory, creating it if needed.
+    None turns the cache off.
+    """
+    trace('set_cache_dir')
+    global _cache_dir
+    if cache_dir is None:
+        _cache_dir = None
+        return
+    cache_dir = os.path.realpath(os.path.expanduser(cache_dir))
+    os.makedirs(cache_dir, exist_ok=True)
+    debug('Setting cache dir to', cache_dir)
+    _cache_dir = cache_dir
+
+
+def store(path, stamp, table):
+    """
+    Write a validated table to the cache, atomically.
+    stamp is the file description returned by fetch(), taken before the
+    file was parsed.  Tables holding values marshal cannot write (such as
+    YAML dates), or a cache directory that cannot be written, are skipped.
+    """
+    trace('diskcache.store')
+    import marshal
+    import tempfile
+    entry = {
+        'format': FORMAT,
+        'path': os.path.realpath(path),
+        'mtime': stamp['mtime'],
+        'size': stamp['size'],
+        'sha256': stamp['sha256'],
+        'table': table,
+    }
+    try:
+        data = marshal.dumps(entry)
+    except ValueError as e:
+        debug('not cached', path, e)
+        return
+    try:
+        fd, temp_file = tempfile.mkstemp(dir=_cache_dir, suffix=TEMP_SUFFIX)
+    except OSError as e:
+        debug('not cached', path, e)
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, entry_path(path))
+    except OSError as e:
+        _remove(temp_file)
+        debug('not cached', path, e)
+    except BaseException:
+        _remove(temp_file)
+        raise
+
+
+def _remove(path):
+    """
+    Remove a file, if it can be.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,17 +1,49 @@
 """
 Logging configuration and convenience functions.
+
+Messages are printed to the standard output, or sent to the standard
+logging module (logger 'tablator') after use_logging().
+
+Arguments are only formatted when the message is enabled.  An argument
+that is callable is called to get its value, so expensive values can be
+passed lazily: debug('rows', lambda: len(rows)).
+
+Hot code checks 'enabled' before calling debug() or trace(), so disabled
+logging costs one attribute test:
+
+    if tablator.logger.enabled:
+        trace('random_row')
 """
 
 _debug_on = False
 _trace_on = False
 
+# True if debug or trace messages are enabled
+enabled = False
+
+# Standard library logger, if messages are routed to logging
+_logger = None
+
+# logging level of trace messages (below logging.DEBUG)
+TRACE = 5
+
+
+def _message(args):
+    """
+    Join the arguments into a message, calling any callable argument.
+    """
+    return ' '.join(str(arg() if callable(arg) else arg) for arg in args)
+
 
 def debug(*args):
     """
     Print debug messages, if enabled
     """
     if _debug_on:
-        print('---', *args)
+        if _logger is None:
+            print('---', _message(args))
+        else:
+            _logger.debug(_message(args))
 
 
 def set(d=False, t=False):
@@ -20,9 +52,10 @@ def set(d=False, t=False):
     """
     assert(type(d) is bool)
     assert(type(t) is bool)
-    global _debug_on, _trace_on
+    global _debug_on, _trace_on, enabled
     _debug_on = d
     _trace_on = t
+    enabled = d or t
 
 
 def trace(*args):
@@ -30,4 +63,22 @@ def trace(*args):
     Print trace messages, if enabled
     """
     if _trace_on:
-        print('===', *args)
+        if _logger is None:
+            print('===', _message(args))
+        else:
+            _logger.log(TRACE, _message(args))
+
+
+def use_logging(on=True):
+    """
+    Send messages to the standard logging module (logger 'tablator')
+    instead of printing them.  Debug messages are logged at DEBUG, trace
+    messages at TRACE (5).  Messages must still be enabled with set().
+    """
+    global _logger
+    if on:
+        import logging
+        logging.addLevelName(TRACE, 'TRACE')
+        _logger = logging.getLogger('tablator')
+    else:
+        _logger = None
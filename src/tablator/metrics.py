@@ -0,0 +1,241 @@
+"""
+Per-table runtime metrics
+
+An opt-in collector of what the rolls do, for each table:
+
+    rolls           rolls on the table (tablator.plan.evaluate, or
+                    lookup_rows and lookup_columns)
+    draws           random numbers drawn while rolling on the table itself
+    quantities      quantities rolled
+    hits, misses    load_table() calls served by the table cache, or not
+    time            seconds spent rolling on the table, with its subtables
+    self_time       seconds spent rolling on the table, without them
+    load_time       seconds spent reading the table (cache misses)
+    bytes           estimated memory of the table when it was loaded
+
+Collecting is enabled with set(True).  The evaluator and the table
+functions check 'enabled' first, as they do for logging, so disabled
+metrics cost one attribute test:
+
+    if tablator.metrics.enabled:
+        tablator.metrics.hit(table_name, table)
+
+Tables are named as they were loaded (the names of the compiled plan's
+nodes); the table functions, which get table dicts, name a table by its
+'name'.
+
+While enabled, the RNG of the module functions (see tablator.rng) is
+wrapped to count draws.  The collector is not thread-safe: it is meant
+for one thread rolling at a time.
+
+The metrics are returned by snapshot() as a dict, and written by
+to_json() and to_prometheus() (text exposition format).
+"""
+
+import time
+
+import tablator.cache
+import tablator.rng
+
+# True if metrics are collected
+enabled = False
+
+# Per-table metrics (dict of table name: dict of metric: value)
+_tables = dict()
+
+# Tables being rolled, innermost last: [table name, seconds in subtables,
+# start time]
+_stack = list()
+
+# RNG of the module functions before set(True) wrapped it
+_wrapped = None
+
+# Name of the metrics of draws made outside any table roll
+OUTSIDE = ''
+
+_METRICS = ('rolls', 'draws', 'quantities', 'hits', 'misses', 'time',
+            'self_time', 'load_time', 'bytes')
+
+# Prometheus name, type and help of each metric
+_PROMETHEUS = {
+    'rolls': ('tablator_rolls_total', 'counter', 'Rolls on the table'),
+    'draws': ('tablator_rng_draws_total', 'counter',
+              'Random numbers drawn rolling on the table itself'),
+    'quantities': ('tablator_quantity_rolls_total', 'counter',
+                   'Quantities rolled'),
+    'hits': ('tablator_cache_hits_total', 'counter', 'Table cache hits'),
+    'misses': ('tablator_cache_misses_total', 'counter',
+               'Table cache misses'),
+    'time': ('tablator_roll_seconds_total', 'counter',
+             'Seconds rolling on the table, with its subtables'),
+    'self_time': ('tablator_roll_self_seconds_total', 'counter',
+                  'Seconds rolling on the table, without its subtables'),
+    'load_time': ('tablator_load_seconds_total', 'counter',
+                  'Seconds reading the table'),
+    'bytes': ('tablator_table_bytes', 'gauge',
+              'Estimated memory of the loaded table'),
+}
+
+
+class CountingRNG:
+    """
+    An RNG (see tablator.rng) counting the draws of another, None for the
+    random module, against the table being rolled.
+    """
+
+    def __init__(self, rng=None):
+        if rng is None:
+            import random as rng
+        self.rng = rng
+
+    def gauss(self, mu=0.0, sigma=1.0):
+        _draw()
+        return self.rng.gauss(mu, sigma)
+
+    def randint(self, a, b):
+        _draw()
+        return self.rng.randint(a, b)
+
+    def randrange(self, n):
+        _draw()
+        return self.rng.randrange(n)
+
+    def random(self):
+        _draw()
+        return self.rng.random()
+
+    def seed(self, a=None):
+        self.rng.seed(a)
+
+
+def _draw():
+    """
+    Count a draw against the table being rolled.
+    """
+    _get(_stack[-1][0] if _stack else OUTSIDE)['draws'] += 1
+
+
+def _get(table_name):
+    """
+    Return the metrics of a table, adding them if new.
+    """
+    metrics = _tables.get(table_name)
+    if metrics is None:
+        metrics = _tables[table_name] = dict.fromkeys(_METRICS, 0)
+    return metrics
+
+
+def enter(table_name):
+    """
+    Start a roll on a table: count it, and count the draws and time until
+    leave() against it.
+    """
+    _get(table_name)['rolls'] += 1
+    _stack.append([table_name, 0.0, time.perf_counter()])
+
+
+def hit(table_name, table):
+    """
+    Count a table cache hit.
+    """
+    _get(table_name)['hits'] += 1
+
+
+def leave():
+    """
+    End the roll started by the last enter(), adding its time.
+    """
+    table_name, inner, start = _stack.pop()
+    elapsed = time.perf_counter() - start
+    metrics = _tables[table_name]
+    metrics['time'] += elapsed
+    metrics['self_time'] += elapsed - inner
+    if _stack:
+        _stack[-1][1] += elapsed
+
+
+def measure(table, function):
+    """
+    Roll on a table with function(table), counting the roll and its time
+    against the table's 'name'.
+    Returns what function returns.
+    """
+    enter(table['name'])
+    try:
+        return function(table)
+    finally:
+        leave()
+
+
+def miss(table_name, table, seconds):
+    """
+    Count a table cache miss: table was read in seconds.
+    """
+    metrics = _get(table_name)
+    metrics['misses'] += 1
+    metrics['load_time'] += seconds
+    metrics['bytes'] = tablator.cache.estimate_size(table)
+
+
+def quantity():
+    """
+    Count a quantity rolled on the table being rolled.
+    """
+    _get(_stack[-1][0] if _stack else OUTSIDE)['quantities'] += 1
+
+
+def reset():
+    """
+    Forget the metrics collected.
+    """
+    _tables.clear()
+    _stack.clear()
+
+
+def set(on=True):
+    """
+    Enable or disable collecting metrics.  The metrics collected are kept
+    (see reset()).
+    """
+    global enabled, _wrapped
+    if on and not enabled:
+        _wrapped = tablator.rng._rng
+        tablator.rng.set_rng(CountingRNG(_wrapped))
+    elif enabled and not on:
+        tablator.rng.set_rng(_wrapped)
+        _wrapped = None
+    enabled = on
+
+
+def snapshot():
+    """
+    Return a copy of the metrics, as a dict of table name: dict of metric
+    name: value.
+    """
+    return {name: dict(metrics) for name, metrics in _tables.items()}
+
+
+def to_json(indent=2):
+    """
+    Return the metrics as JSON.
+    """
+    import json
+    return json.dumps(snapshot(), indent=indent, sort_keys=True)
+
+
+def to_prometheus():
+    """
+    Return the metrics in the Prometheus text exposition format, one
+    sample per table (label 'table') and metric.
+    """
+    lines = list()
+    for metric in _METRICS:
+        name, kind, help = _PROMETHEUS[metric]
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for table_name in sorted(_tables):
+            label = table_name.replace('\\', '\\\\').replace('"', '\\"') \
+                .replace('\n', '\\n')
+            lines.append('{}{{table="{}"}} {}'.format(
+                name, label, _tables[table_name][metric]))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,63 @@
+"""
+Output formats of generated items
+
+    plain   one item per line, as it reads ("Blue (2d4+2 gumdrops)")
+    jsonl   one JSON object per line: table, name, quantity, units, subitem
+    csv     comma separated values, with a header line
+    tsv     tab separated values, with a header line
+
+The structured formats write the records of tablator.plan.Item (see
+evaluate(records=True)) so the name and quantity of an item need not be
+parsed back out of its text.  A missing quantity, units or subitem is
+null in JSON and an empty field in CSV and TSV.
+Every format writes a chunk of items with one write.  The json and csv
+modules are only imported when used, to keep start-up fast.
+"""
+
+import sys
+
+FORMATS = ('plain', 'jsonl', 'csv', 'tsv')
+
+# Fields of a record, in order
+FIELDS = ('table', 'name', 'quantity', 'units', 'subitem')
+
+
+def write(chunks, format='plain', out=None):
+    """
+    Write chunks of items to the standard output, or out, one item per
+    line, with one write per chunk.  The items are str for plain and
+    tablator.plan.Item records for the other formats.
+    Raises ValueError for an unknown format.
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Unknown output format: {format}')
+    if out is None:
+        out = sys.stdout
+    if format == 'plain':
+        for chunk in chunks:
+            if chunk:
+                out.write('\n'.join(chunk))
+                out.write('\n')
+    elif format == 'jsonl':
+        import json
+        dumps = json.JSONEncoder(ensure_ascii=False).encode
+        for chunk in chunks:
+            if chunk:
+                out.write(''.join([dumps(dict(zip(FIELDS, item))) + '\n'
+                                   for item in chunk]))
+    else:
+        import csv
+        import io
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n',
+                            delimiter=',' if format == 'csv' else '\t')
+        writer.writerow(FIELDS)
+        for chunk in chunks:
+            if chunk:
+                # Records end with the text, which is not written
+                writer.writerows([item[:5] for item in chunk])
+                out.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():   # no chunks: the header only
+            out.write(buffer.getvalue())
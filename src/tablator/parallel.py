@@ -0,0 +1,132 @@
+"""
+Parallel generation in a process pool.
+
+The rolls are split into chunks of CHUNK_SIZE rolls.  Chunk i rolls with
+its own RNG, seeded from the master seed and i, so the items generated
+for a seed are the same whatever the number of workers (and the same
+when run in this process).  Each worker sets up DATA_DIR, the disk cache
+and the sampler once, and loads and compiles each table once.
+Chunks are handed out as workers finish, at most two per worker ahead.
+
+Chunks are returned, or yielded by generate_chunks(), in order.
+"""
+
+import os
+
+import tablator.data
+import tablator.dice
+import tablator.diskcache
+import tablator.plan
+import tablator.rng
+import tablator.sampler
+from tablator.logger import debug, trace
+
+# Rolls per chunk (changing it changes the items generated for a seed)
+CHUNK_SIZE = 10000
+
+
+def chunk_seed(seed, index):
+    """
+    Return the seed of chunk index from the master seed (an int).
+    """
+    import hashlib
+    digest = hashlib.sha256(f'tablator/{seed}/{index}'.encode()).digest()
+    return int.from_bytes(digest[:16], 'big')
+
+
+def generate(table_name, num_rolls=1, seed=None, workers=None,
+             backend='random', chunk_size=None):
+    """
+    Generate N items from the given table in a pool of worker processes.
+    Assumes DATA_DIR has been set.
+    seed is the master seed (an int, default random), backend the RNG
+    backend of the chunks (see tablator.rng), workers the number of
+    processes (default the number of CPUs; 1 rolls in this process).
+    Return a list of item names (str), the same for a given seed and
+    chunk_size whatever the number of workers.
+    Raises ValueError if the table cannot be compiled.
+    """
+    trace('parallel.generate')
+    values = list()
+    for chunk in generate_chunks(table_name, num_rolls, seed, workers,
+                                 backend, chunk_size):
+        values.extend(chunk)
+    return values
+
+
+def generate_chunks(table_name, num_rolls=1, seed=None, workers=None,
+                    backend='random', chunk_size=None, records=False):
+    """
+    Generate N items as generate() does, yielding the items of each chunk
+    (a list of str, or of tablator.plan.Item if records is True) in order
+    as they are done.
+    """
+    trace('parallel.generate_chunks')
+    if seed is None:
+        seed = int.from_bytes(os.urandom(16), 'big')
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    if backend not in tablator.rng.BACKENDS:
+        raise ValueError(f'Unknown RNG backend: {backend}')
+    chunks = [(i, min(chunk_size, num_rolls - start))
+              for i, start in enumerate(range(0, num_rolls, chunk_size))]
+    # Compile here first: a bad table fails before any worker starts
+    tablator.plan.get_plan(table_name)
+
+    if workers == 1 or len(chunks) <= 1:
+        for index, count in chunks:
+            yield _roll_chunk(table_name, count, seed, index, backend,
+                              records)
+        return
+
+    import collections
+    import concurrent.futures
+    if workers is None:
+        workers = os.cpu_count() or 1
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(tablator.data._data_dir, tablator.data._recursive,
+                  tablator.diskcache._cache_dir, tablator.sampler._sampler,
+                  tablator.dice._large_pool))
+    debug('rolling', num_rolls, 'in', len(chunks), 'chunks,', workers,
+          'workers')
+    # At most 2 chunks per worker in flight, so a slow reader of the
+    # chunks does not pile up results in memory
+    pending = collections.deque()
+    with executor:
+        try:
+            for index, count in chunks:
+                pending.append(executor.submit(
+                    _roll_chunk, table_name, count, seed, index, backend,
+                    records))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _init_worker(data_dir, recursive, cache_dir, sampler, large_pool):
+    """
+    Set up a worker process like this one.
+    """
+    tablator.data.set_data_dir(data_dir, recursive)
+    tablator.diskcache.set_cache_dir(cache_dir)
+    tablator.sampler.set_sampler(sampler)
+    tablator.dice.set_large_pool(large_pool)
+
+
+def _roll_chunk(table_name, count, seed, index, backend, records=False):
+    """
+    Roll count times on a table with the RNG of chunk index.
+    Returns a list of item names (or records).
+    """
+    rng = tablator.rng.make(backend, chunk_seed(seed, index))
+    plan = tablator.plan.get_plan(table_name)
+    evaluate = tablator.plan.evaluate
+    values = list()
+    for i in range(count):
+        values.extend(evaluate(plan, None, rng, records))
+    return values
@@ -0,0 +1,519 @@
+"""
+Compiled tables (execution plans)
+
+compile() loads a table and every table it refers to, checks the whole
+graph once (missing tables, cycles, chances, weights, dice expressions),
+and links each reference to a node object.  Rolling on a plan is then a
+walk over those nodes, with no table lookups or key checks.
+
+A plan rolls the same items, drawing the same random numbers in the same
+order, as tablator.table.lookup_rows and lookup_columns.  The roll() methods
+of the nodes recurse like those functions; evaluate() does the same work
+with an explicit stack, so deep tables do not reach the recursion limit.
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+from random import randint, randrange
+
+import tablator.dice
+import tablator.metrics
+import tablator.rng
+import tablator.sampler
+import tablator.session
+import tablator.table
+from tablator.logger import debug, trace
+
+# Default most nested table rolls allowed by evaluate()
+MAX_DEPTH = 10000
+
+# Default rolls per chunk yielded by iter_generate()
+CHUNK_SIZE = 10000
+
+# evaluate() stack frame kinds
+_ROLL = 0       # (_ROLL, depth, node, out): roll once on node into out
+_FINISH = 1     # (_FINISH, depth, row, out, subitem): finish a subtable row
+_COLUMN = 2     # (_COLUMN, depth, node, out, index): columns from index on
+_REPEAT = 3     # (_REPEAT, depth, node, out, count): roll count more times
+_END = 4        # (_END, depth): end a roll on a table (metrics only)
+
+# Cache compiled plans (dict of 'name': str, (plan, nodes))
+_plans = dict()
+
+# A generated item as a record (see evaluate(records=True)): the name of
+# the table it came from, its name, quantity (int, None if it has none),
+# units, subitem (the subtable items, as in the plain text) and its plain
+# text
+Item = namedtuple('Item', ['table', 'name', 'quantity', 'units', 'subitem',
+                           'text'])
+
+
+class Row:
+    """
+    A row of a row table.
+    """
+    __slots__ = ('name', 'dice', 'units', 'subtable', 'table', 'parent')
+
+    def __init__(self, row, parent=None):
+        self.parent = parent    # the table's name
+        self.name = row.get('name')
+        self.dice = row.get('_dice')
+        if self.dice is None and 'quantity' in row:
+            self.dice = tablator.dice.compile(row['quantity'])
+        self.units = row.get('units')
+        self.subtable = None    # linked by compile()
+        self.table = None       # linked by compile()
+
+    def finish(self, subitem, rng=None):
+        """
+        Roll this row's quantity and format the item.
+        subitem is the list of items rolled on the subtable, or None.
+        Returns a list of item names.
+        """
+        if subitem is not None:
+            if len(subitem) > 1:
+                subitem = ', '.join(sorted(subitem))
+            else:
+                subitem = subitem[0]
+        quantity = None
+        if self.dice is not None:
+            if tablator.metrics.enabled:
+                tablator.metrics.quantity()
+            quantity = str(tablator.dice.roll(self.dice, rng))
+            if self.units is not None:
+                quantity = f'{quantity} {self.units}'
+            if quantity == '1':
+                quantity = None
+        if subitem is not None and quantity is not None:
+            return ['{} ({}, {})'.format(self.name, subitem, quantity)]
+        elif subitem is not None:
+            return ['{} ({})'.format(self.name, subitem)]
+        elif quantity is not None:
+            return ['{} ({})'.format(self.name, quantity)]
+        return [self.name]
+
+    def record(self, subitem, rng=None):
+        """
+        Roll this row's quantity as finish() does, returning the item as
+        a record.
+        subitem is the list of records rolled on the subtable, or None.
+        Returns a list of one Item.
+        """
+        if subitem is not None:
+            if len(subitem) > 1:
+                subitem = ', '.join(sorted(item.text for item in subitem))
+            else:
+                subitem = subitem[0].text
+        number = None
+        quantity = None
+        if self.dice is not None:
+            if tablator.metrics.enabled:
+                tablator.metrics.quantity()
+            number = tablator.dice.roll(self.dice, rng)
+            quantity = str(number)
+            if self.units is not None:
+                quantity = f'{quantity} {self.units}'
+            if quantity == '1':
+                quantity = None
+        if subitem is not None and quantity is not None:
+            text = '{} ({}, {})'.format(self.name, subitem, quantity)
+        elif subitem is not None:
+            text = '{} ({})'.format(self.name, subitem)
+        elif quantity is not None:
+            text = '{} ({})'.format(self.name, quantity)
+        else:
+            text = self.name
+        return [Item(self.parent, self.name, number, self.units, subitem,
+                     text)]
+
+    def roll(self, rng=None):
+        """
+        Roll this row's table, or its subtable and quantity.
+        Returns a list of item names.
+        """
+        if self.table is not None:
+            return self.table.roll(rng)
+        if self.subtable is not None:
+            return self.finish(self.subtable.roll(rng), rng)
+        return self.finish(None, rng)
+
+
+class RowTable:
+    """
+    A compiled row table.
+    """
+    __slots__ = ('name', 'title', 'rows', 'total', 'cumulative', 'alias',
+                 'source')
+
+    def __init__(self, name, table):
+        self.name = name
+        self.source = table
+        self.title = table['name']
+        self.rows = [Row(row, name) for row in table['rows']]
+        self.total = table['total-weight']
+        self.cumulative = None
+        self.alias = None
+        if tablator.sampler.get_sampler(table) == 'alias':
+            self.alias = table.get('_alias') or \
+                tablator.sampler.build_alias(table)
+        else:
+            self.cumulative = table.get('_cumulative') or \
+                tablator.sampler.build_cumulative(table)
+
+    def pick(self, rng=None):
+        """
+        Return a random Row, drawing as tablator.sampler does.
+        rng is an RNG (see tablator.rng), default the random module.
+        """
+        if self.alias is not None:
+            probability, alias, total = self.alias
+            draw = randrange if rng is None else rng.randrange
+            i, r = divmod(draw(len(probability) * total), total)
+            return self.rows[i if r < probability[i] else alias[i]]
+        draw = randint if rng is None else rng.randint
+        i = bisect_left(self.cumulative, draw(1, self.total))
+        return self.rows[i]
+
+    def references(self):
+        """
+        Return the names of the tables this table refers to.
+        """
+        return [name for row in self.rows
+                for name in (row.table, row.subtable) if name is not None]
+
+    def roll(self, rng=None):
+        """
+        Roll once on this table.
+        Returns a list of item names.
+        """
+        return self.pick(rng).roll(rng)
+
+    def weights(self):
+        """
+        Return the row weights.
+        """
+        return [row['weight'] if 'weight' in row else 1
+                for row in self.source['rows']]
+
+
+class Column:
+    """
+    A column of a column table.
+    """
+    __slots__ = ('name', 'chance', 'dice', 'units', 'table')
+
+    def __init__(self, column):
+        self.name = column.get('name')
+        self.chance = tablator.table.get_chance(column)
+        self.units = column.get('units')
+        self.dice = column.get('_dice')
+        if self.dice is None and 'quantity' in column:
+            self.dice = tablator.dice.compile(column['quantity'])
+        self.table = None       # linked by compile()
+
+
+class ColumnTable:
+    """
+    A compiled column table.
+    """
+    __slots__ = ('name', 'title', 'columns', 'source')
+
+    def __init__(self, name, table):
+        self.name = name
+        self.source = table
+        self.title = table['name']
+        self.columns = [Column(column) for column in table['columns']]
+
+    def references(self):
+        """
+        Return the names of the tables this table refers to.
+        """
+        return [column.table for column in self.columns
+                if column.table is not None]
+
+    def roll(self, rng=None):
+        """
+        Roll once on this table: check the chance of every column.
+        Returns a list of item names.
+        """
+        draw = randint if rng is None else rng.randint
+        values = list()
+        for column in self.columns:
+            if draw(1, 100) > column.chance:
+                continue    # failed chance roll
+            quantity = '1'
+            if column.dice is not None:
+                quantity = str(tablator.dice.roll(column.dice, rng))
+            if column.table is not None:
+                for i in range(int(quantity)):
+                    values.extend(column.table.roll(rng))
+            elif quantity == '1':
+                values.append(column.name)
+            else:
+                values.append('{} {}'.format(quantity, column.name))
+        return values
+
+
+def children_of(node):
+    """
+    Return the tables and subtables a compiled table rolls on.
+    """
+    if type(node) is RowTable:
+        return [row.table or row.subtable for row in node.rows
+                if row.table is not None or row.subtable is not None]
+    return [column.table for column in node.columns
+            if column.table is not None]
+
+
+def clear():
+    """
+    Forget all compiled plans.
+    """
+    trace('plan.clear')
+    _plans.clear()
+
+
+def compile(table_name, load=None):
+    """
+    Compile a table and every table it refers to.
+    load is the function that loads a table by name (default
+    tablator.table.load_table).
+    Returns the root node (RowTable or ColumnTable).
+    Raises ValueError for a missing or invalid table, or a cycle.
+    """
+    trace('plan.compile')
+    if load is None:
+        load = tablator.table.load_table
+
+    # Depth-first, without recursion.  Each stack entry is a node and an
+    # iterator over its references; 'path' holds the tables being compiled.
+    nodes = dict()
+    root = make_node(table_name, load)
+    nodes[table_name] = root
+    path = [table_name]
+    on_path = {table_name}
+    stack = [(root, iter(root.references()))]
+    while stack:
+        node, references = stack[-1]
+        name = next(references, None)
+        if name is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+        if name in on_path:
+            cycle = path[path.index(name):] + [name]
+            raise ValueError('Table cycle: ' + ' -> '.join(cycle))
+        if name in nodes:
+            continue
+        try:
+            child = make_node(name, load)
+        except ValueError as e:
+            raise ValueError(f'{node.name}: {e}') from None
+        nodes[name] = child
+        path.append(name)
+        on_path.add(name)
+        stack.append((child, iter(child.references())))
+
+    # Replace table names with nodes
+    for node in nodes.values():
+        if type(node) is RowTable:
+            for row in node.rows:
+                if row.table is not None:
+                    row.table = nodes[row.table]
+                if row.subtable is not None:
+                    row.subtable = nodes[row.subtable]
+        else:
+            for column in node.columns:
+                if column.table is not None:
+                    column.table = nodes[column.table]
+    debug('compiled', table_name, len(nodes), 'tables')
+    return root
+
+
+def evaluate(node, max_depth=None, rng=None, records=False):
+    """
+    Roll once on a compiled table without recursion.
+    Gives the same items, in the same order, as node.roll().
+    max_depth is the most nested table rolls allowed (default MAX_DEPTH).
+    rng is an RNG (see tablator.rng), default the random module.
+    Returns a list of item names, or of Item records if records is True
+    (drawing the same random numbers).
+    The rolls are counted in tablator.metrics, if enabled.
+    Raises ValueError if the rolls nest deeper than max_depth.
+    """
+    if max_depth is None:
+        max_depth = MAX_DEPTH
+    draw = randint if rng is None else rng.randint
+    finish = Row.record if records else Row.finish
+    measured = tablator.metrics.enabled
+    values = list()
+    stack = [(_ROLL, 1, node, values)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        frame = pop()
+        kind = frame[0]
+        depth = frame[1]
+        if depth > max_depth:
+            raise ValueError(f'Maximum table depth exceeded: {max_depth}')
+        if kind == _ROLL:
+            node = frame[2]
+            if measured:
+                # Count the roll, and its draws and time until _END
+                tablator.metrics.enter(node.name)
+                push((_END, depth))
+            if type(node) is ColumnTable:
+                push((_COLUMN, depth, node, frame[3], 0))
+                continue
+            row = node.pick(rng)
+            if row.table is not None:
+                push((_ROLL, depth + 1, row.table, frame[3]))
+            elif row.subtable is not None:
+                subitem = list()
+                push((_FINISH, depth, row, frame[3], subitem))
+                push((_ROLL, depth + 1, row.subtable, subitem))
+            else:
+                frame[3].extend(finish(row, None, rng))
+        elif kind == _FINISH:
+            frame[3].extend(finish(frame[2], frame[4], rng))
+        elif kind == _COLUMN:
+            node, out, index = frame[2], frame[3], frame[4]
+            columns = node.columns
+            while index < len(columns):
+                column = columns[index]
+                index += 1
+                if draw(1, 100) > column.chance:
+                    continue    # failed chance roll
+                quantity = '1'
+                if column.dice is not None:
+                    if measured:
+                        tablator.metrics.quantity()
+                    quantity = str(tablator.dice.roll(column.dice, rng))
+                if column.table is not None:
+                    # Finish the other columns after the table rolls
+                    push((_COLUMN, depth, node, out, index))
+                    push((_REPEAT, depth + 1, column.table, out,
+                          int(quantity)))
+                    break
+                elif records:
+                    text = column.name if quantity == '1' \
+                        else '{} {}'.format(quantity, column.name)
+                    number = None if column.dice is None else int(quantity)
+                    out.append(Item(node.name, column.name, number,
+                                    column.units, None, text))
+                elif quantity == '1':
+                    out.append(column.name)
+                else:
+                    out.append('{} {}'.format(quantity, column.name))
+        elif kind == _END:
+            tablator.metrics.leave()
+        else:   # _REPEAT
+            if frame[4] > 0:
+                node, out = frame[2], frame[3]
+                push((_REPEAT, depth, node, out, frame[4] - 1))
+                push((_ROLL, depth, node, out))
+    return values
+
+
+def generate(table_name, num_rolls=1, max_depth=None, records=False):
+    """
+    Generate N items from the given table using its compiled plan.
+    Assumes DATA_DIR has been set.
+    Return a list of item names (str), or of Item records if records is
+    True.
+    Raises ValueError if the table cannot be compiled, or its rolls nest
+    deeper than max_depth.
+    """
+    trace('plan.generate')
+    return tablator.session.default().generate(table_name, num_rolls,
+                                               max_depth, records)
+
+
+def get_plan(table_name, load=None, plans=None):
+    """
+    Return the compiled plan of a table, compiling it on first use.
+    The plan is compiled again if any of its tables was reloaded (changed
+    on disk, or evicted from the table cache).
+    load is the function that loads a table by name (default
+    tablator.table.load_table), plans the plan cache (default: this
+    module's).
+    """
+    if load is None and plans is None:
+        return tablator.session.default().get_plan(table_name)
+    if load is None:
+        load = tablator.table.load_table
+    if plans is None:
+        plans = _plans
+    entry = plans.get(table_name)
+    if entry is not None:
+        if is_current(entry, load):
+            return entry[0]
+        debug('recompiling', table_name)
+    plan = compile(table_name, load)
+    plans[table_name] = (plan, nodes_of(plan))
+    return plan
+
+
+def is_current(entry, load):
+    """
+    Return True if a cached plan entry (plan, nodes) was compiled from the
+    tables load() returns now.
+    """
+    return all(load(node.name) is node.source for node in entry[1])
+
+
+def iter_generate(table_name, num_rolls=1, max_depth=None, chunk_size=None,
+                  records=False):
+    """
+    Generate N items as generate() does, yielding them lazily: one list
+    of item names (or Item records, if records is True) for every
+    chunk_size rolls (default CHUNK_SIZE).
+    Raises ValueError as generate().
+    """
+    trace('plan.iter_generate')
+    return tablator.session.default().iter_generate(
+        table_name, num_rolls, max_depth, chunk_size, records)
+
+
+def make_node(table_name, load):
+    """
+    Load a table and make its (unlinked) node.
+    References are left as table names.
+    """
+    table = load(table_name)
+    if 'rows' in table:
+        node = RowTable(table_name, table)
+        for row, source in zip(node.rows, table['rows']):
+            row.table = source.get('table')
+            if row.table is None:
+                row.subtable = source.get('subtable')
+    elif 'columns' in table:
+        node = ColumnTable(table_name, table)
+        for column, source in zip(node.columns, table['columns']):
+            column.table = source.get('table')
+    else:
+        raise ValueError(f"Invalid Table: {table['name']}")
+    return node
+
+
+def nodes_of(node, skip=()):
+    """
+    Return every node of a compiled plan (the tables it uses), once each,
+    each after the tables it rolls on (children first).
+    Nodes whose id is in skip are left out, and not walked into.
+    """
+    if id(node) in skip:
+        return []
+    seen = {id(node)}
+    order = list()
+    stack = [(node, iter(children_of(node)))]
+    while stack:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            order.append(node)
+        elif id(child) not in seen and id(child) not in skip:
+            seen.add(id(child))
+            stack.append((child, iter(children_of(child))))
+    return order
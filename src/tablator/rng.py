@@ -0,0 +1,252 @@
+"""
+Random number generators
+
+Every roll draws through an RNG: an object with the methods of
+random.Random that tablator uses,
+
+    randint(a, b)       int in [a, b]
+    randrange(n)        int in [0, n)
+    random()            float in [0.0, 1.0)
+    gauss(mu, sigma)    normal deviate
+
+so a random.Random instance is an RNG too.  The backends are
+
+    random      RandomRNG, a random.Random (Mersenne Twister)
+    buffered    BufferedRNG, 64-bit words drawn in bulk with getrandbits()
+    numpy       NumPyRNG, 64-bit words drawn in bulk from NumPy's PCG64
+
+The buffered backends turn a chunk of words at a time into integers below
+a bound, kept in a buffer per bound, so a draw is mostly one call of an
+iterator.  Bounded integers are made without modulo bias: Lemire's
+multiply-and-shift method rejecting the few words that would bias the
+result (or NumPy's integers(), which does the same).
+
+The RNG used by the module functions (tablator.table, tablator.plan) is
+set with set_rng(); None, the default, uses the random module.
+"""
+
+import math
+import random as _random
+import sys
+
+from tablator.logger import trace
+
+BACKENDS = ('random', 'buffered', 'numpy')
+
+# Words drawn per refill of a buffered RNG
+CHUNK = 4096
+
+# Most bounds a NumPyRNG keeps buffers of
+BOUNDS_MAX = 256
+
+_MASK = (1 << 64) - 1
+
+# RNG of the module functions, None for the random module
+_rng = None
+
+
+class RandomRNG:
+    """
+    An RNG drawing from a random.Random instance (a new one, seeded with
+    seed, if rng is None).
+    """
+
+    def __init__(self, seed=None, rng=None):
+        if rng is None:
+            rng = _random.Random(seed)
+        self.rng = rng
+        # Bound methods: no wrapper call per draw
+        self.randint = rng.randint
+        self.randrange = rng.randrange
+        self.random = rng.random
+        self.gauss = rng.gauss
+
+    def seed(self, seed=None):
+        """
+        Seed the RNG.
+        """
+        self.rng.seed(seed)
+
+
+class BufferedRNG:
+    """
+    An RNG drawing CHUNK 64-bit words at a time with getrandbits().
+    Bounded integers are made from a chunk at a time, and buffered for
+    each bound.
+    """
+
+    def __init__(self, seed=None, chunk=CHUNK):
+        self.chunk = chunk
+        self.seed(seed)
+
+    def _draw(self):
+        """
+        Return a list of chunk random 64-bit words.
+        """
+        bits = self._source.getrandbits(64 * self.chunk)
+        # Word i is bits 64*i to 64*i+63, whatever the byte order
+        return list(memoryview(bits.to_bytes(8 * self.chunk, sys.byteorder))
+                    .cast('Q'))
+
+    def _draw_below(self, n):
+        """
+        Refill the buffer of ints in [0, n), return its first int.
+        """
+        if not 0 < n <= _MASK:
+            return self._randbelow_big(n)
+        if len(self._below) >= BOUNDS_MAX:
+            self._below.clear()
+        # Lemire: (word * n) >> 64, rejecting the words whose low half is
+        # under 2**64 mod n, which would make some results likelier
+        threshold = ((1 << 64) - n) % n
+        values = None
+        while not values:
+            values = [m >> 64 for word in self._draw()
+                      if ((m := word * n) & _MASK) >= threshold]
+        draw = iter(values).__next__
+        self._below[n] = draw
+        return draw()
+
+    def _refill(self):
+        """
+        Refill the buffer, return its first word.
+        """
+        self._next = iter(self._draw()).__next__
+        return self._next()
+
+    def _word(self):
+        """
+        Return the next 64-bit word.
+        """
+        try:
+            return self._next()
+        except StopIteration:
+            return self._refill()
+
+    def gauss(self, mu=0.0, sigma=1.0):
+        """
+        Return a normal deviate (Box-Muller).
+        """
+        u = 1.0 - self.random()     # (0, 1], for the log
+        return mu + sigma * math.sqrt(-2.0 * math.log(u)) \
+            * math.cos(2.0 * math.pi * self.random())
+
+    def randint(self, a, b):
+        """
+        Return a random int in [a, b].
+        """
+        try:
+            return a + self._below[b - a + 1]()
+        except (KeyError, StopIteration):
+            return a + self._draw_below(b - a + 1)
+
+    def randrange(self, n):
+        """
+        Return a random int in [0, n), without modulo bias.
+        Raises ValueError if n < 1.
+        """
+        try:
+            return self._below[n]()
+        except (KeyError, StopIteration):
+            return self._draw_below(n)
+
+    def _randbelow_big(self, n):
+        """
+        Return a random int in [0, n) for n of more than 64 bits, drawn
+        word by word.
+        Raises ValueError if n < 1.
+        """
+        if n < 1:
+            raise ValueError(f'empty range for randrange({n})')
+        words = (n.bit_length() + 63) // 64
+        shift = words * 64 - n.bit_length()
+        while True:
+            value = 0
+            for i in range(words):
+                value = (value << 64) | self._word()
+            value >>= shift
+            if value < n:
+                return value
+
+    def random(self):
+        """
+        Return a random float in [0.0, 1.0).
+        """
+        try:
+            word = self._next()
+        except StopIteration:
+            word = self._refill()
+        return (word >> 11) * (1.0 / (1 << 53))
+
+    def seed(self, seed=None):
+        """
+        Seed the RNG, discarding buffered words.
+        """
+        self._source = _random.Random(seed)
+        self._next = iter(()).__next__
+        self._below = dict()    # bound: iterator's __next__
+
+
+class NumPyRNG(BufferedRNG):
+    """
+    An RNG drawing from NumPy's PCG64.  Bounded integers are drawn CHUNK
+    at a time for each bound (NumPy's integers() is unbiased), other draws
+    use buffered 64-bit words.
+    Raises ImportError if NumPy is not installed.
+    """
+
+    def _draw(self):
+        """
+        Return a list of chunk random 64-bit words.
+        """
+        return self._source.bit_generator.random_raw(self.chunk).tolist()
+
+    def _draw_below(self, n):
+        """
+        Refill the buffer of ints in [0, n), return its first int.
+        """
+        if not 0 < n <= _MASK:
+            return self._randbelow_big(n)
+        if len(self._below) >= BOUNDS_MAX:
+            self._below.clear()
+        values = self._source.integers(0, n, self.chunk, dtype='uint64',
+                                       endpoint=False)
+        draw = iter(values.tolist()).__next__
+        self._below[n] = draw
+        return draw()
+
+    def seed(self, seed=None):
+        """
+        Seed the RNG, discarding buffered draws.
+        """
+        import numpy
+        self._source = numpy.random.Generator(numpy.random.PCG64(seed))
+        self._next = iter(()).__next__
+        self._below = dict()    # bound: iterator's __next__
+
+
+_backends = {
+    'buffered': BufferedRNG,
+    'numpy': NumPyRNG,
+    'random': RandomRNG,
+}
+
+
+def make(backend='random', seed=None):
+    """
+    Make an RNG of a backend ('random', 'buffered' or 'numpy').
+    Raises ValueError for an unknown backend.
+    """
+    trace('rng.make')
+    if backend not in _backends:
+        raise ValueError(f'Unknown RNG backend: {backend}')
+    return _backends[backend](seed)
+
+
+def set_rng(rng):
+    """
+    Set the RNG of the module functions; None uses the random module.
+    """
+    trace('set_rng')
+    global _rng
+    _rng = rng
@@ -0,0 +1,166 @@
+"""
+Row selection engines for row tables.
+
+linear  scan the rows, adding up weights (reference engine)
+bisect  binary search of the cumulative row weights, O(log n)
+alias   Walker/Vose alias table, O(1)
+
+The engine is chosen per table with the optional 'sampler' key, or
+globally with set_sampler().  The indexes an engine needs are built by
+index() when a table is loaded, or on first use.
+"""
+
+from bisect import bisect_left
+from random import randint, randrange
+
+from tablator.logger import debug, trace
+
+ENGINES = ('linear', 'bisect', 'alias')
+
+# Default engine for tables without a 'sampler' key
+_sampler = 'bisect'
+
+
+def build_alias(table):
+    """
+    Build the alias table of a row table using integer arithmetic, so the
+    row probabilities are exactly weight / total.
+    The (probability, alias) lists are stored in the table as '_alias'.
+    Returns the (probability, alias) tuple.
+    """
+    trace('build_alias')
+    weights = [row['weight'] if 'weight' in row else 1
+               for row in table['rows']]
+    count = len(weights)
+    total = sum(weights)
+    # Each column holds 'total' units, scaled weights hold 'weight * count'
+    scaled = [weight * count for weight in weights]
+    probability = [total] * count
+    alias = list(range(count))
+    small = [i for i in range(count) if scaled[i] < total]
+    large = [i for i in range(count) if scaled[i] >= total]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        probability[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= total - scaled[s]
+        if scaled[l] < total:
+            small.append(l)
+        else:
+            large.append(l)
+    table['_alias'] = (probability, alias, total)
+    return table['_alias']
+
+
+def build_cumulative(table):
+    """
+    Build the cumulative row weights of a row table.
+    The list is stored in the table as '_cumulative'.
+    Returns the list of cumulative weights.
+    """
+    trace('build_cumulative')
+    cumulative = list()
+    weight_total = 0
+    for row in table['rows']:
+        weight_total += row['weight'] if 'weight' in row else 1
+        cumulative.append(weight_total)
+    table['_cumulative'] = cumulative
+    return cumulative
+
+
+def get_sampler(table=None):
+    """
+    Return the engine name used for a table, or the global default.
+    Raises ValueError for an unknown engine.
+    """
+    name = _sampler
+    if table is not None and 'sampler' in table:
+        name = table['sampler']
+        if name not in ENGINES:
+            raise ValueError(f'{table["name"]}: unknown sampler: {name}')
+    return name
+
+
+def index(table):
+    """
+    Build the index the table's engine needs to select a row.
+    """
+    trace('index')
+    engine = get_sampler(table)
+    debug('index', table['name'], engine)
+    if engine == 'bisect':
+        build_cumulative(table)
+    elif engine == 'alias':
+        build_alias(table)
+
+
+def alias_row(table, rng=None):
+    """
+    Return a random row using the alias table, in constant time.
+    A single draw selects both the column and the coin flip.
+    """
+    probability, alias, total = table.get('_alias') or build_alias(table)
+    draw = randrange if rng is None else rng.randrange
+    i, r = divmod(draw(len(probability) * total), total)
+    return table['rows'][i if r < probability[i] else alias[i]]
+
+
+def bisect_row(table, rng=None):
+    """
+    Return a random row using a binary search of the cumulative weights.
+    Raises RuntimeError if total-weight exceeds the sum of the weights.
+    """
+    cumulative = table.get('_cumulative') or build_cumulative(table)
+    total_weight = table['total-weight']
+    item_index = (randint if rng is None else rng.randint)(1, total_weight)
+    # First row whose cumulative weight reaches the index
+    i = bisect_left(cumulative, item_index)
+    if i < len(cumulative):
+        return table['rows'][i]
+    raise RuntimeError('row index out of bounds: index {}, total_weight {}'
+                       .format(item_index, total_weight))
+
+
+def linear_row(table, rng=None):
+    """
+    Return a random row by scanning the rows (reference engine).
+    Raises RuntimeError if total-weight exceeds the sum of the weights.
+    """
+    total_weight = table['total-weight']
+    item_index = (randint if rng is None else rng.randint)(1, total_weight)
+    weight_total = 0
+    for row in table['rows']:
+        row_weight = row['weight'] if 'weight' in row else 1
+        weight_total += row_weight
+        if weight_total >= item_index:
+            return row
+    raise RuntimeError('row index out of bounds: index {}, total_weight {}'
+                       .format(item_index, total_weight))
+
+
+_engines = {
+    'alias': alias_row,
+    'bisect': bisect_row,
+    'linear': linear_row,
+}
+
+
+def pick(table, rng=None):
+    """
+    Return a random row dict from a table using its engine.
+    rng is an RNG (see tablator.rng), default the random module.
+    """
+    return _engines[get_sampler(table)](table, rng)
+
+
+def set_sampler(name):
+    """
+    Set the default engine for tables without a 'sampler' key.
+    Raises ValueError for an unknown engine.
+    """
+    trace('set_sampler')
+    if name not in ENGINES:
+        raise ValueError(f'Unknown sampler: {name}')
+    global _sampler
+    _sampler = name
@@ -0,0 +1,210 @@
+"""
+HTTP roll service (asyncio, standard library only)
+
+    GET /tables             JSON list of the tables in the data directory
+    GET /roll/TABLE?n=N     JSON list of the items of N rolls (default 1)
+    GET /print/TABLE        the table as plain text (see print_plain)
+
+Connections are kept alive (HTTP/1.1) until the client closes them or is
+idle for KEEP_ALIVE seconds.  The server rolls with a Tablator session,
+so tables stay loaded and compiled between requests; requests are
+answered in a thread pool, off the event loop.
+
+    python -m tablator.server --data-dir data --port 8080
+"""
+
+import argparse
+import asyncio
+import io
+import json
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import tablator.logger
+import tablator.table
+from tablator.logger import debug, trace
+from tablator.session import Tablator
+
+# Seconds an idle connection is kept open
+KEEP_ALIVE = 60
+
+# Most rolls in one request
+MAX_ROLLS = 100000
+
+# Most bytes in the request line and headers
+MAX_HEADER = 16384
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+}
+
+
+def error(status, message):
+    """
+    Return an error response with a JSON body {"error": message}.
+    """
+    debug('http', status, message)
+    return reply(status, {'error': message})
+
+
+def handle(session, method, target):
+    """
+    Answer a request for target (path and query).
+    Returns (status, content type, body bytes).
+    """
+    if method not in ('GET', 'HEAD'):
+        return error(405, f'Method not allowed: {method}')
+    url = urlsplit(target)
+    parts = [unquote(part) for part in url.path.split('/') if part]
+    try:
+        if parts == ['tables']:
+            return reply(200, session.list_tables())
+        if len(parts) != 2 or parts[0] not in ('roll', 'print'):
+            return error(404, f'Not found: {url.path}')
+
+        table_name = parts[1]
+        if not session.is_table(table_name):
+            return error(404, f'Table not found: {table_name}')
+        if parts[0] == 'print':
+            text = io.StringIO()
+            tablator.table.print_plain(table_name, text, session.load_table)
+            return 200, 'text/plain; charset=utf-8', text.getvalue().encode()
+        query = parse_qs(url.query)
+        try:
+            num_rolls = int(query.get('n', ['1'])[0])
+        except ValueError:
+            return error(400, 'n must be an integer')
+        if not 1 <= num_rolls <= MAX_ROLLS:
+            return error(400, f'n must be from 1 to {MAX_ROLLS}')
+        return reply(200, session.generate(table_name, num_rolls))
+    except Exception as e:
+        return error(500, str(e) or type(e).__name__)
+
+
+def reply(status, value):
+    """
+    Return a response with a JSON body.
+    """
+    return status, 'application/json', json.dumps(value).encode()
+
+
+def response(status, content_type, body, keep_alive=True):
+    """
+    Return an HTTP/1.1 response (bytes).
+    """
+    head = (f'HTTP/1.1 {status} {_REASONS[status]}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+            '\r\n')
+    return head.encode('latin-1') + body
+
+
+async def serve(session, host='127.0.0.1', port=8080):
+    """
+    Serve a session until cancelled.
+    """
+    server = await start(session, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_connection(session, reader, writer):
+    """
+    Answer the requests of one connection until it is closed.
+    """
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(
+                    reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                    ConnectionError):
+                break
+            except asyncio.LimitOverrunError:
+                writer.write(response(*error(431, 'Header too large'),
+                                      keep_alive=False))
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, version = lines[0].split(' ')
+            except ValueError:
+                writer.write(response(*error(400, 'Bad request line'),
+                                      keep_alive=False))
+                break
+            headers = dict()
+            for line in lines[1:]:
+                name, sep, value = line.partition(':')
+                if sep:
+                    headers[name.strip().lower()] = value.strip().lower()
+            connection = headers.get('connection', '')
+            keep_alive = connection != 'close' if version == 'HTTP/1.1' \
+                else connection == 'keep-alive'
+            if headers.get('content-length', '0') != '0' \
+                    or 'transfer-encoding' in headers:
+                # No endpoint takes a body
+                writer.write(response(*error(400, 'Unexpected body'),
+                                      keep_alive=False))
+                break
+
+            # Rolls and table reads block: answer in the default thread
+            # pool, so the other connections go on meanwhile
+            status, content_type, body = \
+                await asyncio.get_running_loop().run_in_executor(
+                    None, handle, session, method, target)
+            data = response(status, content_type, body, keep_alive)
+            if method == 'HEAD':
+                data = data[:len(data) - len(body)]
+            writer.write(data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def start(session, host='127.0.0.1', port=8080):
+    """
+    Start serving a session.
+    Returns the asyncio Server.
+    """
+    trace('server.start')
+
+    async def connected(reader, writer):
+        await serve_connection(session, reader, writer)
+
+    server = await asyncio.start_server(connected, host, port,
+                                        limit=MAX_HEADER)
+    for sock in server.sockets:
+        debug('serving on', sock.getsockname())
+    return server
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Serve rolls over HTTP')
+    parser.add_argument('-d', '--data-dir', action='store', default=None,
+                        help='set the table data directory')
+    parser.add_argument('-H', '--host', action='store', default='127.0.0.1',
+                        help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('-p', '--port', action='store', default=8080,
+                        type=int, help='port to listen on (default 8080)')
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help='enable debug messages')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    tablator.logger.set(args.verbose, False)
+    try:
+        asyncio.run(serve(Tablator(args.data_dir), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,303 @@
+"""
+Tablator sessions
+
+A Tablator owns a data directory, a table cache, compiled plans and a
+random number generator, so one process can serve several data
+directories, each with its own seed.
+
+    session = Tablator('data', seed=42)
+    session.generate('potions', 3)
+
+A session can be shared by a thread pool.  Tables and plans are read from
+the caches without locking; only a miss takes the session's lock, so each
+table is read and compiled once, and rolls never lock.
+
+The module functions (tablator.table.load_table, tablator.plan.generate,
+...) are thin wrappers over the default session (see default()), whose
+data directory, caches and RNG are the module ones: DATA_DIR, the table
+cache of tablator.table, the plans of tablator.plan and tablator.rng's RNG.
+"""
+
+import os
+import random
+import threading
+import time
+
+import tablator.cache
+import tablator.data
+import tablator.logger
+import tablator.metrics
+import tablator.plan
+import tablator.table
+from tablator.logger import debug, trace
+
+
+class Tablator:
+    """
+    A data directory with its own table cache, plans and RNG.
+    data_dir defaults to the current directory; if recursive, the tables
+    in its subdirectories are found too (see tablator.data).  rng is the
+    session's RNG (see tablator.rng), by default a random.Random seeded
+    with seed.  max_tables, max_bytes and interval bound the table cache,
+    as set_cache_limits().
+    Raises FileNotFoundError if data_dir does not exist.
+    """
+
+    def __init__(self, data_dir=None, seed=None, max_tables=None,
+                 max_bytes=None, interval=1.0, rng=None, recursive=False):
+        self.data_dir = None
+        self.recursive = False
+        self.random = random.Random(seed) if rng is None else rng
+        self.cache = tablator.cache.TableCache(
+            max_tables, max_bytes, interval, mtime=self._file_mtime)
+        self._plans = dict()
+        self._lock = threading.RLock()
+        self.set_data_dir(os.getcwd() if data_dir is None else data_dir,
+                          recursive)
+
+    def cache_stats(self):
+        """
+        Return the table cache statistics.
+        """
+        return self.cache.stats()
+
+    def clear_cache(self):
+        """
+        Forget all tables and plans.
+        """
+        trace('Tablator.clear_cache')
+        with self._lock:
+            self.cache.clear()
+            self._plans.clear()
+
+    def _file_mtime(self, table_name):
+        """
+        Return the modification time (ns) of a table's file, None if unknown.
+        """
+        try:
+            path = tablator.data.find(table_name, self.data_dir,
+                                      self.recursive)
+            return os.stat(path).st_mtime_ns
+        except (OSError, ValueError):
+            return None
+
+    def generate(self, table_name, num_rolls=1, max_depth=None,
+                 records=False):
+        """
+        Generate N items from a table with its compiled plan.
+        Return a list of item names (str), or of Item records if records
+        is True.
+        Raises ValueError if the table cannot be compiled, or its rolls nest
+        deeper than max_depth.
+        """
+        trace('Tablator.generate')
+        plan = self.get_plan(table_name)
+        rng = self.random
+        values = list()
+        for i in range(num_rolls):
+            values.extend(tablator.plan.evaluate(plan, max_depth, rng,
+                                                 records))
+        return values
+
+    def generate_counts(self, table_name, num_rolls=1):
+        """
+        Count the items of N rolls on a table, drawing the counts instead
+        of rolling (see tablator.counts).
+        Returns a Counter of item name: number of items.
+        """
+        trace('Tablator.generate_counts')
+        import tablator.counts
+        return tablator.counts.count(self.get_plan(table_name), num_rolls,
+                                     self.random)
+
+    def get_plan(self, table_name):
+        """
+        Return the compiled plan of a table, compiling it on first use, or
+        again if one of its tables changed.
+        """
+        entry = self._plans.get(table_name)
+        if entry is not None and \
+                tablator.plan.is_current(entry, self.load_table):
+            return entry[0]
+        with self._lock:
+            return tablator.plan.get_plan(table_name, self.load_table,
+                                          self._plans)
+
+    def invalidate(self, table_name):
+        """
+        Remove a table from the table cache, so it is read again on next use.
+        Returns True if it was cached.
+        """
+        return self.cache.invalidate(table_name)
+
+    def is_table(self, table_name):
+        """
+        Return True if the data directory has a table of this name.
+        """
+        return table_name in tablator.data.get_index(
+            self.data_dir, self.recursive).tables
+
+    def iter_generate(self, table_name, num_rolls=1, max_depth=None,
+                      chunk_size=None, records=False):
+        """
+        Generate N items as generate() does, yielding them lazily: one list
+        of item names (or Item records) for every chunk_size rolls.
+        """
+        trace('Tablator.iter_generate')
+        if chunk_size is None:
+            chunk_size = tablator.plan.CHUNK_SIZE
+        plan = self.get_plan(table_name)
+        rng = self.random
+        for start in range(0, num_rolls, chunk_size):
+            values = list()
+            for i in range(min(chunk_size, num_rolls - start)):
+                values.extend(tablator.plan.evaluate(plan, max_depth, rng,
+                                                     records))
+            yield values
+
+    def list_tables(self):
+        """
+        Return the names of the tables in the data directory.
+        The list is read again if the directory was modified.
+        """
+        return sorted(tablator.data.get_index(self.data_dir,
+                                              self.recursive).tables)
+
+    def load_table(self, table_name):
+        """
+        Return a table, reading it on first use.
+        Raises ValueError
+        """
+        if tablator.logger.enabled:
+            trace('Tablator.load_table')
+        table = self.cache.get(table_name)
+        if table is not None:
+            if tablator.logger.enabled:
+                debug('cache hit', table_name)
+            if tablator.metrics.enabled:
+                tablator.metrics.hit(table_name, table)
+            return table
+        with self._lock:
+            # Another thread may have read it while this one waited
+            table = self.cache.peek(table_name)
+            if table is None:
+                start = time.perf_counter()
+                table = self._read(table_name)
+                if tablator.metrics.enabled:
+                    tablator.metrics.miss(table_name, table,
+                                          time.perf_counter() - start)
+                self.cache.put(table_name, table)
+                debug('loaded', table_name)
+        return table
+
+    def _read(self, table_name):
+        """
+        Read a table from the data directory (see tablator.table.read_table).
+        """
+        return tablator.table.read_table(table_name, self.data_dir,
+                                         self.recursive)
+
+    def seed(self, a=None):
+        """
+        Seed the session's RNG.
+        """
+        self.random.seed(a)
+
+    def set_cache_limits(self, max_tables=None, max_bytes=None,
+                         interval=1.0):
+        """
+        Bound the table cache, as tablator.table.set_cache_limits().
+        """
+        trace('Tablator.set_cache_limits')
+        self.cache.interval = interval
+        self.cache.set_limits(max_tables, max_bytes)
+
+    def set_data_dir(self, data_dir, recursive=False):
+        """
+        Set the data directory, and whether the tables in its
+        subdirectories are found too, forgetting the tables of the
+        previous one.
+        Raises FileNotFoundError
+        """
+        trace('Tablator.set_data_dir')
+        data_dir = os.path.realpath(data_dir)
+        if not os.path.isdir(data_dir):
+            raise FileNotFoundError(data_dir)
+        with self._lock:
+            if (data_dir, recursive) != (self.data_dir, self.recursive):
+                debug('Setting session data dir to', data_dir)
+                self.cache.clear()
+                self._plans.clear()
+                self.data_dir = data_dir
+                self.recursive = recursive
+
+
+class _Default(Tablator):
+    """
+    The default session: its data directory is DATA_DIR, its table cache
+    and plans those of tablator.table and tablator.plan, and its RNG
+    tablator.rng's (None for the random module), so the module functions
+    and this session are one and the same.
+    """
+
+    cache = property(lambda self: tablator.table._tables)
+    data_dir = property(lambda self: tablator.data._data_dir)
+    random = property(lambda self: tablator.rng._rng)
+    recursive = property(lambda self: tablator.data._recursive)
+    _plans = property(lambda self: tablator.plan._plans)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cached_dir = None     # (DATA_DIR, recursive) of the cache
+
+    def _check_data_dir(self):
+        """
+        Forget the cached tables and plans if DATA_DIR, or whether its
+        subdirectories are searched, changed since they were cached.
+        """
+        with self._lock:
+            current = (tablator.data._data_dir, tablator.data._recursive)
+            if self._cached_dir != current:
+                debug('DATA_DIR changed, clearing the table cache')
+                self.cache.clear()
+                self._plans.clear()
+                self._cached_dir = current
+
+    def load_table(self, table_name):
+        """
+        Return a table from DATA_DIR, reading it on first use.
+        Raises ValueError
+        """
+        if self._cached_dir != (tablator.data._data_dir,
+                                tablator.data._recursive):
+            self._check_data_dir()
+        return Tablator.load_table(self, table_name)
+
+    def _read(self, table_name):
+        """
+        Read a table from DATA_DIR.
+        """
+        return tablator.table.read_table(table_name)
+
+    def seed(self, a=None):
+        """
+        Seed tablator.rng's RNG (or the random module).
+        """
+        (self.random or random).seed(a)
+
+    def set_data_dir(self, data_dir, recursive=False):
+        """
+        Set DATA_DIR (see tablator.data.set_data_dir).
+        """
+        tablator.data.set_data_dir(data_dir, recursive)
+
+
+# The default session
+_default = _Default()
+
+
+def default():
+    """
+    Return the default session, which the module functions use.
+    """
+    return _default
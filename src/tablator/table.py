@@ -2,14 +2,59 @@
 Table operations
 """
 
-import re
+import os
+import time
 from random import randint
 
+import tablator.cache
 import tablator.data
+import tablator.dice
+import tablator.diskcache
+import tablator.logger
+import tablator.metrics
+import tablator.rng
+import tablator.sampler
 from tablator.logger import debug, trace
 
-# Cache loaded tables (dict of 'name': str, 'table': dict)
-_tables = dict()
+
+def _file_mtime(table_name):
+    """
+    Return the modification time (ns) of a table's file, None if unknown.
+    """
+    if tablator.data._data_dir is None:
+        return None
+    try:
+        return os.stat(tablator.data.find(table_name)).st_mtime_ns
+    except (OSError, ValueError):
+        return None
+
+
+# Cache loaded tables (TableCache of 'name': str, 'table': dict), the
+# default session's
+_tables = tablator.cache.TableCache(mtime=_file_mtime)
+
+# The default session (see _session)
+_default = None
+
+
+def _session():
+    """
+    Return the default session (tablator.session.default()), which the
+    module functions use.  tablator.session is imported on first use.
+    """
+    global _default
+    if _default is None:
+        import tablator.session
+        _default = tablator.session.default()
+    return _default
+
+
+def cache_stats():
+    """
+    Return the table cache statistics: tables, bytes (estimated, if
+    limited by memory), hits, misses, evictions and invalidations.
+    """
+    return _session().cache_stats()
 
 
 def check_weights(table):
@@ -39,30 +84,25 @@ def check_weights(table):
         raise ValueError(f'Invalid table: {table}')
 
 
+def clear_cache():
+    """
+    Remove every table from the table cache (and the plans compiled from
+    them).
+    """
+    trace('clear_cache')
+    _session().clear_cache()
+
+
 def generate(table_name, num_rolls=1):
     """
-    Generate N items from the given table.
+    Generate N items from the given table, with its compiled plan (see
+    tablator.plan).
     Assumes DATA_DIR has been set.
     Return a list of item names (str).
     Raises ValueError if the table cannot be loaded.
     """
     trace('generate')
-
-    table = load_table(table_name)
-
-    values = list()
-    if 'rows' in table:
-        for i in range(num_rolls):
-            item_list = lookup_rows(table)
-            values.extend(item_list)
-    elif 'columns' in table:
-        for i in range(num_rolls):
-            item_list = lookup_columns(table)
-            values.extend(item_list)
-    else:
-        raise ValueError('Invalid table: missing rows or columns key')
-
-    return values
+    return _session().generate(table_name, num_rolls)
 
 
 def get_chance(column):
@@ -73,7 +113,8 @@ def get_chance(column):
     :param column: dict
     :return: number in [1, 100]
     """
-    trace('get_chance')
+    if tablator.logger.enabled:
+        trace('get_chance')
     value = 100
     if 'chance' in column:
         chance = column['chance']
@@ -93,26 +134,22 @@ def get_table_name(table_name):
     return load_table(table_name)['name']
 
 
+def invalidate(table_name):
+    """
+    Remove a table from the table cache, so it is read again on next use.
+    Returns True if it was cached.
+    """
+    trace('invalidate')
+    return _session().invalidate(table_name)
+
+
 def load_table(table_name):
     """
-    Load a table from a file, cache the result.
+    Load a table from a file in DATA_DIR, cache the result.
     Returns a table (dict)
     Raises ValueError
     """
-    global _tables
-
-    trace('load_table')
-    table = None
-    if table_name in _tables:
-        table = _tables[table_name]
-        debug('cache hit', table_name)
-    else:
-        table = tablator.data.load(table_name)
-        check_weights(table)
-        _tables[table_name] = table
-        debug('loaded', table_name)
-
-    return table
+    return _session().load_table(table_name)
 
 
 def lookup_rows(table):
@@ -121,9 +158,19 @@ def lookup_rows(table):
     Returns a list of string.
     Raises ValueError.
     """
-    trace('lookup_rows')
-    debug('lookup_rows', table['name'], table['total-weight'],
-          len(table['rows']))
+    if tablator.metrics.enabled:
+        return tablator.metrics.measure(table, _lookup_rows)
+    return _lookup_rows(table)
+
+
+def _lookup_rows(table):
+    """
+    Do a lookup in an row table (see lookup_rows).
+    """
+    if tablator.logger.enabled:
+        trace('lookup_rows')
+        debug('lookup_rows', table['name'], table['total-weight'],
+              lambda: len(table['rows']))
     item = random_row(table)
     if 'table' in item:
         subtable = load_table(item['table'])
@@ -136,7 +183,8 @@ def lookup_rows(table):
     item_name = item['name']
     subitem = None
     if 'subtable' in item:
-        debug('roll on subtable', item['subtable'])
+        if tablator.logger.enabled:
+            debug('roll on subtable', item['subtable'])
         subtable = load_table(item['subtable'])
         if 'rows' in subtable:
             subitem = lookup_rows(subtable)
@@ -151,8 +199,9 @@ def lookup_rows(table):
     quantity = None
     units = None
     if 'quantity' in item:
-        debug('roll quantity', item['quantity'])
-        quantity = roll_quantity(item['quantity'])
+        if tablator.logger.enabled:
+            debug('roll quantity', item['quantity'])
+        quantity = roll_quantity(item.get('_dice') or item['quantity'])
         if 'units' in item:
             quantity = f'{quantity} {item["units"]}'
         if quantity == '1':
@@ -183,24 +232,37 @@ def lookup_columns(table):
         table: if None, use "quantity + name", else roll on table
         quantity: number of items (bunch) or rolls on table
     """
-    trace('lookup_columns')
-    debug('table name', table['name'])
+    if tablator.metrics.enabled:
+        return tablator.metrics.measure(table, _lookup_columns)
+    return _lookup_columns(table)
+
+
+def _lookup_columns(table):
+    """
+    Roll once on each column of a column table (see lookup_columns).
+    """
+    if tablator.logger.enabled:
+        trace('lookup_columns')
+        debug('table name', table['name'])
     values = list()
     columns = table['columns']
+    rng = tablator.rng._rng
     for column in columns:
         chance = get_chance(column)
-        roll = randint(1, 100)
+        roll = randint(1, 100) if rng is None else rng.randint(1, 100)
         if roll > chance:
-            if 'name' in column:
-                debug('skip', column['name'], roll, 'vs', column['chance'])
-            else:
-                debug('skip', column['table'], roll, 'vs', column['chance'])
+            if tablator.logger.enabled:
+                debug('skip', column.get('name') or column['table'], roll,
+                      'vs', chance)
             continue    # failed chance roll
         if 'table' in column:
-            quantity = roll_quantity(column['quantity']) if 'quantity' in column else '1'
+            quantity = '1'
+            if 'quantity' in column:
+                quantity = roll_quantity(column.get('_dice') or column['quantity'])
             table_name = column['table']
             for i in range(int(quantity)):
-                debug('rolling on table', table_name)
+                if tablator.logger.enabled:
+                    debug('rolling on table', table_name)
                 subtable = load_table(table_name)
                 if 'rows' in subtable:
                     item_list = lookup_rows(subtable)
@@ -211,7 +273,9 @@ def lookup_columns(table):
                 else:
                     raise ValueError('invalid table type: ' + subtable['type'])
         else:  # use name
-            quantity = roll_quantity(column['quantity']) if 'quantity' in column else '1'
+            quantity = '1'
+            if 'quantity' in column:
+                quantity = roll_quantity(column.get('_dice') or column['quantity'])
             name = column['name']
             if quantity == '1':
                 values.append(name)
@@ -220,23 +284,102 @@ def lookup_columns(table):
     return values
 
 
-def print_plain(table_name):
+def preload(table_names=None, workers=None, processes=False):
+    """
+    Load tables into the table cache, reading and parsing files in a
+    thread pool (or a process pool, if processes is True).
+    With table_names, loads those tables and every table they refer to;
+    without, loads every table in DATA_DIR.
+    Tables already in the cache are skipped.
+    Returns a dict of table name: load time in seconds.
+    Raises ValueError if a table cannot be loaded.
+    """
+    trace('preload')
+    import concurrent.futures
+
+    _session()._check_data_dir()
+
+    if table_names is None:
+        table_names = tablator.data.list_tables()
+        follow = False
+    else:
+        follow = True
+    if processes:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_preload,
+            initargs=(tablator.data._data_dir, tablator.data._recursive,
+                      tablator.diskcache._cache_dir))
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    timings = dict()
+    with executor:
+        pending = dict()
+        seen = set()
+
+        def submit(names):
+            for name in names:
+                if name not in seen and name not in _tables:
+                    seen.add(name)
+                    pending[executor.submit(_timed_read, name)] = name
+
+        submit(table_names)
+        while pending:
+            done, not_done = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                table, seconds = future.result()
+                _tables[name] = table
+                timings[name] = seconds
+                debug('preloaded', name, f'{seconds * 1000:.1f} ms')
+                if follow:
+                    submit(references(table))
+    return timings
+
+
+def _init_preload(data_dir, recursive, cache_dir):
+    """
+    Set up a preload worker process.
+    """
+    tablator.data.set_data_dir(data_dir, recursive)
+    tablator.diskcache.set_cache_dir(cache_dir)
+
+
+def _timed_read(table_name):
+    """
+    Read a table, return it and the time it took.
+    """
+    start = time.perf_counter()
+    table = read_table(table_name)
+    return table, time.perf_counter() - start
+
+
+def print_plain(table_name, file=None, load=None):
     """
-    Print a table as plain text to the standard output.
+    Print a table as plain text to the standard output, or file.
+    load is the function that loads a table by name (default load_table).
     """
     trace('print_plain')
-    table = load_table(table_name)
+    if load is None:
+        table = load_table(table_name)
+        table_title = get_table_name
+    else:
+        table = load(table_name)
+
+        def table_title(name):
+            return load(name)['name']
     index = 1
     if 'rows' in table:
         # A table of items
         debug('print "rows" table')
         dice = str(table['total-weight'])
         if dice == '100': dice = '%'
-        print(' d{}'.format(dice), table['name'], sep='\t')
-        print('-----', '-' * len(table['name']), sep='\t')
+        print(' d{}'.format(dice), table['name'], sep='\t', file=file)
+        print('-----', '-' * len(table['name']), sep='\t', file=file)
         for row in table['rows']:
             wt = row['weight'] if 'weight' in row else 1
-            row_name = row['name'] if 'name' in row else get_table_name(row['table'])
+            row_name = row['name'] if 'name' in row else table_title(row['table'])
             if 'quantity' in row:
                 if 'units' in row:
                     row_name += ' ({} {})'.format(row['quantity'], row['units'])
@@ -248,27 +391,27 @@ def print_plain(table_name):
             else:
                 s = "{:02d}\t{}".format(index, row_name)
             index += wt
-            print(s)
-        print()
+            print(s, file=file)
+        print(file=file)
     elif 'columns' in table:
         # A list of tables, roll on each table
         debug('print "columns" table')
-        print(table['name'])
-        print('-' * len(table['name']))
+        print(table['name'], file=file)
+        print('-' * len(table['name']), file=file)
         for column in table['columns']:
             chance = '{0:3d}%'.format(get_chance(column))
             quantity = column['quantity'] if 'quantity' in column else '1'
             if 'name' in column:
                 name = column['name']
             elif 'table' in column and column['table'] is not None:
-                name = get_table_name(column['table'])
+                name = table_title(column['table'])
             else:
                 raise ValueError('invalid column: no name or table')
             if quantity == '1':
-                print(chance, name)
+                print(chance, name, file=file)
             else:
-                print(chance, quantity, name)
-        print()
+                print(chance, quantity, name, file=file)
+        print(file=file)
 
     else:
         debug(f'Invalid Table: {table_name}')
@@ -277,60 +420,85 @@ def print_plain(table_name):
 def random_row(table):
     """
     Return a random row dict from a table.
+    The row is selected by the table's sampler engine (see tablator.sampler).
     """
-    trace('random_row')
-    total_weight = table['total-weight']
-    item_index = randint(1, total_weight)
-    weight_total = 0
-    for row in table['rows']:
-        row_weight = row['weight'] if 'weight' in row else 1
-        weight_total += row_weight
-        if weight_total >= item_index:
-            return row
-    raise RuntimeError('row index out of bounds: index {}, total_weight {}'
-                       .format(item_index, total_weight))
+    if tablator.logger.enabled:
+        trace('random_row')
+    return tablator.sampler.pick(table, tablator.rng._rng)
 
 
-#   1       10
-#   1d6     1d6x10
-#   2d6-1
-#   2d10+3x100
-#           IdJ+KxM = (number)d(sides)(+/-adjustment)x(multiplier)
-PATTERN = '([1-9][0-9]*)d([1-9][0-9]*)([+-][1-9][0-9]*)?(?:x([1-9][0-9]*))?'
-MATCHER = re.compile(PATTERN)
+def read_table(table_name, data_dir=None, recursive=None):
+    """
+    Read a table from its file in DATA_DIR (or data_dir, recursive or not
+    as tablator.data.find), or the disk cache, and check it.
+    Does not use or fill the table cache (see load_table).
+    Returns a table (dict)
+    Raises ValueError
+    """
+    trace('read_table')
+    table = None
+    # Parse and check the file, unless it is in the disk cache
+    cached = tablator.diskcache.is_enabled()
+    if cached or data_dir is not None:
+        path = tablator.data.find(table_name, data_dir, recursive)
+    if cached:
+        table, stamp = tablator.diskcache.fetch(path)
+    if table is None:
+        if data_dir is None:
+            table = tablator.data.load(table_name)
+        else:
+            table = tablator.data.load_file(path)
+        check_weights(table)
+        if cached:
+            tablator.diskcache.store(path, stamp, table)
+    tablator.dice.compile_table(table)
+    if 'rows' in table:
+        tablator.sampler.index(table)
+    return table
+
+
+def references(table):
+    """
+    Return the names of the tables a table refers to (rows' table and
+    subtable, columns' table), without duplicates.
+    """
+    names = list()
+    for entry in table.get('rows', table.get('columns', [])):
+        for key in ('table', 'subtable'):
+            name = entry.get(key)
+            if name is not None and name not in names:
+                names.append(name)
+    return names
 
 
 def roll_quantity(quantity):
     """
     Roll some dice
     "3d6+6x10" -> ((3 x 1-6) + 6) x 10 -> 160
+    The quantity is a dice expression (str) or a compiled Dice tuple.
+    Raises ValueError if the expression is malformed.
     """
-    trace("roll_quantity")
-    result = MATCHER.fullmatch(quantity)
-    if result is None:
-        debug('no match', quantity)
-        value = quantity
-    else:
-        groups = result.groups()
-        number = int(groups[0])
-        sides = int(groups[1])
-        if groups[2] is not None:
-            adjustment = int(groups[2])
-        else:
-            adjustment = 0
-        if groups[3] is not None:
-            multiplier = int(groups[3])
-        else:
-            multiplier = 1
-
-        debug('number', number, 'sides', sides, 'adjustment', adjustment,
-              'multiplier', multiplier)
-
-        n = 0
-        for i in range(number):
-            n += randint(1, sides)
+    if tablator.logger.enabled:
+        trace('roll_quantity')
+    if tablator.metrics.enabled:
+        tablator.metrics.quantity()
+    if type(quantity) is str:
+        quantity = tablator.dice.compile(quantity)
+    value = tablator.dice.roll(quantity, tablator.rng._rng)
+    if tablator.logger.enabled:
+        debug('number', quantity.number, 'sides', quantity.sides,
+              'adjustment', quantity.adjustment,
+              'multiplier', quantity.multiplier)
+        debug('value', value)
+    return str(value)
 
-        value = (n + adjustment) * multiplier
 
-    debug('value', value)
-    return str(value)
+def set_cache_limits(max_tables=None, max_bytes=None, interval=1.0):
+    """
+    Bound the table cache by number of tables and/or estimated memory in
+    bytes (None is unbounded); the least recently used tables are evicted.
+    A cached table is checked against its file's modification time at most
+    every interval seconds, and read again if it changed.
+    """
+    trace('set_cache_limits')
+    _session().set_cache_limits(max_tables, max_bytes, interval)
@@ -0,0 +1,21 @@
+# PyTest fixtures shared by the tablator tests
+
+import pytest
+import tablator.table
+
+@pytest.fixture
+def mock_tables(monkeypatch, tables):
+    """
+    Read the tables from the tables fixture (dict of table name: table)
+    instead of DATA_DIR, with an empty table cache.  Each test module
+    gives its own tables fixture, or parametrizes tables.
+    """
+    def mock_read_table(table_name, data_dir=None, recursive=None):
+        if table_name not in tables:
+            raise ValueError('Table not found: ' + table_name)
+        return tables[table_name]
+
+    monkeypatch.setattr(tablator.table, 'read_table', mock_read_table)
+    tablator.table.clear_cache()
+    yield tables
+    tablator.table.clear_cache()
@@ -0,0 +1,148 @@
+# PyTest for tablator.analysis
+
+import collections
+import io
+import math
+import random
+import time
+from fractions import Fraction
+import pytest
+import tablator.analysis
+import tablator.counts
+import tablator.plan
+import tablator.table
+
+@pytest.fixture
+def tables():
+    return {
+        'colors': {
+            'name': 'Colors',
+            'total-weight': 6,
+            'rows': [
+                { 'weight': 3, 'name': 'red' },
+                { 'weight': 2, 'name': 'green' },
+                { 'name': 'blue' }
+            ]
+        },
+        'things': {
+            'name': 'Things',
+            'total-weight': 4,
+            'rows': [
+                { 'weight': 2, 'name': 'hat', 'subtable': 'colors',
+                  'quantity': '1d2' },
+                { 'table': 'hoard' },
+                { 'table': 'colors' }
+            ]
+        },
+        'hoard': {
+            'name': 'Hoard',
+            'total-weight': 4,
+            'columns': [
+                { 'chance': 50, 'name': 'Gold', 'quantity': '10d10x10' },
+                { 'chance': 75, 'name': 'Gem' },
+                { 'chance': 25, 'table': 'colors', 'quantity': '1d3' },
+                { 'chance': 100, 'table': 'colors', 'quantity': '1d4-2' }
+            ]
+        }
+    }
+
+
+def test_row_table(mock_tables):
+    items = tablator.analysis.analyze('colors')
+    assert items['red'] == (Fraction(1, 2), Fraction(1, 2), {},
+                            Fraction(1, 2))
+    assert items['blue'].count == Fraction(1, 6)
+
+
+def test_column_table(mock_tables):
+    items = tablator.analysis.analyze('hoard')
+    assert items['Gold'].count == Fraction(1, 2)
+    assert items['Gold'].quantity == Fraction(1, 2) * 550
+    assert items['Gem'] == (Fraction(3, 4), Fraction(3, 4), {},
+                            Fraction(3, 4))
+    # 1/4 * 2 rolls, plus 1d4-2 rolls (0, 0, 1 or 2: 3/4 on average)
+    assert items['red'].count == (Fraction(1, 2) + Fraction(3, 4)) / 2
+    # Missing red: 1 - 1/4 * (1 - (1/2 + 1/4 + 1/8) / 3) for the 1d3
+    # rolls, times 1 - (1 - (1 + 1 + 1/2 + 1/4) / 4) for the 1d4-2 rolls
+    assert items['red'].probability == \
+        1 - (1 - Fraction(17, 96)) * (1 - Fraction(5, 16))
+    assert items['Gold'].probability == Fraction(1, 2)
+
+
+def test_nested_tables(mock_tables):
+    items = tablator.analysis.analyze('things')
+    hoard = tablator.analysis.analyze('hoard')
+    assert items['hat'].count == Fraction(1, 2)
+    assert items['hat'].quantity == Fraction(3, 4)
+    assert items['hat'].subitems == {'red': Fraction(1, 4),
+                                     'green': Fraction(1, 6),
+                                     'blue': Fraction(1, 12)}
+    assert items['Gold'].count == hoard['Gold'].count / 4
+    assert items['red'].count == hoard['red'].count / 4 + Fraction(1, 8)
+    assert items['red'].probability == \
+        hoard['red'].probability / 4 + Fraction(1, 8)
+
+
+def test_shared_tables_once(mock_tables, monkeypatch):
+    weights = tablator.plan.RowTable.weights
+    calls = list()
+    def counting_weights(self):
+        calls.append(self.name)
+        return weights(self)
+    monkeypatch.setattr(tablator.plan.RowTable, 'weights', counting_weights)
+    tablator.analysis.analyze('things')
+    assert sorted(calls) == ['colors', 'things']
+
+
+def test_matches_counts(mock_tables):
+    random.seed(9)
+    n = 200000
+    counts = tablator.counts.generate_counts('things', n)
+    for name, expectation in tablator.analysis.analyze('things').items():
+        assert counts[name] == pytest.approx(n * expectation.count, rel=0.02)
+
+
+def test_dice_stats(mock_tables):
+    stats = tablator.analysis.dice_stats('things')
+    assert stats['1d2'] == (Fraction(3, 2), Fraction(1, 4))
+    assert stats['10d10x10'] == (550, 8250)
+    assert set(stats) == {'1d2', '10d10x10', '1d3', '1d4-2'}
+
+
+def test_print_report(mock_tables):
+    out = io.StringIO()
+    tablator.analysis.print_report('things', out)
+    lines = out.getvalue().splitlines()
+    assert lines[0] == 'things: expectations of one roll'
+    assert lines[1].split() == ['count', 'P(>=1)', 'quantity', 'item']
+    assert '  0.500000   0.500000       0.7500  hat' in lines
+    assert '    2.0000       0.6667  1d3' in lines
+
+
+def test_probability_matches_rolls(mock_tables):
+    random.seed(10)
+    n = 40000
+    seen = collections.Counter()
+    for i in range(n):
+        seen.update(set(item.name for item in
+                        tablator.plan.generate('hoard', records=True)))
+    for name, expectation in tablator.analysis.analyze('hoard').items():
+        assert seen[name] == pytest.approx(n * expectation.probability,
+                                           rel=0.03)
+
+
+def test_large_pools(mock_tables):
+    # Pools too large for the exact distribution are worked out in floats
+    mock_tables['pool'] = { 'name': 'Pool', 'total-weight': 2, 'columns': [
+        { 'chance': 50, 'table': 'colors', 'quantity': '2000d6' },
+        { 'chance': 100, 'table': 'colors', 'quantity': '1000d6-3500' } ] }
+    start = time.perf_counter()
+    items = tablator.analysis.analyze('pool')
+    assert time.perf_counter() - start < 2
+    # 1000d6-3500 is about normal with mean 0: its positive part has mean
+    # deviation / sqrt(2 pi)
+    rolls = 3500 + (1000 * 35 / 12) ** 0.5 / (2 * math.pi) ** 0.5
+    assert float(items['red'].count) == pytest.approx(rolls / 2, rel=0.001)
+    # Red in one of 7000 rolls for sure, or in half of the rolls of a
+    # positive 1000d6-3500, a little less than half the time
+    assert 0.74 < items['red'].probability < 0.75
@@ -0,0 +1,132 @@
+# PyTest for tablator.batch
+
+import sys
+import pytest
+import tablator.batch
+import tablator.table
+
+@pytest.fixture
+def tables():
+    return {
+        'colors': {
+            'name': 'Colors',
+            'total-weight': 3,
+            'rows': [
+                { 'name': 'red' },
+                { 'name': 'green' },
+                { 'name': 'blue' }
+            ]
+        },
+        'flat-rows': {
+            'name': 'Flat Rows',
+            'total-weight': 10,
+            'rows': [
+                { 'weight': 4, 'name': 'coins', 'quantity': '2d6',
+                  'units': 'gp' },
+                { 'weight': 3, 'name': 'gems', 'quantity': '1d4+2x10' },
+                { 'weight': 2, 'name': 'single', 'quantity': '1' },
+                { 'weight': 1, 'name': 'plain' }
+            ]
+        },
+        'nested-rows': {
+            'name': 'Nested Rows',
+            'total-weight': 2,
+            'rows': [
+                { 'name': 'hat', 'subtable': 'colors' },
+                { 'table': 'flat-columns' }
+            ]
+        },
+        'flat-columns': {
+            'name': 'Flat Columns',
+            'total-weight': 3,
+            'columns': [
+                { 'chance': 50, 'name': 'Red', 'quantity': '2d6' },
+                { 'name': 'Green' },
+                { 'chance': 25, 'table': 'colors', 'quantity': '1d2' }
+            ]
+        }
+    }
+
+
+def test_generate_without_numpy(monkeypatch, mock_tables):
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    values = tablator.batch.generate('colors', 5)
+    assert len(values) == 5
+    assert set(values) <= {'red', 'green', 'blue'}
+
+
+def test_name_item():
+    assert tablator.batch.name_item('hat', None, None) == 'hat'
+    assert tablator.batch.name_item('hat', 'red', None) == 'hat (red)'
+    assert tablator.batch.name_item('hat', None, '3') == 'hat (3)'
+    assert tablator.batch.name_item('hat', 'red', '3') == 'hat (red, 3)'
+
+
+def test_generate_flat_rows(mock_tables):
+    pytest.importorskip('numpy')
+    values = tablator.batch.generate('flat-rows', 2000, seed=1)
+    assert len(values) == 2000
+    for value in values:
+        if value.startswith('coins'):
+            n = int(value.removeprefix('coins (').removesuffix(' gp)'))
+            assert 2 <= n <= 12
+        elif value.startswith('gems'):
+            n = int(value.removeprefix('gems (').removesuffix(')'))
+            assert n in (30, 40, 50, 60)
+        else:
+            assert value in ('single', 'plain')
+    # Weights 4:3:2:1
+    assert 700 < sum(v.startswith('coins') for v in values) < 900
+    assert 100 < values.count('plain') < 300
+
+
+def test_generate_seed(mock_tables):
+    pytest.importorskip('numpy')
+    first = tablator.batch.generate('flat-rows', 100, seed=7)
+    second = tablator.batch.generate('flat-rows', 100, seed=7)
+    assert first == second
+
+
+def test_generate_flat_columns(mock_tables):
+    pytest.importorskip('numpy')
+    values = tablator.batch.generate('flat-columns', 1000, seed=2)
+    # 'Green' always occurs, and follows any 'Red' of the same roll
+    assert values.count('Green') == 1000
+    for i, value in enumerate(values):
+        if value.endswith(' Red'):
+            assert values[i + 1] == 'Green'
+        else:
+            assert value in ('Green', 'red', 'green', 'blue')
+
+
+def test_generate_nested_rows(mock_tables):
+    pytest.importorskip('numpy')
+    values = tablator.batch.generate('nested-rows', 500, seed=3)
+    hats = [v for v in values if v.startswith('hat')]
+    assert set(hats) == {'hat (red)', 'hat (green)', 'hat (blue)'}
+    assert 200 < len(hats) < 300
+    assert values.count('Green') == 500 - len(hats)
+
+
+def test_generate_nested_seed(mock_tables):
+    pytest.importorskip('numpy')
+    import random
+    random.seed(1)
+    first = tablator.batch.generate('nested-rows', 500, seed=5)
+    random.seed(2)
+    second = tablator.batch.generate('nested-rows', 500, seed=5)
+    assert first == second
+    # The 1d2 rolls on colors of 'flat-columns' follow the roll's Green
+    assert sum(v in ('red', 'green', 'blue') for v in first) > 0
+
+
+def test_roll_many_constant():
+    pytest.importorskip('numpy')
+    assert tablator.batch.roll_many(None, '12', 3) == ['12', '12', '12']
+
+
+def test_roll_many_dice():
+    numpy = pytest.importorskip('numpy')
+    rng = numpy.random.default_rng(4)
+    values = [int(v) for v in tablator.batch.roll_many(rng, '10d6-10', 500)]
+    assert min(values) >= 0 and max(values) <= 50
@@ -0,0 +1,136 @@
+# PyTest for tablator.cache
+
+import json
+import os
+import pytest
+import tablator.data
+import tablator.plan
+import tablator.table
+from tablator.cache import TableCache, estimate_size
+
+@pytest.fixture
+def tables():
+    return {name: {'name': name, 'rows': [{'name': 'x' * size}]}
+            for name, size in (('a', 10), ('b', 20), ('c', 30))}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    table = { 'name': 'Colors', 'total-weight': 1, 'rows': [
+        { 'name': 'red' } ] }
+    (tmp_path / 'colors.json').write_text(json.dumps(table))
+    tablator.data.set_data_dir(str(tmp_path))
+    tablator.table.clear_cache()
+    tablator.plan.clear()
+    yield tmp_path
+    tablator.table.set_cache_limits()
+    tablator.table.clear_cache()
+    tablator.plan.clear()
+
+
+def rewrite(path, name):
+    """
+    Rewrite a table file with a new row name and a later mtime.
+    """
+    table = json.loads(path.read_text())
+    table['rows'][0]['name'] = name
+    path.write_text(json.dumps(table))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_estimate_size():
+    assert estimate_size({'a': 'x' * 100}) > estimate_size({'a': 'x'})
+    assert estimate_size([[1], [2]]) > estimate_size([[1]])
+
+
+def test_get_put(tables):
+    cache = TableCache()
+    assert cache.get('a') is None
+    cache.put('a', tables['a'])
+    assert cache.get('a') is tables['a']
+    assert 'a' in cache
+    assert len(cache) == 1
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_max_tables_lru(tables):
+    cache = TableCache(max_tables=2)
+    cache.put('a', tables['a'])
+    cache.put('b', tables['b'])
+    cache.get('a')                      # b is now least recently used
+    cache.put('c', tables['c'])
+    assert sorted(cache) == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_max_bytes(tables):
+    limit = estimate_size(tables['b']) + estimate_size(tables['c'])
+    cache = TableCache(max_bytes=limit)
+    for name in ('a', 'b', 'c'):
+        cache.put(name, tables[name])
+    assert sorted(cache) == ['b', 'c']
+    assert cache.stats()['bytes'] <= limit
+    # The newest table is kept even if over the limit alone
+    cache.set_limits(max_bytes=1)
+    assert list(cache) == ['c']
+
+
+def test_invalidate_clear(tables):
+    cache = TableCache()
+    cache.put('a', tables['a'])
+    cache.put('b', tables['b'])
+    assert cache.invalidate('a') is True
+    assert cache.invalidate('a') is False
+    assert cache.stats()['invalidations'] == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_revalidate(tables):
+    mtimes = {'a': 1}
+    cache = TableCache(interval=0, mtime=mtimes.get)
+    cache.put('a', tables['a'])
+    assert cache.get('a') is tables['a']
+    mtimes['a'] = 2
+    assert cache.get('a') is None
+    assert 'a' not in cache
+
+
+def test_revalidate_interval(tables):
+    mtimes = {'a': 1}
+    cache = TableCache(interval=3600, mtime=mtimes.get)
+    cache.put('a', tables['a'])
+    mtimes['a'] = 2
+    assert cache.get('a') is tables['a']
+
+
+def test_load_table_reloads_changed_file(data_dir):
+    tablator.table.set_cache_limits(interval=0)
+    assert tablator.table.generate('colors') == ['red']
+    assert tablator.plan.generate('colors') == ['red']
+    rewrite(data_dir / 'colors.json', 'blue')
+    assert tablator.table.generate('colors') == ['blue']
+    assert tablator.plan.generate('colors') == ['blue']
+    assert tablator.table.cache_stats()['invalidations'] == 1
+
+
+def test_set_data_dir_resets_cache(data_dir, tmp_path_factory):
+    other = tmp_path_factory.mktemp('other')
+    table = { 'name': 'Colors', 'total-weight': 1, 'rows': [
+        { 'name': 'green' } ] }
+    (other / 'colors.json').write_text(json.dumps(table))
+    assert tablator.table.generate('colors') == ['red']
+    tablator.data.set_data_dir(str(other))
+    assert tablator.data.list_tables() == ['colors']
+    assert tablator.table.generate('colors') == ['green']
+
+
+def test_table_list_revalidated(data_dir):
+    assert tablator.data.list_tables() == ['colors']
+    (data_dir / 'shapes.yaml').write_text('name: Shapes')
+    stat = os.stat(data_dir)
+    os.utime(data_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert tablator.data.list_tables() == ['colors', 'shapes']
@@ -0,0 +1,116 @@
+# PyTest for tablator.conformance
+
+import io
+import random
+import pytest
+import tablator.conformance
+import tablator.dice
+import tablator.sampler
+import tablator.table
+
+@pytest.fixture
+def tables(monkeypatch):
+    tables = {
+        'colors': {
+            'name': 'Colors',
+            'total-weight': 6,
+            'rows': [
+                { 'weight': 3, 'name': 'red', 'quantity': '2d6' },
+                { 'weight': 2, 'name': 'green' },
+                { 'name': 'blue' }
+            ]
+        },
+        'hoard': {
+            'name': 'Hoard',
+            'total-weight': 3,
+            'columns': [
+                { 'chance': 50, 'name': 'Gold', 'quantity': '10d10x10' },
+                { 'chance': 75, 'name': 'Gem' },
+                { 'table': 'colors', 'quantity': '1d3' }
+            ]
+        }
+    }
+    for table in tables.values():
+        tablator.table.check_weights(table)
+    def mock_load_table(table_name):
+        if table_name not in tables:
+            raise ValueError('Table not found: ' + table_name)
+        return tables[table_name]
+
+    monkeypatch.setattr(tablator.table, 'load_table', mock_load_table)
+    random.seed(12)
+    return tables
+
+
+@pytest.mark.parametrize('statistic,df,expected', [
+    (3.841, 1, 0.05), (6.635, 1, 0.01), (18.307, 10, 0.05),
+    (124.342, 100, 0.05), (0.0, 4, 1.0), (1.0, 1, 0.3173)])
+def test_p_value(statistic, df, expected):
+    assert tablator.conformance.p_value(statistic, df) == \
+        pytest.approx(expected, abs=1e-4)
+
+
+def test_statistics():
+    observed, expected = [10, 20, 30], [20, 20, 20]
+    assert tablator.conformance.chi_square(observed, expected) == 10.0
+    assert tablator.conformance.g_statistic(observed, expected) == \
+        pytest.approx(2 * (10 * -0.693147 + 30 * 0.405465), rel=1e-5)
+    assert tablator.conformance.chi_square([1, 1], [2, 0]) == float('inf')
+
+
+@pytest.mark.parametrize('test', tablator.conformance.TESTS)
+@pytest.mark.parametrize('engine', tablator.sampler.ENGINES)
+def test_tables_pass(tables, monkeypatch, test, engine):
+    monkeypatch.setattr(tablator.sampler, '_sampler', engine)
+    for table_name in tables:
+        results = tablator.conformance.check_table(table_name, 5000, test)
+        assert all(result.passed for result in results), results
+    tests = [result.test for result in
+             tablator.conformance.check_table('colors', 100)]
+    assert tests == ['rows', '2d6']
+
+
+def test_biased_rows_fail(tables, monkeypatch):
+    pick = tablator.sampler.pick
+    def biased(table, rng=None):
+        row = pick(table, rng)
+        return table['rows'][0] if random.random() < 0.05 else row
+    monkeypatch.setattr(tablator.sampler, 'pick', biased)
+    result, dice = tablator.conformance.check_table('colors', 20000)
+    assert result.test == 'rows' and not result.passed
+
+
+def test_biased_chance_fails(tables, monkeypatch):
+    # Chance rolls 2 lower: every chance is 2% higher
+    monkeypatch.setattr(tablator.table, 'randint',
+                        lambda a, b: max(a, random.randint(a, b) - 2))
+    results = tablator.conformance.check_columns(tables['hoard'], 20000)
+    assert [result.passed for result in results] == [False, False]
+
+
+def test_biased_dice_fail(tables, monkeypatch):
+    roll = tablator.dice.roll
+    monkeypatch.setattr(tablator.dice, 'roll', lambda dice, rng=None:
+                        max(roll(dice, rng), roll(dice, rng)))
+    result = tablator.conformance.check_dice('1d6', 5000)
+    assert not result.passed
+
+
+def test_normal_pools_not_tested():
+    assert tablator.conformance.check_dice('1000d100', 10) is None
+    assert tablator.conformance.check_dice('12', 10) is None
+
+
+def test_check_dir(tables, monkeypatch):
+    monkeypatch.setattr(tablator.data, 'list_tables',
+                        lambda: ['hoard', 'colors', 'broken'])
+    results = tablator.conformance.check_dir(2000)
+    assert list(results) == ['broken', 'colors', 'hoard']
+    assert results['broken'] == [('broken', 'load', None, None, None, False,
+                                  'Table not found: broken')]
+    out = io.StringIO()
+    assert not tablator.conformance.print_results(results, out)
+    lines = out.getvalue().splitlines()
+    assert 'broken: load failed: Table not found: broken' in lines
+    assert 'broken: FAIL' in lines
+    assert 'colors: PASS' in lines
@@ -0,0 +1,86 @@
+# PyTest for tablator.counts
+
+import collections
+import io
+import random
+import pytest
+import tablator.counts
+import tablator.plan
+import tablator.table
+
+@pytest.fixture
+def tables():
+    return {
+        'colors': {
+            'name': 'Colors',
+            'total-weight': 6,
+            'rows': [
+                { 'weight': 3, 'name': 'red' },
+                { 'weight': 2, 'name': 'green' },
+                { 'name': 'blue' }
+            ]
+        },
+        'things': {
+            'name': 'Things',
+            'total-weight': 4,
+            'rows': [
+                { 'weight': 2, 'name': 'hat', 'subtable': 'colors',
+                  'quantity': '1d2' },
+                { 'table': 'hoard' },
+                { 'table': 'colors' }
+            ]
+        },
+        'hoard': {
+            'name': 'Hoard',
+            'total-weight': 3,
+            'columns': [
+                { 'chance': 50, 'name': 'Gold', 'quantity': '10d10x10' },
+                { 'chance': 75, 'name': 'Gem' },
+                { 'chance': 25, 'table': 'colors', 'quantity': '1d3' }
+            ]
+        }
+    }
+
+
+def test_count_matches_rolls(mock_tables):
+    random.seed(6)
+    records = tablator.plan.generate('things', 40000, records=True)
+    rolled = collections.Counter(item.name for item in records)
+    rolled.update(('hat', item.subitem) for item in records
+                  if item.name == 'hat')
+    counts = tablator.counts.generate_counts('things', 40000)
+    assert set(counts) == set(rolled)
+    assert {('hat', 'red'), ('hat', 'green'), ('hat', 'blue')} <= set(counts)
+    for name in rolled:
+        assert counts[name] == pytest.approx(rolled[name], rel=0.05)
+
+
+def test_count_cost_does_not_grow(mock_tables, monkeypatch):
+    draws = list()
+    rng = random.Random(7)
+    uniform = rng.random
+    plan = tablator.plan.compile('things')
+    for n in (10**3, 10**9):
+        calls = 0
+        def counting_random():
+            nonlocal calls
+            calls += 1
+            return uniform()
+        monkeypatch.setattr(rng, 'random', counting_random)
+        counts = tablator.counts.count(plan, n, rng)
+        assert counts['hat'] == pytest.approx(n / 2, rel=0.05)
+        draws.append(calls)
+    assert draws[1] < 10 * draws[0]
+
+
+def test_count_zero_rolls(mock_tables):
+    assert tablator.counts.generate_counts('things', 0) == {}
+
+
+def test_print_counts():
+    counts = collections.Counter({'hat': 5, ('hat', 'red'): 3,
+                                  ('hat', 'blue'): 2, 'coin': 9, 'gem': 5})
+    out = io.StringIO()
+    tablator.counts.print_counts(counts, out)
+    assert out.getvalue() == '9\tcoin\n5\tgem\n5\that\n3\t  red\n' \
+        '2\t  blue\n'
@@ -4,63 +4,105 @@ import os
 import pytest
 import tablator.data as data
 
-def test_is_table_yes(monkeypatch):
-    def mock_os_listdir(dir_name):
-        return ['shiny-things.yaml', 'sparkly-things.json']
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = data._data_dir
+    yield tmp_path
+    data._data_dir = data_dir
+    data._recursive = False
+    data._indexes.clear()
 
-    monkeypatch.setattr(os, "listdir", mock_os_listdir)
-    if data._table_list is not None: data._table_list = None
+
+def make_files(path, *file_names):
+    for file_name in file_names:
+        (path / file_name).parent.mkdir(parents=True, exist_ok=True)
+        (path / file_name).write_text('{}')
+    data.set_data_dir(str(path))
+
+
+def test_is_table_yes(data_dir):
+    make_files(data_dir, 'shiny-things.yaml', 'sparkly-things.json')
     assert data.is_table('shiny-things') is True
     assert data.is_table('sparkly-things') is True
 
 
-def test_is_table_no(monkeypatch):
-    def mock_os_listdir(dir_name):
-        return ['shiny-things.yaml', 'sparkly-things.json']
-
-    monkeypatch.setattr(os, "listdir", mock_os_listdir)
-    if data._table_list is not None: data._table_list = None
+def test_is_table_no(data_dir):
+    make_files(data_dir, 'shiny-things.yaml', 'sparkly-things.json')
     assert data.is_table('shady-things') is False
 
 
 def test_is_table_no_table_name():
-    if data._table_list is not None: data._table_list = None
     with pytest.raises(ValueError, match=r'table_name is None'):
         data.is_table()
     with pytest.raises(ValueError, match=r'table_name is None'):
         data.is_table(None)
 
 
-def test_list_tables_no_dir(monkeypatch):
-    def mock_listdir(dir_name):
-        return list()
-
-    monkeypatch.setattr(os, 'listdir', mock_listdir)
-    if data._table_list is not None: data._table_list = None
-    table_list = data.list_tables()
-    assert len(table_list) == 0
-
+def test_list_tables_no_dir(data_dir):
+    data.set_data_dir(str(data_dir))
+    data_dir.rmdir()
+    with pytest.raises(FileNotFoundError):
+        data.list_tables()
 
-def test_list_tables_empty(monkeypatch):
-    def mock_listdir(dir_name):
-        return list()
 
-    monkeypatch.setattr(os, 'listdir', mock_listdir)
-    if data._table_list is not None: data._table_list = None
+def test_list_tables_empty(data_dir):
+    make_files(data_dir)
     table_list = data.list_tables()
     assert len(table_list) == 0
 
 
-def test_list_tables_1(monkeypatch):
-    def mock_listdir(dir_name):
-        return [ 'table-one.json', 'table-two.yaml' ]
-
-    monkeypatch.setattr(os, 'listdir', mock_listdir)
-    if data._table_list is not None: data._table_list = None
+def test_list_tables_1(data_dir):
+    make_files(data_dir, 'table-two.yaml', 'table-one.json', 'notes.txt',
+               'json', 'sub/table-three.json')
     tables = data.list_tables()
     assert tables == [ 'table-one', 'table-two' ]
 
 
+def test_list_tables_modified(data_dir):
+    make_files(data_dir, 'table-one.json')
+    assert data.list_tables() == [ 'table-one' ]
+    (data_dir / 'table-two.yaml').write_text('{}')
+    os.utime(data_dir, ns=(0, 0))
+    assert data.list_tables() == [ 'table-one', 'table-two' ]
+
+
+def test_index(data_dir):
+    make_files(data_dir, 'table-one.json', 'table-two.yaml')
+    index = data.get_index()
+    assert index.collisions == {}
+    table_file = index.tables['table-two']
+    assert table_file.path == str(data_dir / 'table-two.yaml')
+    assert table_file.format == 'yaml'
+    assert table_file.size == 2
+    stat = os.stat(table_file.path)
+    assert table_file.mtime == stat.st_mtime_ns
+    assert data.get_index() is index
+
+
+def test_index_collision(data_dir):
+    make_files(data_dir, 'table.yaml', 'table.json')
+    index = data.get_index()
+    assert index.tables['table'].format == 'json'
+    assert index.collisions == {'table': [str(data_dir / 'table.json'),
+                                          str(data_dir / 'table.yaml')]}
+    assert data.find('table') == str(data_dir / 'table.json')
+
+
+def test_index_recursive(data_dir):
+    make_files(data_dir, 'top.json', 'dungeon/level-1.json',
+               'dungeon/deep/level-2.yaml', '.hidden/secret.json')
+    data.set_data_dir(str(data_dir), recursive=True)
+    assert data.list_tables() == [ 'dungeon/deep/level-2', 'dungeon/level-1',
+                                   'top' ]
+    assert data.find('dungeon/deep/level-2') == \
+        str(data_dir / 'dungeon' / 'deep' / 'level-2.yaml')
+    (data_dir / 'dungeon' / 'level-3.json').write_text('{}')
+    os.utime(data_dir / 'dungeon', ns=(0, 0))
+    assert data.is_table('dungeon/level-3') is True
+    data.set_data_dir(str(data_dir))
+    assert data.list_tables() == [ 'top' ]
+
+
 def test_load_table_name_is_none():
     with pytest.raises(ValueError, match='table_name is None'):
         data.load(None)
@@ -94,3 +136,10 @@ def test_set_data_dir_doesnt_exist():
     with pytest.raises(FileNotFoundError, match='/does/not/exist'):
         data.set_data_dir('/does/not/exist')
 
+
+def test_find_table():
+    data._data_dir = os.path.realpath(os.path.join('.', 'tests'))
+    assert data.find('table-j') == os.path.join(data._data_dir, 'table-j.json')
+    assert data.find('table-y') == os.path.join(data._data_dir, 'table-y.yaml')
+    with pytest.raises(ValueError, match='Table not found: not-a-table'):
+        data.find('not-a-table')
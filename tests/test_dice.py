@@ -0,0 +1,195 @@
+# PyTest for tablator.dice
+
+import random
+import pytest
+import tablator.dice
+from tablator.dice import Dice
+
+
+def test_compile_constant():
+    assert tablator.dice.compile('1') == Dice(0, 0, 1, 1)
+    assert tablator.dice.compile('250') == Dice(0, 0, 250, 1)
+
+
+def test_compile_dice():
+    assert tablator.dice.compile('1d6') == Dice(1, 6, 0, 1)
+    assert tablator.dice.compile('2d6-1') == Dice(2, 6, -1, 1)
+    assert tablator.dice.compile('1d6x10') == Dice(1, 6, 0, 10)
+    assert tablator.dice.compile('2d10+3x100') == Dice(2, 10, 3, 100)
+
+
+@pytest.mark.parametrize('expression', ['', 'lots', 'd6', '0d6', '1d0',
+                                        '2d6+', '1d6x', '1d6 + 1'])
+def test_compile_malformed(expression):
+    with pytest.raises(ValueError, match='Invalid dice expression'):
+        tablator.dice.compile(expression)
+
+
+def test_compile_table():
+    table = {
+        'name': 'Quantity Table',
+        'rows': [
+            { 'name': 'one', 'quantity': '2d4' },
+            { 'name': 'two' }
+        ]
+    }
+    tablator.dice.compile_table(table)
+    assert table['rows'][0]['_dice'] == Dice(2, 4, 0, 1)
+    assert '_dice' not in table['rows'][1]
+
+
+def test_compile_table_malformed():
+    table = {
+        'name': 'Bad Quantity Table',
+        'columns': [
+            { 'name': 'one', 'quantity': 'a few' }
+        ]
+    }
+    with pytest.raises(ValueError, match='Bad Quantity Table: Invalid dice'):
+        tablator.dice.compile_table(table)
+
+
+def test_roll_constant():
+    assert tablator.dice.roll(Dice(0, 0, 12, 1)) == 12
+
+
+def test_roll_range():
+    for i in range(100):
+        n = tablator.dice.roll(Dice(2, 4, 2, 10))
+        assert n in range(40, 101, 10)
+
+
+def test_distribution():
+    # 2d6: 1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1 ways to roll 2..12
+    cumulative = tablator.dice.distribution(2, 6)
+    assert cumulative == (1, 3, 6, 10, 15, 21, 26, 30, 33, 35, 36)
+
+
+def test_distribution_total():
+    assert tablator.dice.distribution(50, 10)[-1] == 10 ** 50
+    assert len(tablator.dice.distribution(50, 10)) == 451
+
+
+def test_pool_method():
+    assert tablator.dice.pool_method(3, 6) == 'loop'
+    assert tablator.dice.pool_method(50, 10) == 'exact'
+    assert tablator.dice.pool_method(100000, 6) == 'multinomial'
+
+
+def test_roll_exact_bounds(monkeypatch):
+    # The lowest and highest draws give the lowest and highest sums
+    monkeypatch.setattr(tablator.dice, 'randrange', lambda n: 0)
+    assert tablator.dice.roll(Dice(50, 10, 0, 100)) == 5000
+    monkeypatch.setattr(tablator.dice, 'randrange', lambda n: n - 1)
+    assert tablator.dice.roll(Dice(50, 10, 0, 100)) == 50000
+
+
+@pytest.mark.parametrize('method', ['multinomial', 'normal', 'exact', 'loop'])
+def test_roll_large_pool(monkeypatch, method):
+    monkeypatch.setattr(tablator.dice, 'EXACT_MAX', 1000)
+    tablator.dice.set_large_pool(method)
+    try:
+        assert tablator.dice.pool_method(300, 6) == method
+        for n in tablator.dice.roll_many(Dice(300, 6, 0, 1), 5):
+            assert 300 <= n <= 1800
+            assert abs(n - 1050) < 300      # 10 standard deviations
+    finally:
+        tablator.dice.set_large_pool('multinomial')
+
+
+@pytest.mark.parametrize('numpy_rng', [False, True])
+def test_multinomial_pool_is_exact(monkeypatch, numpy_rng):
+    import random
+    import tablator.conformance
+    monkeypatch.setattr(tablator.dice, 'EXACT_MAX', 10)
+    assert tablator.dice.pool_method(20, 6) == 'multinomial'
+    if numpy_rng:
+        numpy = pytest.importorskip('numpy')
+        rng = numpy.random.default_rng(3)
+    else:
+        rng = random.Random(3)
+    samples = 20000
+    counts = [0] * 101
+    for value in tablator.dice.roll_many(Dice(20, 6, 0, 1), samples, rng):
+        counts[value - 20] += 1
+    cumulative = tablator.dice.distribution(20, 6)
+    expected = [samples * (c - p) / cumulative[-1]
+                for p, c in zip((0,) + cumulative, cumulative)]
+    result = tablator.conformance._result(None, '20d6', counts, expected,
+                                          'chi-square', 0.001)
+    assert result.passed
+
+
+def test_set_large_pool_unknown():
+    with pytest.raises(ValueError, match='Unknown pool method: magic'):
+        tablator.dice.set_large_pool('magic')
+
+
+def test_roll_many():
+    values = tablator.dice.roll_many(Dice(10, 6, -10, 1), 200)
+    assert len(values) == 200
+    assert min(values) >= 0 and max(values) <= 50
+    assert tablator.dice.roll_many(Dice(0, 0, 7, 1), 3) == [7, 7, 7]
+
+
+@pytest.mark.parametrize('dice', [Dice(2, 6, 1, 1), Dice(50, 10, 0, 100),
+                                  Dice(100000, 6, 0, 1)])
+def test_roll_many_numpy(dice):
+    numpy = pytest.importorskip('numpy')
+    values = tablator.dice.roll_many(dice, 1000, numpy.random.default_rng(1))
+    low = (dice.number + dice.adjustment) * dice.multiplier
+    high = (dice.number * dice.sides + dice.adjustment) * dice.multiplier
+    assert len(values) == 1000
+    assert values.min() >= low and values.max() <= high
+
+
+@pytest.mark.parametrize('dice', [Dice(3, 6, 0, 1), Dice(50, 10, 0, 1),
+                                  Dice(100000, 6, 0, 1)])
+def test_roll_rng(dice):
+    import random
+    one = [tablator.dice.roll(dice, random.Random(4)) for i in range(5)]
+    two = [tablator.dice.roll(dice, random.Random(4)) for i in range(5)]
+    assert one == two
+
+
+@pytest.mark.parametrize('expression', ['7', '1d6', '3d4-2', '2d6x10'])
+def test_mean_variance(expression):
+    dice = tablator.dice.compile(expression)
+    number, sides, adjustment, multiplier = dice
+    # Every outcome of the pool, by brute force
+    sums = [0]
+    for i in range(number):
+        sums = [total + face for total in sums for face in range(1, sides + 1)]
+    values = [(total + adjustment) * multiplier for total in sums]
+    mean = sum(values) / len(values)
+    variance = sum((value - mean) ** 2 for value in values) / len(values)
+    assert tablator.dice.mean(dice) == pytest.approx(mean)
+    assert tablator.dice.variance(dice) == pytest.approx(variance)
+
+
+@pytest.mark.parametrize('n,p', [(0, 0.5), (10, 0.0), (10, 1.0), (1, 0.5),
+                                 (20, 0.1), (1000, 0.3), (10**12, 0.7)])
+def test_binomial_moments(n, p):
+    rng = random.Random(4)
+    values = [tablator.dice.binomial(n, p, rng) for i in range(4000)]
+    assert all(0 <= value <= n for value in values)
+    mean = sum(values) / len(values)
+    variance = sum((value - mean) ** 2 for value in values) / len(values)
+    assert mean == pytest.approx(n * p, rel=0.05, abs=0.05)
+    assert variance == pytest.approx(n * p * (1 - p), rel=0.1, abs=0.05)
+
+
+def test_binomial_invalid():
+    with pytest.raises(ValueError, match='Number of trials'):
+        tablator.dice.binomial(-1, 0.5)
+    with pytest.raises(ValueError, match='Probability'):
+        tablator.dice.binomial(10, 1.5)
+
+
+def test_multinomial():
+    rng = random.Random(5)
+    counts = tablator.dice.multinomial(600000, [3, 2, 0, 1], rng)
+    assert sum(counts) == 600000
+    assert counts[2] == 0
+    for count, expected in zip(counts, [300000, 200000, 0, 100000]):
+        assert count == pytest.approx(expected, rel=0.01)
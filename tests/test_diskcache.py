@@ -0,0 +1,122 @@
+# PyTest for tablator.diskcache
+
+import json
+import os
+import pytest
+import tablator.data
+import tablator.diskcache as diskcache
+import tablator.table
+
+@pytest.fixture
+def table():
+    return {
+        'name': 'Cached Table',
+        'total-weight': 2,
+        'rows': [
+            { 'name': 'one', 'quantity': '1d6' },
+            { 'name': 'two' }
+        ]
+    }
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    diskcache.set_cache_dir(str(tmp_path / 'cache'))
+    yield tmp_path / 'cache'
+    diskcache.set_cache_dir(None)
+
+
+@pytest.fixture
+def table_file(tmp_path, table):
+    path = tmp_path / 'cached-table.json'
+    path.write_text(json.dumps(table))
+    return str(path)
+
+
+def test_is_enabled(cache_dir):
+    assert diskcache.is_enabled() is True
+    diskcache.set_cache_dir(None)
+    assert diskcache.is_enabled() is False
+
+
+def test_fetch_miss_then_hit(cache_dir, table_file, table):
+    cached, stamp = diskcache.fetch(table_file)
+    assert cached is None
+    assert stamp['size'] == os.path.getsize(table_file)
+    diskcache.store(table_file, stamp, table)
+    cached, stamp = diskcache.fetch(table_file)
+    assert cached == table
+    assert stamp is None
+    # Only the entry, no temporary files left behind
+    assert [p.suffix for p in cache_dir.iterdir()] == ['.cache']
+
+
+def test_fetch_touched(cache_dir, table_file, table):
+    cached, stamp = diskcache.fetch(table_file)
+    diskcache.store(table_file, stamp, table)
+    os.utime(table_file, ns=(0, 0))
+    cached, stamp = diskcache.fetch(table_file)
+    assert cached == table
+
+
+def test_fetch_changed(cache_dir, table_file, table):
+    cached, stamp = diskcache.fetch(table_file)
+    diskcache.store(table_file, stamp, table)
+    table['name'] = 'Changed Table'
+    with open(table_file, 'w') as f:
+        json.dump(table, f)
+    os.utime(table_file, ns=(0, 0))
+    cached, stamp = diskcache.fetch(table_file)
+    assert cached is None
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_fetch_corrupt(cache_dir, table_file, table):
+    cached, stamp = diskcache.fetch(table_file)
+    diskcache.store(table_file, stamp, table)
+    with open(diskcache.entry_path(table_file), 'wb') as f:
+        f.write(b'not an entry')
+    cached, stamp = diskcache.fetch(table_file)
+    assert cached is None
+
+
+def test_store_unmarshallable(cache_dir, table_file, table):
+    cached, stamp = diskcache.fetch(table_file)
+    table['rows'][0]['date'] = object()
+    diskcache.store(table_file, stamp, table)
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_store_write_error(monkeypatch, cache_dir, table_file, table):
+    def mock_replace(source, target):
+        raise OSError(28, 'No space left on device')
+
+    cached, stamp = diskcache.fetch(table_file)
+    monkeypatch.setattr(os, 'replace', mock_replace)
+    diskcache.store(table_file, stamp, table)
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_clear(cache_dir, table_file, table):
+    cached, stamp = diskcache.fetch(table_file)
+    diskcache.store(table_file, stamp, table)
+    (cache_dir / 'tmpabc123.tmp').write_bytes(b'partial')
+    assert diskcache.clear() == 1
+    assert list(cache_dir.iterdir()) == []
+    assert diskcache.fetch(table_file)[0] is None
+
+
+def test_load_table_uses_cache(monkeypatch, cache_dir, table_file, table):
+    tablator.data.set_data_dir(os.path.dirname(table_file))
+    tablator.table._tables.clear()
+    assert tablator.table.load_table('cached-table')['name'] == 'Cached Table'
+
+    def mock_load(table_name):
+        assert False, 'table parsed again'
+
+    monkeypatch.setattr(tablator.data, 'load', mock_load)
+    tablator.table._tables.clear()
+    loaded = tablator.table.load_table('cached-table')
+    assert loaded['name'] == 'Cached Table'
+    assert '_dice' in loaded['rows'][0]
+    tablator.table._tables.clear()
@@ -57,3 +57,45 @@ def test_trace_off(capsys):
     out, err = capsys.readouterr()
     assert out == ''
 
+
+def test_enabled():
+    logger.set(False, False)
+    assert logger.enabled is False
+    logger.set(True, False)
+    assert logger.enabled is True
+    logger.set(False, True)
+    assert logger.enabled is True
+    logger.set(False, False)
+
+
+def test_debug_lazy(capsys):
+    calls = list()
+    def count():
+        calls.append(1)
+        return 3
+
+    logger.set(False, False)
+    logger.debug('rows', count)
+    assert calls == []
+    logger.set(True, False)
+    logger.debug('rows', count)
+    logger.set(False, False)
+    out, err = capsys.readouterr()
+    assert out == '--- rows 3\n'
+    assert calls == [1]
+
+
+def test_use_logging(capsys, caplog):
+    caplog.set_level(logger.TRACE, logger='tablator')
+    logger.use_logging()
+    try:
+        logger.set(True, True)
+        logger.debug('a debug message', 1)
+        logger.trace('a trace message')
+    finally:
+        logger.set(False, False)
+        logger.use_logging(False)
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert [(r.levelname, r.getMessage()) for r in caplog.records] == [
+        ('DEBUG', 'a debug message 1'), ('TRACE', 'a trace message')]
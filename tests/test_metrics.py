@@ -0,0 +1,139 @@
+# PyTest for tablator.metrics
+
+import json
+import random
+import pytest
+import tablator.metrics
+import tablator.plan
+import tablator.rng
+import tablator.table
+
+@pytest.fixture
+def tables():
+    return {
+        'colors': {
+            'name': 'Colors',
+            'total-weight': 3,
+            'rows': [
+                { 'name': 'red' },
+                { 'name': 'green' },
+                { 'name': 'blue' }
+            ]
+        },
+        'hats': {
+            'name': 'Hats',
+            'total-weight': 2,
+            'rows': [
+                { 'name': 'hat', 'subtable': 'colors', 'quantity': '2d6' },
+                { 'name': 'cap' }
+            ]
+        },
+        'hoard': {
+            'name': 'Hoard "A"',
+            'total-weight': 2,
+            'columns': [
+                { 'name': 'Gold', 'quantity': '1d6x10' },
+                { 'table': 'hats', 'quantity': '2' }
+            ]
+        }
+    }
+
+
+@pytest.fixture
+def metrics(mock_tables):
+    tablator.metrics.reset()
+    yield mock_tables
+    tablator.metrics.set(False)
+    tablator.metrics.reset()
+
+
+def test_disabled(metrics):
+    tablator.plan.generate('hoard', 10)
+    assert tablator.metrics.snapshot() == {}
+
+
+def test_same_items(metrics):
+    random.seed(5)
+    expected = tablator.plan.generate('hoard', 50)
+    tablator.metrics.set(True)
+    random.seed(5)
+    assert tablator.plan.generate('hoard', 50) == expected
+
+
+def test_counts(metrics):
+    tablator.metrics.set(True)
+    tablator.plan.generate('hoard', 10)
+    metrics = tablator.metrics.snapshot()
+    assert set(metrics) == {'hoard', 'hats', 'colors'}
+    assert metrics['hoard']['rolls'] == 10
+    assert metrics['hats']['rolls'] == 20
+    hats = metrics['hats']['quantities']
+    assert metrics['colors']['rolls'] == hats
+    assert metrics['colors']['draws'] == hats
+    # A pick and a 2d6 for every hat, a pick for every cap
+    assert metrics['hats']['draws'] == 20 + 2 * hats
+    # Two chance rolls and a 1d6 per roll
+    assert metrics['hoard']['draws'] == 30
+    assert metrics['hoard']['quantities'] == 20
+    for name in metrics:
+        assert metrics[name]['misses'] == 1
+        assert metrics[name]['bytes'] > 0
+    # The plan is compiled once, then checked against the table cache
+    tablator.plan.generate('hoard', 10)
+    metrics = tablator.metrics.snapshot()
+    for name in metrics:
+        assert metrics[name]['misses'] == 1
+        assert metrics[name]['hits'] == 1
+
+
+def test_times(metrics):
+    tablator.metrics.set(True)
+    tablator.plan.generate('hoard', 20)
+    metrics = tablator.metrics.snapshot()
+    hoard, hats, colors = metrics['hoard'], metrics['hats'], metrics['colors']
+    assert 0 < hoard['self_time'] < hoard['time']
+    assert hoard['time'] >= hats['time'] >= colors['time']
+    assert hats['self_time'] == pytest.approx(hats['time'] - colors['time'])
+    assert colors['self_time'] == pytest.approx(colors['time'])
+
+
+def test_set_restores_rng(metrics):
+    rng = tablator.rng.make('buffered', 1)
+    tablator.rng.set_rng(rng)
+    try:
+        tablator.metrics.set(True)
+        assert isinstance(tablator.rng._rng, tablator.metrics.CountingRNG)
+        tablator.metrics.set(False)
+        assert tablator.rng._rng is rng
+    finally:
+        tablator.rng.set_rng(None)
+
+
+def test_json(metrics):
+    tablator.metrics.set(True)
+    tablator.plan.generate('hats', 3)
+    metrics = json.loads(tablator.metrics.to_json())
+    assert metrics['hats']['rolls'] == 3
+
+
+def test_table_functions(metrics):
+    # The table functions are measured too, naming tables by their 'name'
+    tablator.metrics.set(True)
+    tablator.table.lookup_columns(metrics['hoard'])
+    metrics = tablator.metrics.snapshot()
+    assert metrics['Hoard "A"']['rolls'] == 1
+    assert metrics['Hats']['rolls'] == 2
+    assert metrics['Hoard "A"']['quantities'] == 2
+
+
+def test_prometheus(metrics):
+    tablator.metrics.set(True)
+    tablator.plan.generate('hoard')
+    tablator.table.lookup_columns(metrics['hoard'])
+    tablator.table.lookup_columns({'name': 'Two\nLines', 'columns': []})
+    lines = tablator.metrics.to_prometheus().splitlines()
+    assert '# TYPE tablator_rolls_total counter' in lines
+    assert '# TYPE tablator_table_bytes gauge' in lines
+    assert 'tablator_rolls_total{table="Hoard \\"A\\""} 1' in lines
+    assert 'tablator_rolls_total{table="hats"} 2' in lines
+    assert 'tablator_rolls_total{table="Two\\nLines"} 1' in lines
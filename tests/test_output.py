@@ -0,0 +1,69 @@
+# PyTest for tablator.output
+
+import csv
+import io
+import json
+import pytest
+import tablator.output
+from tablator.plan import Item
+
+@pytest.fixture
+def chunks():
+    return [
+        [Item('hoard', 'Gold', 120, None, None, '120 Gold'),
+         Item('things', 'coins', 7, 'gp', None, 'coins (7 gp)')],
+        [],
+        [Item('things', 'hat', 1, None, 'red, blue', 'hat (blue, red)'),
+         Item('colors', 'red, "dark"', None, None, None, 'red, "dark"')]
+    ]
+
+
+def test_plain():
+    out = io.StringIO()
+    tablator.output.write([['a', 'b'], [], ['c']], 'plain', out)
+    assert out.getvalue() == 'a\nb\nc\n'
+
+
+def test_jsonl(chunks):
+    out = io.StringIO()
+    tablator.output.write(chunks, 'jsonl', out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 4
+    assert json.loads(lines[1]) == {'table': 'things', 'name': 'coins',
+                                    'quantity': 7, 'units': 'gp',
+                                    'subitem': None}
+    assert json.loads(lines[3])['name'] == 'red, "dark"'
+
+
+@pytest.mark.parametrize('format,delimiter', [('csv', ','), ('tsv', '\t')])
+def test_csv(chunks, format, delimiter):
+    out = io.StringIO()
+    tablator.output.write(chunks, format, out)
+    rows = list(csv.reader(io.StringIO(out.getvalue()), delimiter=delimiter))
+    assert rows[0] == ['table', 'name', 'quantity', 'units', 'subitem']
+    assert rows[1] == ['hoard', 'Gold', '120', '', '']
+    assert rows[3] == ['things', 'hat', '1', '', 'red, blue']
+    assert rows[4][1] == 'red, "dark"'
+    assert len(rows) == 5
+
+
+def test_csv_header_only():
+    out = io.StringIO()
+    tablator.output.write([], 'csv', out)
+    assert out.getvalue() == 'table,name,quantity,units,subitem\n'
+
+
+def test_one_write_per_chunk(chunks):
+    class Out:
+        writes = 0
+        def write(self, text):
+            self.writes += 1
+    for format in ('jsonl', 'csv'):
+        out = Out()
+        tablator.output.write(chunks, format, out)
+        assert out.writes == 2     # the empty chunk is not written
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match='Unknown output format: xml'):
+        tablator.output.write([], 'xml', io.StringIO())
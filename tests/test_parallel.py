@@ -0,0 +1,68 @@
+# PyTest for tablator.parallel
+
+import json
+import pytest
+import tablator.data
+import tablator.parallel
+import tablator.plan
+import tablator.table
+
+@pytest.fixture
+def data_dir(tmp_path):
+    tables = {
+        'hoard': { 'name': 'Hoard', 'total-weight': 2, 'columns': [
+            { 'name': 'coins', 'chance': 60, 'quantity': '2d6' },
+            { 'table': 'colors', 'quantity': '1d3' } ] },
+        'colors': { 'name': 'Colors', 'total-weight': 3, 'rows': [
+            { 'name': 'red' }, { 'name': 'green', 'quantity': '1d4' },
+            { 'name': 'blue' } ] },
+    }
+    for name, table in tables.items():
+        (tmp_path / f'{name}.json').write_text(json.dumps(table))
+    tablator.data.set_data_dir(str(tmp_path))
+    tablator.plan.clear()
+    yield tmp_path
+    tablator.plan.clear()
+    tablator.table.clear_cache()
+
+
+def test_chunk_seed():
+    assert tablator.parallel.chunk_seed(1, 0) == \
+        tablator.parallel.chunk_seed(1, 0)
+    assert tablator.parallel.chunk_seed(1, 0) != \
+        tablator.parallel.chunk_seed(1, 1)
+    assert tablator.parallel.chunk_seed(1, 1) != \
+        tablator.parallel.chunk_seed(2, 1)
+
+
+def test_same_for_any_workers(data_dir):
+    one = tablator.parallel.generate('hoard', 95, seed=4, workers=1,
+                                     chunk_size=10)
+    two = tablator.parallel.generate('hoard', 95, seed=4, workers=2,
+                                     chunk_size=10)
+    assert one == two
+
+
+def test_seed_changes_items(data_dir):
+    one = tablator.parallel.generate('colors', 200, seed=1, workers=1)
+    two = tablator.parallel.generate('colors', 200, seed=2, workers=1)
+    assert len(one) == len(two) == 200
+    assert one != two
+
+
+def test_chunks_in_order(data_dir):
+    chunks = list(tablator.parallel.generate_chunks(
+        'colors', 25, seed=5, workers=1, chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert sum(chunks, []) == tablator.parallel.generate(
+        'colors', 25, seed=5, workers=1, chunk_size=10)
+
+
+def test_bad_table(data_dir):
+    with pytest.raises(ValueError, match='Table not found: nowhere'):
+        tablator.parallel.generate('nowhere', 10, workers=2)
+
+
+def test_bad_backend(data_dir):
+    with pytest.raises(ValueError, match='Unknown RNG backend: dice'):
+        tablator.parallel.generate('colors', 10, backend='dice')
@@ -0,0 +1,236 @@
+# PyTest for tablator.plan
+
+import random
+import pytest
+import tablator.plan
+import tablator.table
+
+@pytest.fixture
+def tables():
+    return {
+        'colors': {
+            'name': 'Colors',
+            'total-weight': 6,
+            'rows': [
+                { 'weight': 3, 'name': 'red' },
+                { 'weight': 2, 'name': 'green' },
+                { 'name': 'blue' }
+            ]
+        },
+        'things': {
+            'name': 'Things',
+            'total-weight': 10,
+            'rows': [
+                { 'weight': 4, 'name': 'coins', 'quantity': '2d6',
+                  'units': 'gp' },
+                { 'weight': 2, 'name': 'hat', 'subtable': 'colors',
+                  'quantity': '1d2' },
+                { 'weight': 2, 'name': 'pair of socks',
+                  'subtable': 'two-colors' },
+                { 'table': 'hoard' },
+                { 'name': 'plain' }
+            ]
+        },
+        'two-colors': {
+            'name': 'Two Colors',
+            'total-weight': 2,
+            'columns': [
+                { 'table': 'colors' },
+                { 'table': 'colors' }
+            ]
+        },
+        'hoard': {
+            'name': 'Hoard',
+            'total-weight': 3,
+            'columns': [
+                { 'chance': 50, 'name': 'Gold', 'quantity': '10d10x10',
+                  'units': 'gp' },
+                { 'chance': 75, 'name': 'Gem' },
+                { 'chance': 25, 'table': 'colors', 'quantity': '1d3' }
+            ]
+        },
+        'loop-a': {
+            'name': 'Loop A',
+            'total-weight': 2,
+            'rows': [
+                { 'name': 'a' },
+                { 'table': 'loop-b' }
+            ]
+        },
+        'loop-b': {
+            'name': 'Loop B',
+            'total-weight': 1,
+            'columns': [
+                { 'table': 'loop-a' }
+            ]
+        },
+        'broken': {
+            'name': 'Broken',
+            'total-weight': 1,
+            'rows': [
+                { 'name': 'thing', 'subtable': 'no-such-table' }
+            ]
+        }
+    }
+
+
+def test_compile_links_nodes(mock_tables):
+    plan = tablator.plan.compile('things')
+    assert isinstance(plan, tablator.plan.RowTable)
+    assert plan.title == 'Things'
+    assert plan.rows[1].subtable.title == 'Colors'
+    assert plan.rows[3].table.title == 'Hoard'
+    # Shared tables are compiled once
+    assert plan.rows[1].subtable is plan.rows[2].subtable.columns[0].table
+    assert plan.rows[3].table.columns[1].chance == 75
+
+
+def test_nodes_of_children_first(mock_tables):
+    plan = tablator.plan.compile('things')
+    names = [node.name for node in tablator.plan.nodes_of(plan)]
+    assert sorted(names) == ['colors', 'hoard', 'things', 'two-colors']
+    assert names.index('colors') < names.index('two-colors')
+    assert names.index('colors') < names.index('hoard')
+    assert names[-1] == 'things'
+    hoard = plan.rows[3].table
+    skipped = tablator.plan.nodes_of(plan, {id(hoard): None})
+    assert [node.name for node in skipped] == \
+        [name for name in names if name != 'hoard']
+
+
+def test_compile_cycle(mock_tables):
+    with pytest.raises(ValueError, match='Table cycle: loop-a -> loop-b -> loop-a'):
+        tablator.plan.compile('loop-a')
+
+
+def test_compile_missing_table(mock_tables):
+    with pytest.raises(ValueError, match='broken: Table not found: no-such-table'):
+        tablator.plan.compile('broken')
+
+
+@pytest.mark.parametrize('table_name', ['colors', 'things', 'hoard'])
+def test_generate_same_as_lookup(mock_tables, table_name):
+    table = tablator.table.load_table(table_name)
+    if 'rows' in table:
+        lookup = tablator.table.lookup_rows
+    else:
+        lookup = tablator.table.lookup_columns
+    random.seed(11)
+    expected = list()
+    for i in range(200):
+        expected.extend(lookup(table))
+    random.seed(11)
+    assert tablator.plan.generate(table_name, 200) == expected
+
+
+@pytest.mark.parametrize('table_name', ['colors', 'things', 'hoard'])
+def test_evaluate_same_as_roll(mock_tables, table_name):
+    plan = tablator.plan.compile(table_name)
+    random.seed(5)
+    expected = [plan.roll() for i in range(200)]
+    random.seed(5)
+    assert [tablator.plan.evaluate(plan) for i in range(200)] == expected
+
+
+def deep_tables():
+    # chain-0 -> chain-1 -> ... -> chain-5000, alternating row and column
+    # tables, ending in a subtable row
+    tables = dict()
+    depth = 5000
+    for i in range(depth):
+        if i % 2 == 0:
+            tables[f'chain-{i}'] = {
+                'name': f'Chain {i}',
+                'total-weight': 1,
+                'rows': [ { 'table': f'chain-{i + 1}' } ]
+            }
+        else:
+            tables[f'chain-{i}'] = {
+                'name': f'Chain {i}',
+                'total-weight': 1,
+                'columns': [ { 'table': f'chain-{i + 1}' } ]
+            }
+    tables[f'chain-{depth}'] = {
+        'name': 'End',
+        'total-weight': 1,
+        'rows': [ { 'name': 'bottom', 'subtable': 'colors' } ]
+    }
+    tables['colors'] = {
+        'name': 'Colors',
+        'total-weight': 1,
+        'rows': [ { 'name': 'red' } ]
+    }
+    return tables
+
+
+@pytest.mark.parametrize('tables', [deep_tables()])
+def test_evaluate_deep(mock_tables):
+    plan = tablator.plan.compile('chain-0')
+    assert tablator.plan.evaluate(plan) == ['bottom (red)']
+
+
+@pytest.mark.parametrize('tables', [deep_tables()])
+def test_evaluate_max_depth(mock_tables):
+    plan = tablator.plan.compile('chain-0')
+    assert tablator.plan.evaluate(plan, max_depth=5002) == ['bottom (red)']
+    with pytest.raises(ValueError, match='Maximum table depth exceeded: 5001'):
+        tablator.plan.evaluate(plan, max_depth=5001)
+
+
+def test_generate_alias(mock_tables):
+    mock_tables['colors']['sampler'] = 'alias'
+    values = tablator.plan.generate('colors', 600)
+    assert set(values) == {'red', 'green', 'blue'}
+
+
+def test_get_plan_cache(mock_tables):
+    plan = tablator.plan.get_plan('colors')
+    assert tablator.plan.get_plan('colors') is plan
+    tablator.plan.clear()
+    assert tablator.plan.get_plan('colors') is not plan
+
+
+def test_iter_generate_chunks(mock_tables):
+    random.seed(3)
+    expected = tablator.plan.generate('things', 25)
+    random.seed(3)
+    chunks = list(tablator.plan.iter_generate('things', 25, chunk_size=10))
+    assert len(chunks) == 3
+    assert sum(chunks, []) == expected
+
+
+def test_iter_generate_lazy(mock_tables):
+    chunks = tablator.plan.iter_generate('colors', 10**12, chunk_size=5)
+    assert len(next(chunks)) == 5
+    chunks.close()
+
+
+def test_generate_records(mock_tables):
+    random.seed(8)
+    expected = tablator.plan.generate('things', 50)
+    random.seed(8)
+    records = tablator.plan.generate('things', 50, records=True)
+    assert [item.text for item in records] == expected
+    assert all(isinstance(item, tablator.plan.Item) for item in records)
+
+
+def test_record_fields(mock_tables):
+    random.seed(2)
+    records = tablator.plan.generate('things', 300, records=True)
+    coins = [item for item in records if item.name == 'coins']
+    assert coins
+    for item in coins:
+        assert (item.table, item.units, item.subitem) == ('things', 'gp', None)
+        assert 2 <= item.quantity <= 12
+        assert item.text == f'coins ({item.quantity} gp)'
+    socks = [item for item in records if item.name == 'pair of socks']
+    assert socks
+    for item in socks:
+        assert item.quantity is None
+        assert item.text == f'pair of socks ({item.subitem})'
+    gold = [item for item in records if item.name == 'Gold']
+    assert gold and all(item.table == 'hoard' for item in gold)
+    assert all(item.units == 'gp' for item in gold)
+    gems = [item for item in records if item.name == 'Gem']
+    assert gems and all(item.units is None for item in gems)
+    assert all(item.quantity % 10 == 0 for item in gold)
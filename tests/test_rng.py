@@ -0,0 +1,109 @@
+# PyTest for tablator.rng
+
+import collections
+import random
+import pytest
+import tablator.dice
+import tablator.plan
+import tablator.rng
+import tablator.table
+
+def make(backend, seed=None):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    return tablator.rng.make(backend, seed)
+
+
+@pytest.fixture(params=['random', 'buffered', 'numpy'])
+def backend(request):
+    return request.param
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match='Unknown RNG backend: dice'):
+        tablator.rng.make('dice')
+
+
+def test_seeded(backend):
+    one = make(backend, 5)
+    two = make(backend, 5)
+    assert [one.randint(1, 6) for i in range(100)] == \
+        [two.randint(1, 6) for i in range(100)]
+
+
+def test_bounds(backend):
+    rng = make(backend, 1)
+    values = [rng.randint(3, 5) for i in range(3000)]
+    assert set(values) == {3, 4, 5}
+    assert all(0 <= rng.randrange(7) < 7 for i in range(1000))
+    assert all(0.0 <= rng.random() < 1.0 for i in range(1000))
+    assert rng.randrange(1) == 0
+    big = 3 ** 50
+    assert all(0 <= rng.randrange(big) < big for i in range(100))
+    with pytest.raises(ValueError):
+        rng.randrange(0)
+
+
+def test_uniform(backend):
+    # 6000 draws of 1d6: each face within 5 standard deviations of 1000
+    rng = make(backend, 2)
+    counts = collections.Counter(rng.randint(1, 6) for i in range(6000))
+    assert all(abs(count - 1000) < 5 * 29 for count in counts.values())
+
+
+def test_no_modulo_bias():
+    # Bound near 2**64: plain 'word % n' would give [0, 2**64 - n) twice
+    # the chance; values must fall under and over 2**63 equally often.
+    rng = tablator.rng.BufferedRNG(3, chunk=64)
+    n = 3 * 2 ** 62
+    high = sum(rng.randrange(n) >= 2 ** 63 for i in range(6000))
+    assert abs(high - 2000) < 5 * 37
+
+
+def test_gauss(backend):
+    rng = make(backend, 4)
+    values = [rng.gauss(10, 2) for i in range(4000)]
+    mean = sum(values) / len(values)
+    assert abs(mean - 10) < 0.2
+
+
+@pytest.fixture
+def tables():
+    tables = {
+        'things': { 'name': 'Things', 'total-weight': 3, 'rows': [
+            { 'name': 'coin', 'quantity': '3d6' },
+            { 'name': 'hat', 'subtable': 'colors' },
+            { 'table': 'pile' } ] },
+        'pile': { 'name': 'Pile', 'total-weight': 1, 'columns': [
+            { 'name': 'gem', 'chance': 50, 'quantity': '1d4' } ] },
+        'colors': { 'name': 'Colors', 'total-weight': 2, 'rows': [
+            { 'name': 'red' }, { 'name': 'blue' } ] },
+    }
+    for table in tables.values():
+        tablator.dice.compile_table(table)
+    return tables
+
+
+@pytest.fixture
+def rng_tables(mock_tables):
+    yield mock_tables
+    tablator.rng.set_rng(None)
+
+
+def test_set_rng(rng_tables, backend):
+    # The table and plan paths draw the same numbers from the same RNG
+    table = tablator.table.load_table('things')
+    tablator.rng.set_rng(make(backend, 9))
+    expected = list()
+    for i in range(50):
+        expected.extend(tablator.table.lookup_rows(table))
+    tablator.rng.set_rng(make(backend, 9))
+    assert tablator.plan.generate('things', 50) == expected
+
+
+def test_random_rng_same_as_random(rng_tables):
+    tablator.rng.set_rng(tablator.rng.RandomRNG(rng=random.Random(6)))
+    expected = tablator.table.generate('things', 20)
+    tablator.rng.set_rng(None)
+    random.seed(6)
+    assert tablator.table.generate('things', 20) == expected
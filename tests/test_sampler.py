@@ -0,0 +1,113 @@
+# PyTest for tablator.sampler
+
+import pytest
+import tablator.sampler
+
+@pytest.fixture
+def nine_row_table():
+     return {
+        'name': 'Nine Row Table',
+        'total-weight': 45,
+        'rows': [
+            { 'weight': 1, 'name': 'row one' },
+            { 'weight': 2, 'name': 'row two' },
+            { 'weight': 3, 'name': 'row three' },
+            { 'weight': 4, 'name': 'row four' },
+            { 'weight': 5, 'name': 'row five' },
+            { 'weight': 6, 'name': 'row six' },
+            { 'weight': 7, 'name': 'row seven' },
+            { 'weight': 8, 'name': 'row eight' },
+            { 'weight': 9, 'name': 'row nine' }
+        ]
+    }
+
+
+@pytest.fixture
+def skewed_table():
+     return {
+        'name': 'Skewed Table',
+        'total-weight': 1003,
+        'rows': [
+            { 'weight': 1000, 'name': 'common' },
+            { 'name': 'rare one' },
+            { 'name': 'rare two' },
+            { 'name': 'rare three' }
+        ]
+    }
+
+
+def expected_names(table):
+    # Row names in order of the 1..total-weight index they cover
+    names = list()
+    for row in table['rows']:
+        names.extend([row['name']] * row.get('weight', 1))
+    return names
+
+
+def test_build_cumulative(nine_row_table):
+    cumulative = tablator.sampler.build_cumulative(nine_row_table)
+    assert cumulative == [1, 3, 6, 10, 15, 21, 28, 36, 45]
+    assert nine_row_table['_cumulative'] is cumulative
+
+
+def test_build_alias_is_exact(skewed_table):
+    # Sum the share of each row over all columns of the alias table
+    probability, alias, total = tablator.sampler.build_alias(skewed_table)
+    shares = [0] * len(probability)
+    for i in range(len(probability)):
+        shares[i] += probability[i]
+        shares[alias[i]] += total - probability[i]
+    assert total == 1003
+    assert shares == [r.get('weight', 1) * 4 for r in skewed_table['rows']]
+
+
+@pytest.mark.parametrize('engine', ['linear', 'bisect'])
+def test_index_engines(monkeypatch, nine_row_table, engine):
+    # Each index selects the row whose weight range contains it
+    nine_row_table['sampler'] = engine
+    tablator.sampler.index(nine_row_table)
+    for index, name in enumerate(expected_names(nine_row_table), start=1):
+        monkeypatch.setattr(tablator.sampler, 'randint', lambda a, b: index)
+        assert tablator.sampler.pick(nine_row_table)['name'] == name
+
+
+def test_alias_row_all_draws(monkeypatch, skewed_table):
+    # Every possible draw, counted per row, gives the row weights exactly
+    skewed_table['sampler'] = 'alias'
+    counts = dict()
+    for draw in range(4 * 1003):
+        monkeypatch.setattr(tablator.sampler, 'randrange', lambda n: draw)
+        name = tablator.sampler.pick(skewed_table)['name']
+        counts[name] = counts.get(name, 0) + 1
+    assert counts == {'common': 4000, 'rare one': 4, 'rare two': 4,
+                      'rare three': 4}
+
+
+@pytest.mark.parametrize('engine', ['linear', 'bisect'])
+def test_row_out_of_bounds(monkeypatch, nine_row_table, engine):
+    nine_row_table['sampler'] = engine
+    nine_row_table['total-weight'] = 46
+    monkeypatch.setattr(tablator.sampler, 'randint', lambda a, b: 46)
+    with pytest.raises(RuntimeError, match='row index out of bounds'):
+        tablator.sampler.pick(nine_row_table)
+
+
+def test_get_sampler_table(nine_row_table):
+    assert tablator.sampler.get_sampler(nine_row_table) == 'bisect'
+    nine_row_table['sampler'] = 'alias'
+    assert tablator.sampler.get_sampler(nine_row_table) == 'alias'
+    nine_row_table['sampler'] = 'magic'
+    with pytest.raises(ValueError, match='unknown sampler: magic'):
+        tablator.sampler.get_sampler(nine_row_table)
+
+
+def test_set_sampler(nine_row_table):
+    tablator.sampler.set_sampler('alias')
+    try:
+        assert tablator.sampler.get_sampler(nine_row_table) == 'alias'
+        tablator.sampler.index(nine_row_table)
+        assert '_alias' in nine_row_table
+    finally:
+        tablator.sampler.set_sampler('bisect')
+    with pytest.raises(ValueError, match='Unknown sampler: magic'):
+        tablator.sampler.set_sampler('magic')
@@ -0,0 +1,95 @@
+# PyTest for tablator.server
+
+import asyncio
+import json
+import pytest
+import tablator.server
+from tablator.session import Tablator
+
+@pytest.fixture
+def session(tmp_path):
+    tables = {
+        'colors': { 'name': 'Colors', 'total-weight': 2, 'rows': [
+            { 'name': 'red' }, { 'name': 'blue' } ] },
+        'hoard': { 'name': 'Hoard', 'total-weight': 1, 'columns': [
+            { 'table': 'colors', 'chance': 100 } ] },
+    }
+    for name, table in tables.items():
+        (tmp_path / f'{name}.json').write_text(json.dumps(table))
+    return Tablator(str(tmp_path), seed=1)
+
+
+def test_tables(session):
+    status, content_type, body = tablator.server.handle(session, 'GET',
+                                                        '/tables')
+    assert status == 200
+    assert content_type == 'application/json'
+    assert json.loads(body) == ['colors', 'hoard']
+
+
+def test_roll(session):
+    status, content_type, body = tablator.server.handle(
+        session, 'GET', '/roll/hoard?n=5')
+    assert status == 200
+    items = json.loads(body)
+    assert len(items) == 5
+    assert set(items) <= {'red', 'blue'}
+
+
+def test_print(session):
+    status, content_type, body = tablator.server.handle(session, 'GET',
+                                                        '/print/hoard')
+    assert status == 200
+    assert content_type.startswith('text/plain')
+    assert body.decode() == 'Hoard\n-----\n100% Colors\n\n'
+
+
+@pytest.mark.parametrize('method, target, status', [
+    ('GET', '/roll/nowhere', 404),
+    ('GET', '/roll/..%2Fcolors', 404),
+    ('GET', '/roll/colors?n=many', 400),
+    ('GET', '/roll/colors?n=0', 400),
+    ('GET', '/other', 404),
+    ('POST', '/tables', 405),
+])
+def test_errors(session, method, target, status):
+    result = tablator.server.handle(session, method, target)
+    assert result[0] == status
+    assert 'error' in json.loads(result[2])
+
+
+def test_internal_error(session, monkeypatch):
+    def broken(table_name, num_rolls=1):
+        raise RuntimeError('broken')
+
+    monkeypatch.setattr(session, 'generate', broken)
+    status, content_type, body = tablator.server.handle(session, 'GET',
+                                                        '/roll/colors')
+    assert status == 500
+    assert json.loads(body) == {'error': 'broken'}
+
+
+def test_keep_alive(session):
+    async def talk():
+        server = await tablator.server.start(session, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        replies = list()
+        for path in ('/tables', '/roll/colors?n=2'):
+            writer.write(f'GET {path} HTTP/1.1\r\n\r\n'.encode())
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+            replies.append((head, await reader.readexactly(length)))
+        writer.write(b'GET /tables HTTP/1.1\r\nConnection: close\r\n\r\n')
+        head = await reader.readuntil(b'\r\n\r\n')
+        await reader.read()     # server closes the connection
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return replies, head
+
+    replies, last = asyncio.run(talk())
+    assert all(head.startswith(b'HTTP/1.1 200 OK') for head, body in replies)
+    assert b'Connection: keep-alive' in replies[0][0]
+    assert len(json.loads(replies[1][1])) == 2
+    assert b'Connection: close' in last
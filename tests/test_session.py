@@ -0,0 +1,192 @@
+# PyTest for tablator.session
+
+import concurrent.futures
+import json
+import os
+import pytest
+import tablator.data
+import tablator.metrics
+import tablator.plan
+import tablator.session
+import tablator.table
+from tablator.session import Tablator
+
+@pytest.fixture
+def tables():
+    return {
+        'root': { 'name': 'Root', 'total-weight': 2, 'rows': [
+            { 'name': 'hat', 'subtable': 'colors', 'quantity': '1d4' },
+            { 'table': 'pile' } ] },
+        'pile': { 'name': 'Pile', 'total-weight': 1, 'columns': [
+            { 'table': 'colors', 'quantity': '1d4' } ] },
+        'colors': { 'name': 'Colors', 'total-weight': 3, 'rows': [
+            { 'name': 'red' }, { 'name': 'green' }, { 'name': 'blue' } ] },
+    }
+
+
+def write_tables(path, tables):
+    for name, table in tables.items():
+        (path / f'{name}.json').write_text(json.dumps(table))
+    return str(path)
+
+
+@pytest.fixture
+def data_dir(tmp_path, tables):
+    return write_tables(tmp_path, tables)
+
+
+def test_missing_data_dir(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Tablator(str(tmp_path / 'nowhere'))
+
+
+def test_list_tables(data_dir):
+    session = Tablator(data_dir)
+    assert session.list_tables() == ['colors', 'pile', 'root']
+    assert session.is_table('pile') is True
+    assert session.is_table('nowhere') is False
+
+
+def test_generate_seed(data_dir):
+    one = Tablator(data_dir, seed=3).generate('root', 50)
+    two = Tablator(data_dir, seed=3).generate('root', 50)
+    assert one == two
+
+
+def test_same_as_plan(data_dir):
+    # A session rolls exactly as the module functions with the same seed
+    import random
+    tablator.data.set_data_dir(data_dir)
+    tablator.plan.clear()
+    random.seed(8)
+    expected = tablator.plan.generate('root', 50)
+    tablator.plan.clear()
+    session = Tablator(data_dir)
+    session.random.seed(8)
+    assert session.generate('root', 50) == expected
+
+
+def test_sessions_are_independent(tmp_path, tables):
+    os.mkdir(tmp_path / 'a')
+    first = Tablator(write_tables(tmp_path / 'a', tables))
+    tables['colors']['rows'] = [ { 'name': 'black', 'weight': 3 } ]
+    os.mkdir(tmp_path / 'b')
+    second = Tablator(write_tables(tmp_path / 'b', tables))
+    assert set(first.generate('colors', 20)) <= {'red', 'green', 'blue'}
+    assert second.generate('colors', 3) == ['black'] * 3
+    assert first.load_table('colors') is not second.load_table('colors')
+
+
+def test_set_data_dir(tmp_path, tables):
+    os.mkdir(tmp_path / 'a')
+    session = Tablator(write_tables(tmp_path / 'a', tables))
+    session.generate('root')
+    tables['colors']['rows'] = [ { 'name': 'black', 'weight': 3 } ]
+    os.mkdir(tmp_path / 'b')
+    session.set_data_dir(write_tables(tmp_path / 'b', tables))
+    assert session.cache_stats()['tables'] == 0
+    assert session.generate('colors', 2) == ['black', 'black']
+
+
+def test_threads_share_tables(monkeypatch, data_dir):
+    reads = list()
+    read_table = tablator.table.read_table
+
+    def counting_read_table(table_name, data_dir=None, recursive=None):
+        reads.append(table_name)
+        return read_table(table_name, data_dir, recursive)
+
+    monkeypatch.setattr(tablator.table, 'read_table', counting_read_table)
+    session = Tablator(data_dir)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: session.generate('root', 20),
+                                    range(40)))
+    assert all(len(values) >= 20 for values in results)
+    assert sorted(reads) == ['colors', 'pile', 'root']
+
+
+def test_reload_changed_table(data_dir):
+    session = Tablator(data_dir, interval=0)
+    assert set(session.generate('colors', 20)) <= {'red', 'green', 'blue'}
+    path = os.path.join(data_dir, 'colors.json')
+    with open(path, 'w') as f:
+        json.dump({ 'name': 'Colors', 'total-weight': 1, 'rows': [
+            { 'name': 'white' } ] }, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert session.generate('colors', 2) == ['white', 'white']
+
+
+def test_iter_generate(data_dir):
+    expected = Tablator(data_dir, seed=6).generate('root', 30)
+    chunks = Tablator(data_dir, seed=6).iter_generate('root', 30,
+                                                      chunk_size=7)
+    assert sum(chunks, []) == expected
+
+
+def test_default_session(data_dir):
+    # The module functions are the default session, over the module state
+    default = tablator.session.default()
+    tablator.data.set_data_dir(data_dir)
+    tablator.table.clear_cache()
+    default.seed(5)
+    expected = tablator.plan.generate('root', 30)
+    assert default.cache is tablator.table._tables
+    assert default.cache_stats()['tables'] == 3
+    default.seed(5)
+    assert default.generate('root', 30) == expected
+    assert default.list_tables() == tablator.data.list_tables()
+
+
+def test_recursive(data_dir, tmp_path, tables):
+    os.mkdir(tmp_path / 'sub')
+    write_tables(tmp_path / 'sub', {'inner': tables['colors']})
+    tablator.data.set_data_dir(data_dir)
+    session = Tablator(data_dir, recursive=True)
+    assert session.list_tables() == ['colors', 'pile', 'root', 'sub/inner']
+    assert set(session.generate('sub/inner', 5)) <= {'red', 'green', 'blue'}
+    assert 'sub/inner' not in tablator.data.list_tables()
+    assert Tablator(data_dir).is_table('sub/inner') is False
+
+
+def test_default_seed_counting_rng(data_dir):
+    # With metrics on, the default RNG is a CountingRNG
+    default = tablator.session.default()
+    tablator.data.set_data_dir(data_dir)
+    tablator.metrics.set(True)
+    try:
+        default.seed(8)
+        expected = tablator.plan.generate('root', 20)
+        default.seed(8)
+        assert tablator.plan.generate('root', 20) == expected
+    finally:
+        tablator.metrics.set(False)
+        tablator.metrics.reset()
+
+
+def test_default_recursive_changed(data_dir, tmp_path, tables):
+    os.mkdir(tmp_path / 'sub')
+    write_tables(tmp_path / 'sub', {'colors': {**tables['colors'],
+                                              'rows': [{'name': 'black'}]}})
+    default = tablator.session.default()
+    tablator.data.set_data_dir(data_dir)
+    tablator.plan.generate('root')
+    assert default.cache_stats()['tables'] == 3
+    tablator.data.set_data_dir(data_dir, recursive=True)
+    try:
+        # The cached tables and plans were found non-recursively
+        default.load_table('colors')
+        assert default.cache_stats()['tables'] == 1
+        assert tablator.plan._plans == {}
+    finally:
+        tablator.data.set_data_dir(data_dir)
+
+
+def test_lazy_import():
+    import subprocess
+    import sys
+    code = ('import sys, tablator; '
+            "assert 'tablator.session' not in sys.modules; "
+            'assert tablator.Tablator is tablator.session.Tablator')
+    subprocess.run([sys.executable, '-c', code], check=True,
+                   env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
@@ -1,6 +1,8 @@
 # PyTest for tablator.table
 
 import pytest
+import tablator.dice
+import tablator.plan
 import tablator.table
 import tablator.logger
 
@@ -228,28 +230,39 @@ def test_generate_invalid_table(monkeypatch):
         tablator.table.generate('no-table', 1)
 
 
-def test_generate_row_table(monkeypatch, one_row_table):
-    def mock_load_table(table_name):
-        return one_row_table
+@pytest.fixture
+def tables(one_row_table):
+    return {
+        'one-row-table': one_row_table,
+        'list-table': {
+            'name': 'List Table',
+            'total-weight': 1,
+            'columns': [ { 'name': 'only row' } ]
+        }
+    }
 
-    monkeypatch.setattr(tablator.table, 'load_table', mock_load_table)
+
+def test_generate_row_table(mock_tables):
     values = tablator.table.generate('one-row-table', 3)
     assert values == ['only row', 'only row', 'only row']
 
 
-def test_generate_columns_table(monkeypatch, one_row_table):
-    def mock_load_table(table_name):
-        return one_row_table
-
-    def mock_lookup_columns(table_name):
-        return ['only row']
-
-    monkeypatch.setattr(tablator.table, 'load_table', mock_load_table)
-    monkeypatch.setattr(tablator.table, 'lookup_columns', mock_lookup_columns)
+def test_generate_columns_table(mock_tables):
     values = tablator.table.generate('list-table', 3)
     assert values == ['only row', 'only row', 'only row']
 
 
+def test_generate_uses_plan(monkeypatch, mock_tables):
+    # generate is the default session's: the tables are rolled with their
+    # compiled plan, not with lookup_rows
+    def mock_lookup_rows(table):
+        assert False, 'lookup_rows called'
+
+    monkeypatch.setattr(tablator.table, 'lookup_rows', mock_lookup_rows)
+    assert tablator.table.generate('one-row-table', 2) == ['only row'] * 2
+    assert 'one-row-table' in tablator.plan._plans
+
+
 def test_get_chance_not_present(columns_table_no_chance):
     chance = tablator.table.get_chance(columns_table_no_chance['columns'][0])
     assert chance == 100
@@ -324,6 +337,17 @@ def test_load_table_cache_hit(capsys, monkeypatch, one_row_table):
     assert table is not None
 
 
+def test_load_table_bad_quantity(monkeypatch, one_row_table):
+    def mock_load(table_name):
+        return one_row_table
+
+    one_row_table['rows'][0]['quantity'] = 'some'
+    tablator.table._tables.clear()      # clear the table cache
+    monkeypatch.setattr(tablator.data, 'load', mock_load)
+    with pytest.raises(ValueError, match='One Row Table: Invalid dice'):
+        tablator.table.load_table('one-row-table')
+
+
 def test_lookup_rows_simple_lookup(monkeypatch, one_row_table):
     def mock_random_row(table_name):
         return { 'name': 'fake row' }
@@ -458,6 +482,16 @@ Table List
 '''
 
 
+def test_load_table_index(monkeypatch, nine_row_table):
+    def mock_load(table_name):
+        return nine_row_table
+
+    tablator.table._tables.clear()      # clear the table cache
+    monkeypatch.setattr(tablator.data, 'load', mock_load)
+    table = tablator.table.load_table('nine-row-table')
+    assert table['_cumulative'][-1] == table['total-weight']
+
+
 def test_random_row_1(one_row_table):
     # Get a "random" row from a one-row table.
     row = tablator.table.random_row(one_row_table)
@@ -484,6 +518,18 @@ def test_roll_quantity_2():
     assert n == '12'
 
 
+def test_roll_quantity_compiled():
+    dice = tablator.dice.compile('2d6+6')
+    for i in range(100):
+        n = tablator.table.roll_quantity(dice)
+        assert int(n) >= 8 and int(n) <= 18
+
+
+def test_roll_quantity_malformed():
+    with pytest.raises(ValueError, match='Invalid dice expression: lots'):
+        tablator.table.roll_quantity('lots')
+
+
 def test_roll_quantity_3():
     for i in range(100):
         n = tablator.table.roll_quantity('1d6')
@@ -512,3 +558,54 @@ def test_roll_quantity_7():
     for i in range(100):
         n = tablator.table.roll_quantity('10d10+10x100')
         assert int(n) >= 2000 and int(n) <= 11000
+
+
+@pytest.fixture
+def preload_dir(tmp_path):
+    import json
+    tables = {
+        'root': { 'name': 'Root', 'total-weight': 2, 'rows': [
+            { 'name': 'hat', 'subtable': 'colors' },
+            { 'table': 'pile' } ] },
+        'pile': { 'name': 'Pile', 'total-weight': 1, 'columns': [
+            { 'table': 'colors', 'quantity': '1d4' } ] },
+        'colors': { 'name': 'Colors', 'total-weight': 1, 'rows': [
+            { 'name': 'red' } ] },
+        'unrelated': { 'name': 'Unrelated', 'total-weight': 1, 'rows': [
+            { 'name': 'thing' } ] },
+    }
+    for name, table in tables.items():
+        (tmp_path / f'{name}.json').write_text(json.dumps(table))
+    tablator.data.set_data_dir(str(tmp_path))
+    tablator.data._indexes.clear()
+    tablator.table._tables.clear()
+    yield tmp_path
+    tablator.data._indexes.clear()
+    tablator.table._tables.clear()
+
+
+def test_references():
+    table = { 'columns': [ { 'table': 'a' }, { 'name': 'b', 'table': None },
+                           { 'table': 'a' } ] }
+    assert tablator.table.references(table) == ['a']
+
+
+def test_preload_closure(preload_dir):
+    timings = tablator.table.preload(['root'], workers=2)
+    assert sorted(timings) == ['colors', 'pile', 'root']
+    assert all(seconds >= 0 for seconds in timings.values())
+    assert sorted(tablator.table._tables) == ['colors', 'pile', 'root']
+    assert '_cumulative' in tablator.table._tables['root']
+    # Already loaded tables are skipped
+    assert tablator.table.preload(['root']) == dict()
+
+
+def test_preload_data_dir(preload_dir):
+    timings = tablator.table.preload(processes=True, workers=2)
+    assert sorted(timings) == ['colors', 'pile', 'root', 'unrelated']
+    assert tablator.table._tables['pile']['columns'][0]['_dice'].sides == 4
+
+
+def test_preload_missing(preload_dir):
+    with pytest.raises(ValueError, match='Table not found: nowhere'):
+        tablator.table.preload(['root', 'nowhere'])
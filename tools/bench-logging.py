@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure the cost of disabled logging in the table hot path.
+
+Compares, per call, an empty loop against the guarded check used in the
+hot path ('if tablator.logger.enabled: ...'), an unguarded call to a
+disabled trace(), and an unguarded call with eagerly built arguments.
+Then times tablator.table.generate with logging disabled, and with
+logging enabled but discarded.
+
+Run from the root of the repository:
+
+    PYTHONPATH=src tools/bench-logging.py
+"""
+
+import argparse
+import contextlib
+import io
+import timeit
+
+import tablator.logger
+import tablator.table
+from tablator.logger import debug, trace
+
+
+def table(num_rows):
+    """
+    Make a row table with a quantity on every other row.
+    """
+    rows = list()
+    for i in range(num_rows):
+        row = {'name': f'row {i}', 'weight': 1 + i % 7}
+        if i % 2:
+            row['quantity'] = '2d6'
+        rows.append(row)
+    return {'name': 'Bench', 'total-weight': sum(r['weight'] for r in rows),
+            'rows': rows}
+
+
+def per_call(statement, number, setup='pass'):
+    """
+    Return the best time per call of a statement, in nanoseconds.
+    """
+    timer = timeit.Timer(statement, setup=setup, globals=globals())
+    return min(timer.repeat(5, number)) / number * 1e9
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark disabled logging in the hot path')
+    parser.add_argument('-n', '--number', action='store', default=1000000,
+                        type=int, help='calls per micro benchmark')
+    parser.add_argument('-r', '--rolls', action='store', default=100000,
+                        type=int, help='rolls per generate benchmark')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    tablator.logger.set(False, False)
+    rows = list(range(100))
+    micro = [
+        ('empty statement', 'pass'),
+        ('guarded, disabled',
+         "if tablator.logger.enabled: trace('lookup_rows')"),
+        ('guarded with args, disabled',
+         "if tablator.logger.enabled: debug('rows', f'{len(rows)}')"),
+        ('unguarded call, disabled', "trace('lookup_rows')"),
+        ('unguarded eager args, disabled', "debug('rows', f'{len(rows)}')"),
+    ]
+    print('Per call (ns)')
+    for label, statement in micro:
+        print('  {:32} {:8.1f}'.format(label, per_call(statement, args.number)))
+
+    data = table(1000)
+    tablator.table._tables['bench'] = data
+    rolls = args.rolls
+    print(f'generate, {rolls} rolls (s)')
+    seconds = min(timeit.repeat(
+        lambda: tablator.table.generate('bench', rolls), number=1, repeat=3))
+    print('  {:32} {:8.3f}'.format('logging disabled', seconds))
+    tablator.logger.set(True, True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds = min(timeit.repeat(
+            lambda: tablator.table.generate('bench', rolls), number=1,
+            repeat=3))
+    tablator.logger.set(False, False)
+    print('  {:32} {:8.3f}'.format('logging enabled (discarded)', seconds))
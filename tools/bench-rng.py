@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare the RNG backends (random, buffered, numpy).
+
+Prints, for each backend, the draws per second of randint(1, 100) (a
+column chance roll) and randint(1, 6) (a die), and the rolls per second
+of a compiled plan rolling on a synthetic table with row, dice and
+column draws.  The random module, as used by default, is shown first.
+Run from the root of the repository:
+
+    PYTHONPATH=src tools/bench-rng.py
+"""
+
+import argparse
+import random
+import timeit
+
+import tablator.plan
+import tablator.rng
+import tablator.table
+
+
+def tables():
+    """
+    Make a row table (1000 rows, quantities on every other row) and a
+    column table of 4 columns referring to it.
+    """
+    rows = list()
+    for i in range(1000):
+        row = {'name': f'row {i}', 'weight': 1 + i % 7}
+        if i % 2:
+            row['quantity'] = '2d6'
+        rows.append(row)
+    things = {'name': 'Things', 'rows': rows,
+              'total-weight': sum(row['weight'] for row in rows)}
+    hoard = {'name': 'Hoard', 'total-weight': 4, 'columns': [
+        {'name': 'coins', 'chance': 90, 'quantity': '3d6x10'},
+        {'name': 'gems', 'chance': 50, 'quantity': '1d4'},
+        {'table': 'things', 'chance': 75, 'quantity': '1d3'},
+        {'table': 'things', 'chance': 25}]}
+    return {'things': things, 'hoard': hoard}
+
+
+def per_second(function, number):
+    """
+    Return the best calls per second of a function.
+    """
+    return number / min(timeit.repeat(function, number=number, repeat=3))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the RNG backends')
+    parser.add_argument('-n', '--number', action='store', default=200000,
+                        type=int, help='draws per micro benchmark')
+    parser.add_argument('-r', '--rolls', action='store', default=20000,
+                        type=int, help='rolls per plan benchmark')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    data = tables()
+    for name, table in data.items():
+        tablator.table.check_weights(table)
+        tablator.table._tables[name] = table
+    plan = tablator.plan.compile('hoard')
+    evaluate = tablator.plan.evaluate
+
+    backends = [('random module', random)]
+    for backend in tablator.rng.BACKENDS:
+        try:
+            backends.append((backend, tablator.rng.make(backend, 1)))
+        except ImportError:
+            print(f'{backend}: not available')
+
+    print('{:16} {:>14} {:>14} {:>14}'.format(
+        'backend', 'd100 draws/s', 'd6 draws/s', 'rolls/s'))
+    for label, rng in backends:
+        randint = rng.randint
+        d100 = per_second(lambda: randint(1, 100), args.number)
+        d6 = per_second(lambda: randint(1, 6), args.number)
+        rolls = per_second(lambda: evaluate(plan, None, rng), args.rolls)
+        print('{:16} {:>14,.0f} {:>14,.0f} {:>14,.0f}'.format(
+            label, d100, d6, rolls))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the row sampler engines (linear, bisect, alias) on synthetic row
+tables from 10 to 1,000,000 rows.
+
+Prints the index build time and the time per roll of each engine.
+Run from the root of the repository:
+
+    PYTHONPATH=src tools/bench-samplers.py
+"""
+
+import argparse
+import random
+import time
+
+import tablator.sampler
+
+
+def make_table(num_rows, skew):
+    """
+    Make a row table with Zipf-like weights: weight ~ num_rows / rank^skew
+    """
+    rows = list()
+    for rank in range(1, num_rows + 1):
+        weight = max(1, int(num_rows / rank ** skew))
+        rows.append({'name': f'row {rank}', 'weight': weight})
+    random.shuffle(rows)
+    total = sum(row['weight'] for row in rows)
+    return {'name': f'{num_rows} rows', 'total-weight': total, 'rows': rows}
+
+
+def time_engine(table, engine, budget):
+    """
+    Roll on a table until the time budget is spent.
+    Returns (build seconds, seconds per roll).
+    """
+    table = dict(table, sampler=engine)
+    start = time.perf_counter()
+    tablator.sampler.index(table)
+    build = time.perf_counter() - start
+
+    pick = tablator.sampler.pick
+    rolls = 0
+    batch = 1
+    start = time.perf_counter()
+    while True:
+        for i in range(batch):
+            pick(table)
+        rolls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return build, elapsed / rolls
+        batch = min(batch * 2, 100000)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the row sampler engines')
+    parser.add_argument('-b', '--budget', action='store', default=0.5,
+                        type=float, help='seconds to roll per engine and size')
+    parser.add_argument('-s', '--skew', action='store', default=1.0,
+                        type=float, help='weight skew exponent')
+    parser.add_argument('sizes', nargs='*', type=int,
+                        default=[10, 100, 1000, 10000, 100000, 1000000],
+                        help='table sizes (rows)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    random.seed(1)
+    print('{:>9}  {:>7}  {:>12}  {:>12}'.format(
+          'rows', 'engine', 'build (ms)', 'roll (us)'))
+    for size in args.sizes:
+        table = make_table(size, args.skew)
+        for engine in tablator.sampler.ENGINES:
+            build, roll = time_engine(table, engine, args.budget)
+            print('{:>9}  {:>7}  {:>12.3f}  {:>12.3f}'.format(
+                  size, engine, build * 1e3, roll * 1e6))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Measure tablator's import time and CLI cold start, and fail if either
+goes over its budget.
+
+Each command is run in a fresh interpreter several times; the best wall
+time, less that of an empty interpreter ('python -c pass'), is compared
+with the budget.  Exits 1 if over budget.
+
+Run from anywhere:
+
+    tools/bench-startup.py
+    tools/bench-startup.py --import-budget 30 --start-budget 80
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+SRC_DIR = os.path.join(BASE_DIR, 'src')
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+
+def best_time(command, repeat):
+    """
+    Run a command several times, return the best wall time in ms.
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark tablator import time and CLI start-up')
+    parser.add_argument('-i', '--import-budget', action='store', default=40.0,
+                        type=float, help='ms allowed for "import tablator"')
+    parser.add_argument('-s', '--start-budget', action='store', default=100.0,
+                        type=float, help='ms allowed for one CLI roll')
+    parser.add_argument('-r', '--repeat', action='store', default=10,
+                        type=int, help='runs per command (best is kept)')
+    parser.add_argument('-t', '--table', action='store', default='colors',
+                        help='table in data/ to roll on')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    python = sys.executable
+    baseline = best_time([python, '-c', 'pass'], args.repeat)
+    imports = best_time([python, '-c', 'import tablator'], args.repeat)
+    start = best_time([python, os.path.join(SRC_DIR, 'tablator.py'),
+                       '--data-dir', DATA_DIR, args.table], args.repeat)
+
+    results = [
+        ('import tablator', imports - baseline, args.import_budget),
+        (f'tablator.py {args.table}', start - baseline, args.start_budget),
+    ]
+    print('{:28} {:>10.1f} ms'.format('python -c pass', baseline))
+    over = False
+    for label, elapsed, budget in results:
+        status = 'ok' if elapsed <= budget else 'OVER BUDGET'
+        over = over or elapsed > budget
+        print('{:28} {:>+10.1f} ms  (budget {:.0f} ms)  {}'.format(
+              label, elapsed, budget, status))
+    sys.exit(1 if over else 0)
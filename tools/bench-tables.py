@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Benchmark the table engine on synthetic data directories.
+
+Each data directory is built along five axes:
+
+    rows        rows of each row table
+    skew        Zipf exponent of the row weights (0 is uniform)
+    depth       levels of row tables rolling on row tables, and of column
+                tables rolling on column tables
+    fanout      columns of each column table (half roll on the next level)
+    format      json or yaml table files
+
+The base directory uses the default of every axis; each value given for
+an axis adds a directory that differs from the base in that axis only.
+On each one the time per call of random_row, roll_quantity, lookup_rows,
+lookup_columns, generate (100 rolls), load_table (parsing the file) and
+print_plain is measured (best of --repeat runs).
+
+Results are written as JSON with --output; with --baseline a results file
+is compared, and the script exits 1 if any benchmark is slower than the
+baseline by more than --threshold.  tools/bench-tables.json is the
+baseline of the default axes, as committed; remake it with --output on the
+machine the comparisons run on.  Run from the root of the repository:
+
+    PYTHONPATH=src tools/bench-tables.py --baseline tools/bench-tables.json
+    PYTHONPATH=src tools/bench-tables.py --output tools/bench-tables.json
+    PYTHONPATH=src tools/bench-tables.py --rows 10 10000 --baseline bench.json
+    PYTHONPATH=src tools/bench-tables.py --make-data /tmp/tables --depth 5
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+
+import tablator
+import tablator.dice
+import tablator.plan
+import tablator.table
+
+AXES = ('rows', 'skew', 'depth', 'fanout', 'format')
+
+DEFAULTS = {'rows': 100, 'skew': 1.0, 'depth': 2, 'fanout': 4,
+            'format': 'json'}
+
+# Quantity rolled by the roll_quantity benchmark
+QUANTITY = '3d6+2x10'
+
+
+def make_tables(rows=100, skew=1.0, depth=2, fanout=4, seed=1):
+    """
+    Make the tables of a synthetic data directory:
+        rows-D      row tables; for D < depth every tenth row rolls on
+                    rows-(D+1) and every fifth has rows-depth as subtable
+        columns-D   column tables of fanout columns; for D < depth half
+                    of them roll on columns-(D+1), otherwise on rows-depth
+    Returns a dict of table name: table.
+    """
+    rng = random.Random(seed)
+    tables = dict()
+    for level in range(depth + 1):
+        entries = list()
+        for rank in range(1, rows + 1):
+            row = {'name': f'item {level}-{rank}',
+                   'weight': max(1, int(rows / rank ** skew))}
+            if level < depth and rank % 10 == 0:
+                row = {'table': f'rows-{level + 1}', 'weight': row['weight']}
+            elif level < depth and rank % 5 == 0:
+                row['subtable'] = f'rows-{depth}'
+            elif rank % 3 == 0:
+                row['quantity'] = '2d6'
+                row['units'] = 'gp'
+            entries.append(row)
+        rng.shuffle(entries)
+        tables[f'rows-{level}'] = {
+            'name': f'Rows {level}', 'rows': entries,
+            'total-weight': sum(row['weight'] for row in entries)}
+
+        columns = list()
+        for i in range(fanout):
+            if i % 2:
+                target = f'columns-{level + 1}' if level < depth \
+                    else f'rows-{depth}'
+                columns.append({'table': target, 'chance': 50,
+                                'quantity': '1d2'})
+            else:
+                columns.append({'name': f'coins {level}-{i}', 'chance': 75,
+                                'quantity': '1d6x10'})
+        tables[f'columns-{level}'] = {
+            'name': f'Columns {level}', 'columns': columns,
+            'total-weight': len(columns)}
+    return tables
+
+
+def make_data_dir(path, rows=100, skew=1.0, depth=2, fanout=4,
+                  format='json'):
+    """
+    Write the tables of make_tables() to a directory, as JSON or YAML.
+    """
+    os.makedirs(path, exist_ok=True)
+    for name, table in make_tables(rows, skew, depth, fanout).items():
+        with open(os.path.join(path, f'{name}.{format}'), 'w') as f:
+            if format == 'yaml':
+                import yaml
+                yaml.safe_dump(table, f, sort_keys=False)
+            else:
+                json.dump(table, f, indent=2)
+
+
+def seconds_per_call(function, repeat):
+    """
+    Return the best time of one call of a function, in seconds.
+    """
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    best = min([elapsed] + timer.repeat(repeat - 1, number))
+    return best / number
+
+
+def run_suite(path, depth, repeat):
+    """
+    Time the engine on the data directory at path, of the given depth.
+    Returns a dict of benchmark name: seconds per call.
+    """
+    tablator.set_data_dir(path)
+    tablator.table.clear_cache()
+    tablator.plan.clear()
+    load_table = tablator.table.load_table
+    leaf = load_table(f'rows-{depth}')
+    rows = load_table('rows-0')
+    columns = load_table('columns-0')
+    dice = tablator.dice.compile(QUANTITY)
+
+    def cold_load():
+        tablator.table.invalidate('rows-0')
+        load_table('rows-0')
+
+    def print_plain():
+        tablator.table.print_plain('rows-0', io.StringIO())
+
+    benchmarks = {
+        'random_row': lambda: tablator.table.random_row(leaf),
+        'roll_quantity': lambda: tablator.table.roll_quantity(dice),
+        'lookup_rows': lambda: tablator.table.lookup_rows(rows),
+        'lookup_columns': lambda: tablator.table.lookup_columns(columns),
+        'generate': lambda: tablator.table.generate('columns-0', 100),
+        'load_table': cold_load,
+        'print_plain': print_plain,
+    }
+    random.seed(1)
+    return {name: seconds_per_call(function, repeat)
+            for name, function in benchmarks.items()}
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the results against a baseline.
+    Returns the number of benchmarks slower than the baseline by more than
+    threshold (a fraction).
+    """
+    regressions = 0
+    print('{:24} {:16} {:>12} {:>12} {:>8}'.format(
+        'data dir', 'benchmark', 'us/call', 'baseline', 'change'))
+    for config, timings in results.items():
+        for name, seconds in timings.items():
+            old = baseline.get(config, {}).get(name)
+            if old is None:
+                print('{:24} {:16} {:>12.3f} {:>12} {:>8}'.format(
+                    config, name, seconds * 1e6, '-', 'new'))
+                continue
+            change = seconds / old - 1
+            slower = change > threshold
+            regressions += slower
+            print('{:24} {:16} {:>12.3f} {:>12.3f} {:>+7.0%}{}'.format(
+                config, name, seconds * 1e6, old * 1e6, change,
+                '  SLOWER' if slower else ''))
+    return regressions
+
+
+def configurations(args):
+    """
+    Return the data directories to benchmark, as a dict of label: axes.
+    """
+    base = {axis: getattr(args, axis)[0] if getattr(args, axis) is not None
+            else DEFAULTS[axis] for axis in AXES}
+    configs = {'base': base}
+    for axis in AXES:
+        for value in (getattr(args, axis) or [])[1:]:
+            configs[f'{axis}={value}'] = dict(base, **{axis: value})
+    return configs
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the table engine on synthetic data')
+    parser.add_argument('--rows', nargs='+', type=int, default=None,
+                        help='rows per row table (first is the base, default 100)')
+    parser.add_argument('--skew', nargs='+', type=float, default=None,
+                        help='weight skew exponents (default 1.0)')
+    parser.add_argument('--depth', nargs='+', type=int, default=None,
+                        help='nesting depths (default 2)')
+    parser.add_argument('--fanout', nargs='+', type=int, default=None,
+                        help='columns per column table (default 4)')
+    parser.add_argument('--format', nargs='+', default=None,
+                        choices=('json', 'yaml'),
+                        help='table file formats (default json)')
+    parser.add_argument('-b', '--baseline', action='store', default=None,
+                        help='results file (JSON) to compare with')
+    parser.add_argument('-m', '--make-data', action='store', default=None,
+                        metavar='DIR',
+                        help='only write the base data directory to DIR')
+    parser.add_argument('-o', '--output', action='store', default=None,
+                        help='write the results to this file (JSON)')
+    parser.add_argument('-r', '--repeat', action='store', default=3,
+                        type=int, help='runs per benchmark (best is kept)')
+    parser.add_argument('-t', '--threshold', action='store', default=0.25,
+                        type=float,
+                        help='slowdown over the baseline that fails (default 0.25)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    configs = configurations(args)
+    if args.make_data is not None:
+        make_data_dir(args.make_data, **configs['base'])
+        sys.exit(0)
+
+    results = dict()
+    for label, axes in configs.items():
+        with tempfile.TemporaryDirectory() as path:
+            make_data_dir(path, **axes)
+            results[label] = run_suite(path, axes['depth'], args.repeat)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'configurations': configs,
+                       'results': results}, f, indent=2)
+
+    baseline = dict()
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold)
+    sys.exit(1 if regressions else 0)
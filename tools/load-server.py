@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Load test the HTTP roll service (tablator.server).
+
+Opens --connections keep-alive connections and sends --requests requests
+in all, cycling through the paths given (default /roll/colors), then
+prints the throughput and the p50, p90 and p99 latency.
+
+Without --port, starts a server on a free local port for the run, with
+the data directory given by --data-dir (default data/).
+Run from the root of the repository:
+
+    tools/load-server.py
+    tools/load-server.py -c 50 -r 20000 /roll/colors?n=10 /tables
+    tools/load-server.py --port 8080 /roll/potions
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+SRC_DIR = os.path.join(BASE_DIR, 'src')
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+
+async def client(host, port, paths, count, latencies, errors):
+    """
+    Send count requests on one connection, appending each latency (s).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(count):
+            path = paths[i % len(paths)]
+            request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'
+            start = time.perf_counter()
+            writer.write(request.encode())
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.decode('latin-1').split('\r\n'):
+                name, sep, value = line.partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not head.startswith(b'HTTP/1.1 200'):
+                errors.append(head.split(b'\r\n', 1)[0].decode())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def free_port():
+    """
+    Return a free local TCP port.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    """
+    Return a percentile of sorted values.
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run(args):
+    """
+    Run the load test, return (seconds, latencies, errors).
+    """
+    latencies = list()
+    errors = list()
+    per_client = [args.requests // args.connections] * args.connections
+    for i in range(args.requests % args.connections):
+        per_client[i] += 1
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, args.paths, count,
+                                  latencies, errors)
+                           for count in per_client if count))
+    return time.perf_counter() - start, latencies, errors
+
+
+def start_server(args):
+    """
+    Start a server process on a free port, wait until it accepts.
+    Returns the process.
+    """
+    args.port = free_port()
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'tablator.server', '--data-dir', args.data_dir,
+         '--port', str(args.port)], env=env)
+    for i in range(100):
+        try:
+            socket.create_connection((args.host, args.port)).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    sys.exit('server did not start')
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Load test the tablator HTTP roll service')
+    parser.add_argument('-c', '--connections', action='store', default=10,
+                        type=int, help='concurrent keep-alive connections')
+    parser.add_argument('-d', '--data-dir', action='store', default=DATA_DIR,
+                        help='data directory of the started server')
+    parser.add_argument('-H', '--host', action='store', default='127.0.0.1',
+                        help='server address')
+    parser.add_argument('-p', '--port', action='store', default=None,
+                        type=int, help='port of a running server')
+    parser.add_argument('-r', '--requests', action='store', default=10000,
+                        type=int, help='requests in all')
+    parser.add_argument('paths', nargs='*', default=['/roll/colors'],
+                        help='request paths, used in turn')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    process = start_server(args) if args.port is None else None
+    try:
+        seconds, latencies, errors = asyncio.run(run(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    latencies.sort()
+    print(f'{len(latencies)} requests on {args.connections} connections '
+          f'in {seconds:.2f} s')
+    print(f'throughput  {len(latencies) / seconds:10.0f} requests/s')
+    for label, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99)):
+        print(f'{label}         {percentile(latencies, fraction) * 1000:10.2f} ms')
+    if errors:
+        print(f'{len(errors)} errors, first: {errors[0]}')
+        sys.exit(1)